@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+"""
+A local mock LLM server for offline benchmarks.  It speaks just enough of
+three APIs for termi-chat:
+
+  * OpenAI compatible:      POST /v1/chat/completions  (openai, openrouter, deepseek)
+  * text-generation-webui:  POST /v1/chat/completions  (same endpoint; "character" is ignored)
+  * ollama:                 POST /api/chat (and /api/generate with an empty prompt,
+                            which just loads the model)
+
+Responses can be streamed or not.  The timing is configurable: latency before
+the response starts, time to first token, and the token rate after that.
+
+Run it standalone:
+  ./mock_server.py --port 5099 --ttft 0.2 --tokens-per-second 50
+
+Then point termi-chat at it with e.g.
+  OPENAI_BASE_URL=http://127.0.0.1:5099/v1 TERMI_CHAT_TGW_URL=http://127.0.0.1:5099/v1/chat/completions
+"""
+
+import sys
+import json
+import time
+import argparse
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class MockConfig:
+    def __init__(self, latency: float = 0.0, ttft: float = 0.0, tokens_per_second: float = 0.0,
+                 completion_tokens: int = 50):
+        # Seconds before we send headers.
+        self.latency = latency
+        # Seconds after the headers until the first token.
+        self.ttft = ttft
+        # 0 means send all tokens at once.
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+
+def _prompt_tokens(messages) -> int:
+    # A rough estimate is fine here; ~4 characters per token.
+    return sum(len(str(message.get("content", ""))) for message in messages) // 4 + 1
+
+def make_handler(config: MockConfig):
+    class MockHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _read_json(self) -> dict:
+            length = int(self.headers.get("Content-Length", 0))
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def _send_json(self, body: dict) -> None:
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _start_stream(self, content_type: str) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+        def _write_chunk(self, data: bytes) -> None:
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        def _end_stream(self) -> None:
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+        def _tokens(self):
+            """Yield the response tokens with the configured timing."""
+            time.sleep(config.ttft)
+            for i in range(config.completion_tokens):
+                if i > 0 and config.tokens_per_second > 0:
+                    time.sleep(1.0 / config.tokens_per_second)
+                yield f"tok{i} "
+
+        def do_GET(self):
+            if self.path.rstrip("/") in ("/v1/models", "/api/tags"):
+                self._send_json({"data": [{"id": "mock"}], "models": [{"name": "mock"}]})
+            else:
+                self.send_error(404)
+
+        def do_POST(self):
+            try:
+                request = self._read_json()
+            except ValueError:
+                self.send_error(400)
+                return
+            time.sleep(config.latency)
+            if self.path.rstrip("/") == "/v1/chat/completions":
+                self._openai(request)
+            elif self.path.rstrip("/") == "/api/chat":
+                self._ollama(request)
+            elif self.path.rstrip("/") == "/api/generate" and not request.get("prompt"):
+                self._send_json({"model": request.get("model", "mock"), "created_at": datetime.now(timezone.utc).isoformat(),
+                                 "response": "", "done": True})
+            else:
+                self.send_error(404)
+
+        def _openai(self, request: dict) -> None:
+            model = request.get("model") or request.get("character") or "mock"
+            usage = {"prompt_tokens": _prompt_tokens(request.get("messages", [])),
+                     "completion_tokens": config.completion_tokens}
+            usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+            created = int(time.time())
+            if not request.get("stream"):
+                text = "".join(self._tokens())
+
+                # Several completions (the n parameter) come back as numbered variations.
+                n = request.get("n") or 1
+                choices = [{"index": i, "finish_reason": "stop",
+                            "message": {"role": "assistant", "content": text if n == 1 else f"{text}(answer {i + 1})"}}
+                           for i in range(n)]
+                usage["completion_tokens"] *= n
+                usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+                self._send_json({"id": "mock", "object": "chat.completion", "created": created, "model": model,
+                                 "choices": choices, "usage": usage})
+                return
+            self._start_stream("text/event-stream")
+            for token in self._tokens():
+                chunk = {"id": "mock", "object": "chat.completion.chunk", "created": created, "model": model,
+                         "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+                self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            last = {"id": "mock", "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [], "usage": usage}
+            self._write_chunk(f"data: {json.dumps(last)}\n\n".encode("utf-8"))
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._end_stream()
+
+        def _ollama(self, request: dict) -> None:
+            model = request.get("model", "mock")
+            now = datetime.now(timezone.utc).isoformat()
+            prompt_tokens = _prompt_tokens(request.get("messages", []))
+            done = {"model": model, "created_at": now, "done": True,
+                    "prompt_eval_count": prompt_tokens, "eval_count": config.completion_tokens,
+                    "load_duration": 0, "prompt_eval_duration": 0,
+                    "eval_duration": int(config.completion_tokens / config.tokens_per_second * 1e9) if config.tokens_per_second else 0}
+            # ollama streams by default.
+            if request.get("stream", True) is False:
+                text = "".join(self._tokens())
+                done["message"] = {"role": "assistant", "content": text}
+                self._send_json(done)
+                return
+            self._start_stream("application/x-ndjson")
+            for token in self._tokens():
+                chunk = {"model": model, "created_at": now, "done": False,
+                         "message": {"role": "assistant", "content": token}}
+                self._write_chunk((json.dumps(chunk) + "\n").encode("utf-8"))
+            done["message"] = {"role": "assistant", "content": ""}
+            self._write_chunk((json.dumps(done) + "\n").encode("utf-8"))
+            self._end_stream()
+
+    return MockHandler
+
+def start_mock_server(config: MockConfig, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Start the mock server in a background thread; port 0 picks a free port
+       (see server.server_address)."""
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock OpenAI/text-generation-webui/ollama server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before the response starts")
+    parser.add_argument("--ttft", type=float, default=0.0, help="seconds until the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="token rate (0 = all at once)")
+    parser.add_argument("--completion-tokens", type=int, default=50)
+    args = parser.parse_args()
+
+    server = start_mock_server(MockConfig(args.latency, args.ttft, args.tokens_per_second, args.completion_tokens),
+                               args.host, args.port)
+    print(f"Mock server listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+"""
+Offline benchmarks for termi-chat.  Everything runs against the local mock
+server (see mock_server.py) so no network or API keys are needed.
+
+We measure:
+  * TermiChat.send end to end for the OpenAI compatible and text-generation-webui
+    paths, streamed and not (the difference is the streaming overhead)
+  * the hot helpers (_prepare_messages_for_api, get_estimated_tokens, wrap_text,
+    save/load and the unsaved-changes check) on synthetic conversations from 10
+    to 100k messages
+
+Results are written as JSON so runs from different versions can be compared:
+  ./run_benchmarks.py --output new.json --compare old.json
+"""
+
+import os
+import sys
+import io
+import json
+import time
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from contextlib import redirect_stdout
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "python"))
+
+from mock_server import MockConfig, start_mock_server
+
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000]
+
+# A result is a regression if it's this much slower than the baseline.
+REGRESSION_RATIO = 1.2
+
+def synthetic_conversation(size: int) -> list:
+    """Return a conversation with a system prompt plus size messages that look
+       like real ones: short questions, longer answers, some code blocks."""
+    messages = [{"role": "system", "content": "You are a helpful assistant who is versed in software engineering.",
+                 "timestamp": "2024-01-01-00:00"}]
+    for i in range(size):
+        if i % 2 == 0:
+            messages.append({"role": "user", "content": f"Question {i}: how do I make my python program faster? " * 3,
+                             "timestamp": "2024-01-01-00:00"})
+        else:
+            content = ("Here is a longer answer that goes into detail about profiling and caching. " * 8 +
+                       "\n```python\nfor i in range(10):\n    print(i)\n```\n" +
+                       "And some more text after the code block to wrap. " * 4)
+            messages.append({"role": "assistant", "content": content, "timestamp": "2024-01-01-00:00",
+                             "model": "Assistant", "family": "text-generation-webui",
+                             "response_seconds": 1.23, "response_model": "mock", "cost_dollars": 0.0})
+    return messages
+
+def measure(function, repeat: int) -> dict:
+    """Run function repeat times and return timing stats in seconds."""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - started)
+    return {"min": min(times), "median": statistics.median(times), "mean": statistics.mean(times), "runs": repeat}
+
+def repeats_for(size: int) -> int:
+    # Keep the big conversations from taking forever.
+    if size >= 100000:
+        return 3
+    if size >= 10000:
+        return 5
+    return 20
+
+def make_instance(TermiChat, workdir: str, messages: list, model: str):
+    filename = os.path.join(workdir, f"bench-{len(messages)}.json")
+    with open(filename, "w") as file:
+        json.dump(messages, file)
+    with redirect_stdout(io.StringIO()):
+        return TermiChat("Benchmark", model, len(messages), "Assistant", "User", filename)
+
+def bench_helpers(TermiChat, termi_chat_module, workdir: str, sizes: list) -> list:
+    results = []
+    for size in sizes:
+        messages = synthetic_conversation(size)
+        instance = make_instance(TermiChat, workdir, messages, "Assistant")
+        repeat = repeats_for(size)
+        api_messages = instance._prepare_messages_for_api()
+        save_name = os.path.join(workdir, f"saved-{size}.json")
+
+        def save():
+            with redirect_stdout(io.StringIO()):
+                instance.save(save_name)
+
+        def load():
+            with redirect_stdout(io.StringIO()):
+                instance._load_json_file(save_name)
+
+        def wrap_all():
+            for message in instance.messages:
+                termi_chat_module.wrap_text(message["content"])
+
+        cases = {
+            "prepare_messages_for_api": instance._prepare_messages_for_api,
+            "get_estimated_tokens": lambda: instance.get_estimated_tokens(api_messages),
+            "wrap_text": wrap_all,
+            "save": save,
+            "load": load,
+            "dirty_check": lambda: instance.original_messages != json.dumps(instance.messages),
+        }
+        save()
+        for name, function in cases.items():
+            result = measure(function, repeat)
+            result.update({"name": name, "size": size})
+            results.append(result)
+            print(f"{name:28} size={size:<7} median={result['median'] * 1000:10.3f} ms")
+    return results
+
+def bench_send(TermiChat, workdir: str, config: MockConfig, repeat: int) -> list:
+    results = []
+    messages = synthetic_conversation(10)
+    for model in ["Assistant", "gpt-3.5-turbo-0125"]:
+        for stream in [False, True]:
+            instance = make_instance(TermiChat, workdir, messages, model)
+            instance.stream = stream
+
+            def send():
+                with redirect_stdout(io.StringIO()):
+                    instance.send("How fast is this?")
+                # Keep the conversation the same size for every run.
+                del instance.messages[len(messages):]
+
+            result = measure(send, repeat)
+            name = f"send_{'stream' if stream else 'nostream'}"
+            result.update({"name": name, "size": len(messages), "model": model,
+                           "mock_ttft": config.ttft, "mock_tokens_per_second": config.tokens_per_second})
+            results.append(result)
+            print(f"{name:28} model={model:22} median={result['median'] * 1000:10.3f} ms")
+    return results
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, text=True).strip()
+    except Exception:
+        return "unknown"
+
+def _version() -> str:
+    try:
+        with open(os.path.join(REPO_DIR, "VERSION")) as file:
+            return file.read().strip()
+    except Exception:
+        return "unknown"
+
+def compare(results: list, baseline_file: str) -> int:
+    """Print how results compare to a baseline file; return the number of regressions."""
+    with open(baseline_file) as file:
+        baseline = json.load(file)
+    old = {(r["name"], r["size"], r.get("model")): r for r in baseline["results"]}
+    regressions = 0
+    print(f"\nCompared to {baseline_file} ({baseline['meta'].get('version')} @ {baseline['meta'].get('commit')}):")
+    for result in results:
+        before = old.get((result["name"], result["size"], result.get("model")))
+        if before is None or before["median"] == 0:
+            continue
+        ratio = result["median"] / before["median"]
+        flag = ""
+        if ratio > REGRESSION_RATIO:
+            flag = "  <-- regression"
+            regressions += 1
+        print(f"{result['name']:28} size={result['size']:<7} {before['median'] * 1000:10.3f} -> {result['median'] * 1000:10.3f} ms ({ratio:5.2f}x){flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline termi-chat benchmarks")
+    parser.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",")], default=DEFAULT_SIZES,
+                        help="comma separated conversation sizes (messages)")
+    parser.add_argument("--send-repeat", type=int, default=10)
+    parser.add_argument("--ttft", type=float, default=0.0, help="mock server time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="mock server token rate (0 = all at once)")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", help="baseline results file to compare against")
+    parser.add_argument("--skip-send", action="store_true")
+    args = parser.parse_args()
+
+    config = MockConfig(ttft=args.ttft, tokens_per_second=args.tokens_per_second)
+    server = start_mock_server(config)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    # These must be set before TermiChat is imported.
+    workdir = tempfile.mkdtemp(prefix="termi-chat-bench-")
+    os.environ["TERMI_CHAT_HOME"] = workdir
+    os.environ["TERMI_CHAT_TGW_URL"] = f"{base_url}/v1/chat/completions"
+    os.environ["OPENAI_BASE_URL"] = f"{base_url}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "mock")
+
+    import TermiChat as termi_chat_module
+    from TermiChat import TermiChat
+
+    results = bench_helpers(TermiChat, termi_chat_module, workdir, args.sizes)
+    if not args.skip_send:
+        results += bench_send(TermiChat, workdir, config, args.send_repeat)
+
+    output = {"meta": {"version": _version(), "commit": _git_commit(), "python": platform.python_version(),
+                       "platform": platform.platform(), "timestamp": datetime.now().isoformat(timespec="seconds")},
+              "results": results}
+    with open(args.output, "w") as file:
+        json.dump(output, file, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        if compare(results, args.compare) > 0:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+
+"""
+Sync termi-chat's list of openrouter.ai models with openrouter.ai's catalog.
+
+  ./sync_models.py                      # fetch the catalog and update the model file
+  ./sync_models.py --catalog models.json --dry-run
+
+The catalog is compared to the model file (../python/openrouter_models.json,
+read by ModelInfo.py) and the models that were added, removed or repriced
+are reported.  The model file keeps each model's price history: a
+[date, cost_input, cost_output] entry is added whenever its price changes.
+Models the catalog drops are kept (saved conversations refer to them) and
+marked with the date they were removed; termi-chat leaves them out of its menus.
+Costs are dollars per 1K tokens like the rest of MODEL_INFO.  Models without
+a fixed price (e.g., openrouter/auto) are left out.
+
+To save the catalog for tab.py or later: curl -sk https://openrouter.ai/api/v1/models > models.json
+"""
+import os
+import sys
+import json
+import argparse
+import urllib.request
+from datetime import datetime
+
+CATALOG_URL = "https://openrouter.ai/api/v1/models"
+MODEL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python", "openrouter_models.json")
+
+def read_catalog(catalog_file):
+    """Return the catalog's models by id from catalog_file or, if None, from openrouter.ai."""
+    if catalog_file:
+        with open(catalog_file, 'r') as file:
+            data = json.load(file)
+    else:
+        with urllib.request.urlopen(CATALOG_URL, timeout=30) as response:
+            data = json.load(response)
+    models = {}
+    for item in data['data']:
+        # Routers like openrouter/auto have no fixed price (-1) so we can't track their cost.
+        if float(item['pricing']['prompt']) < 0 or float(item['pricing']['completion']) < 0:
+            continue
+        architecture = item.get('architecture') or {}
+        models[item['id']] = {
+            "cost_input": round(float(item['pricing']['prompt']) * 1000, 5),
+            "cost_output": round(float(item['pricing']['completion']) * 1000, 5),
+            "context_length": item.get('context_length'),
+            "modality": architecture.get('modality'),
+            "instruct_type": architecture.get('instruct_type'),
+        }
+    return models
+
+def read_model_file(filename):
+    try:
+        with open(filename, 'r') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {"synced_at": None, "models": {}}
+
+def write_model_file(filename, data):
+    """Write data with one model per line so changes are easy to see with git diff."""
+    lines = ['{', f'"synced_at": {json.dumps(data["synced_at"])},', '"models": {']
+    models = list(data["models"].items())
+    for index, (model_id, model) in enumerate(models):
+        comma = "," if index < len(models) - 1 else ""
+        lines.append(f'{json.dumps(model_id)}: {json.dumps(model, separators=(",", ":"))}{comma}')
+    lines.extend(['}', '}'])
+    tmp_filename = filename + ".tmp"
+    with open(tmp_filename, 'w') as file:
+        file.write("\n".join(lines) + "\n")
+    os.replace(tmp_filename, filename)
+
+def sync(data, catalog, today):
+    """Update data (the model file) from catalog.
+
+       Returns:
+       - Tuple[list, list, list]: the ids added, the ids removed, and (id, old model, new model)
+         for those repriced.
+    """
+    models = data["models"]
+    added = [model_id for model_id in catalog if model_id not in models or models[model_id].get("removed")]
+    removed = [model_id for model_id, model in models.items() if model_id not in catalog and not model.get("removed")]
+    repriced = []
+    for model_id in removed:
+        models[model_id]["removed"] = today
+    for model_id, new in catalog.items():
+        old = models.get(model_id)
+        prices = old["prices"] if old else []
+        if old and (old["cost_input"], old["cost_output"]) != (new["cost_input"], new["cost_output"]):
+            repriced.append((model_id, old, new))
+        if not prices or prices[-1][1:] != [new["cost_input"], new["cost_output"]]:
+            prices = prices + [[today, new["cost_input"], new["cost_output"]]]
+        models[model_id] = dict(new, prices=prices)
+    data["synced_at"] = today
+    return added, removed, repriced
+
+def main():
+    parser = argparse.ArgumentParser(description="Update termi-chat's openrouter.ai models from openrouter.ai's catalog")
+    parser.add_argument("--catalog", help="a saved catalog (models.json) instead of fetching it")
+    parser.add_argument("--model-file", default=MODEL_FILE, help="the model file ModelInfo.py reads")
+    parser.add_argument("--dry-run", action="store_true", help="report the changes but don't write them")
+    args = parser.parse_args()
+
+    try:
+        catalog = read_catalog(args.catalog)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Unable to read the openrouter.ai catalog: {e}")
+        sys.exit(1)
+    data = read_model_file(args.model_file)
+    added, removed, repriced = sync(data, catalog, datetime.now().strftime("%Y-%m-%d"))
+
+    for model_id in added:
+        model = catalog[model_id]
+        print(f"added:    {model_id} (${model['cost_input']:.5f}, ${model['cost_output']:.5f}; context {model['context_length']})")
+    for model_id in removed:
+        print(f"removed:  {model_id}")
+    for model_id, old, new in repriced:
+        print(f"repriced: {model_id} input ${old['cost_input']:.5f} -> ${new['cost_input']:.5f}, "
+              f"output ${old['cost_output']:.5f} -> ${new['cost_output']:.5f}")
+    print(f"{len(catalog)} models: {len(added)} added, {len(removed)} removed, {len(repriced)} repriced")
+
+    if not args.dry_run:
+        write_model_file(args.model_file, data)
+        print(f"Wrote {os.path.normpath(args.model_file)}")
+
+if __name__ == "__main__":
+    main()
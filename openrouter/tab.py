@@ -1,36 +1,39 @@
 #!/usr/bin/env python
+import os
 import json
 import sys
 from tabulate import tabulate
 
-# Generate data with: curl -sk https://openrouter.ai/api/v1/models > models.json
-# Then use ./tab.py model.json
-def process_json(file_path):
+# Show termi-chat's openrouter.ai models (the model file sync_models.py keeps up to date):
+#   ./tab.py
+# or a saved catalog:
+#   curl -sk https://openrouter.ai/api/v1/models > models.json
+#   ./tab.py models.json
+MODEL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python", "openrouter_models.json")
+
+def read_models(file_path):
+    """Return (id, context length, prompt cost, completion cost, modality, instruct type) for each model."""
     with open(file_path, 'r') as file:
         data = json.load(file)
+    if 'models' in data:
+        return [(model_id, model['context_length'], model['cost_input'], model['cost_output'],
+                 model['modality'], model['instruct_type']) for model_id, model in data['models'].items()
+                if not model.get('removed')]
+    return [(item['id'], item['context_length'], float(item['pricing']['prompt']) * 1000,
+             float(item['pricing']['completion']) * 1000, item['architecture']['modality'],
+             item['architecture']['instruct_type']) for item in data['data']]
 
+def process_json(file_path):
     # Sorting data by context_length in descending order
-    sorted_data = sorted(data['data'], key=lambda x: x['context_length'], reverse=True)
+    sorted_data = sorted(read_models(file_path), key=lambda x: x[1] or 0, reverse=True)
 
     # Preparing data for tabulation
     table_data = []
-    for item in sorted_data:
-        id = item['id']
-        context_length = item['context_length']
-        prompt_cost = f"${float(item['pricing']['prompt']) * 1000:.5f}"
-        completion_cost = f"${float(item['pricing']['completion']) * 1000:.5f}"
-        modality = item['architecture']['modality']
-        instruct_type = item['architecture']['instruct_type']
-        table_data.append([id, context_length, prompt_cost, completion_cost, modality, instruct_type])
+    for id, context_length, prompt_cost, completion_cost, modality, instruct_type in sorted_data:
+        table_data.append([id, context_length, f"${prompt_cost:.5f}", f"${completion_cost:.5f}", modality, instruct_type])
 
     # Printing the tabulated data
     print(tabulate(table_data, headers=["ID", "Context Length", "Prompt Cost", "Completion Cost", "Modality", "Instruct Type"], tablefmt="grid"))
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python script.py <path_to_json_file>")
-        sys.exit(1)
-    
-    file_path = sys.argv[1]
-    process_json(file_path)
-
+    process_json(sys.argv[1] if len(sys.argv) > 1 else MODEL_FILE)
@@ -1,4 +1,29 @@
-# When you add a new model, add it to the MODEL_INFO dictionary.
+import os
+import json
+
+# openrouter.ai's models are in a data file made by openrouter/sync_models.py
+# (run it when openrouter.ai changes its catalog or prices).
+OPENROUTER_MODELS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "openrouter_models.json")
+
+def load_openrouter_models(filename: str = OPENROUTER_MODELS_FILE) -> dict:
+    """Return MODEL_INFO entries for the models in the openrouter.ai data file."""
+    try:
+        with open(filename, 'r') as file:
+            models = json.load(file)["models"]
+    except (OSError, ValueError, KeyError):
+        return {}
+    return {f"openrouter.ai/{model_api_name}": {
+                "model_api_name": model_api_name,
+                "model_family": "openrouter.ai",
+                "cost_input": model["cost_input"],
+                "cost_output": model["cost_output"],
+                "context_length": model.get("context_length"),
+                # When openrouter.ai stopped listing it (see openrouter/sync_models.py).
+                "removed": model.get("removed"),
+            } for model_api_name, model in models.items()}
+
+# When you add a new model, add it to the MODEL_INFO dictionary (openrouter.ai
+# models come from openrouter_models.json; see below).
 # See https://openai.com/pricing#language-models for pricing.
 # The first model is the default.
 MODEL_INFO = {
@@ -29,598 +54,43 @@ MODEL_INFO = {
         "cost_input": 0.0,
         "cost_output": 0.0
     },
-    "openrouter.ai/nousresearch/nous-capybara-34b": {
-        "model_api_name": "nousresearch/nous-capybara-34b",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.0007,
-        "cost_output": 0.0028
-    },
-    "openrouter.ai/nousresearch/nous-capybara-7b:free": {
-        "model_api_name": "nousresearch/nous-capybara-7b:free",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.0,
-        "cost_output": 0.0
-    },
-    "openrouter.ai/mistralai/mistral-7b-instruct:free": {
-        "model_api_name": "mistralai/mistral-7b-instruct:free",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.0,
-        "cost_output": 0.0
-    },
-    "openrouter.ai/gryphe/mythomist-7b:free": {
-        "model_api_name": "gryphe/mythomist-7b:free",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.0,
-        "cost_output": 0.0
-    },
-    "openrouter.ai/undi95/toppy-m-7b:free": {
-        "model_api_name": "undi95/toppy-m-7b:free",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.0,
-        "cost_output": 0.0
-    },
-    "openrouter.ai/openrouter/cinematika-7b:free": {
-        "model_api_name": "openrouter/cinematika-7b:free",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.0,
-        "cost_output": 0.0
-    },
-    "openrouter.ai/jondurbin/bagel-34b": {
-        "model_api_name": "jondurbin/bagel-34b",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.003,
-        "cost_output": 0.003
-    },
-    "openrouter.ai/jebcarter/psyfighter-13b": {
-        "model_api_name": "jebcarter/psyfighter-13b",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.001,
-        "cost_output": 0.001
-    },
-    "openrouter.ai/koboldai/psyfighter-13b-2": {
-        "model_api_name": "koboldai/psyfighter-13b-2",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.001,
-        "cost_output": 0.001
-    },
-    "openrouter.ai/neversleep/noromaid-mixtral-8x7b-instruct": {
-        "model_api_name": "neversleep/noromaid-mixtral-8x7b-instruct",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.003,
-        "cost_output": 0.003
-    },
-    "openrouter.ai/nousresearch/nous-hermes-llama2-13b": {
-        "model_api_name": "nousresearch/nous-hermes-llama2-13b",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.00015,
-        "cost_output": 0.00015
-    },
-    "openrouter.ai/meta-llama/codellama-34b-instruct": {
-        "model_api_name": "meta-llama/codellama-34b-instruct",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.0004,
-        "cost_output": 0.0004
-    },
-    "openrouter.ai/phind/phind-codellama-34b": {
-        "model_api_name": "phind/phind-codellama-34b",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.0004,
-        "cost_output": 0.0004
-    },
-    "openrouter.ai/intel/neural-chat-7b": {
-        "model_api_name": "intel/neural-chat-7b",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.005,
-        "cost_output": 0.005
-    },
-    "openrouter.ai/nousresearch/nous-hermes-2-mixtral-8x7b-dpo": {
-        "model_api_name": "nousresearch/nous-hermes-2-mixtral-8x7b-dpo",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.0003,
-        "cost_output": 0.0003
-    },
-    "openrouter.ai/nousresearch/nous-hermes-2-mixtral-8x7b-sft": {
-        "model_api_name": "nousresearch/nous-hermes-2-mixtral-8x7b-sft",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.0003,
-        "cost_output": 0.0003
-    },
-    "openrouter.ai/haotian-liu/llava-13b": {
-        "model_api_name": "haotian-liu/llava-13b",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.005,
-        "cost_output": 0.005
-    },
-    "openrouter.ai/nousresearch/nous-hermes-2-vision-7b": {
-        "model_api_name": "nousresearch/nous-hermes-2-vision-7b",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.005,
-        "cost_output": 0.005
-    },
-    "openrouter.ai/meta-llama/llama-2-13b-chat": {
-        "model_api_name": "meta-llama/llama-2-13b-chat",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.00015,
-        "cost_output": 0.00015
-    },
-    "openrouter.ai/gryphe/mythomax-l2-13b": {
-        "model_api_name": "gryphe/mythomax-l2-13b",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.00022,
-        "cost_output": 0.00022
-    },
-    "openrouter.ai/nousresearch/nous-hermes-llama2-70b": {
-        "model_api_name": "nousresearch/nous-hermes-llama2-70b",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.00081,
-        "cost_output": 0.00081
-    },
-    "openrouter.ai/nousresearch/nous-capybara-7b": {
-        "model_api_name": "nousresearch/nous-capybara-7b",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.00018,
-        "cost_output": 0.00018
-    },
-    "openrouter.ai/codellama/codellama-70b-instruct": {
-        "model_api_name": "codellama/codellama-70b-instruct",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.00081,
-        "cost_output": 0.00081
-    },
-    "openrouter.ai/teknium/openhermes-2-mistral-7b": {
-        "model_api_name": "teknium/openhermes-2-mistral-7b",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.00018,
-        "cost_output": 0.00018
-    },
-    "openrouter.ai/teknium/openhermes-2.5-mistral-7b": {
-        "model_api_name": "teknium/openhermes-2.5-mistral-7b",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.00018,
-        "cost_output": 0.00018
-    },
-    "openrouter.ai/undi95/remm-slerp-l2-13b": {
-        "model_api_name": "undi95/remm-slerp-l2-13b",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.00027,
-        "cost_output": 0.00027
-    },
-    "openrouter.ai/undi95/toppy-m-7b": {
-        "model_api_name": "undi95/toppy-m-7b",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.00018,
-        "cost_output": 0.00018
-    },
-    "openrouter.ai/openrouter/cinematika-7b": {
-        "model_api_name": "openrouter/cinematika-7b",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.00018,
-        "cost_output": 0.00018
-    },
-    "openrouter.ai/01-ai/yi-34b-chat": {
-        "model_api_name": "01-ai/yi-34b-chat",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.00072,
-        "cost_output": 0.00072
-    },
-    "openrouter.ai/01-ai/yi-34b": {
-        "model_api_name": "01-ai/yi-34b",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.00072,
-        "cost_output": 0.00072
-    },
-    "openrouter.ai/01-ai/yi-6b": {
-        "model_api_name": "01-ai/yi-6b",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.00013,
-        "cost_output": 0.00013
-    },
-    "openrouter.ai/togethercomputer/stripedhyena-nous-7b": {
-        "model_api_name": "togethercomputer/stripedhyena-nous-7b",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.00018,
-        "cost_output": 0.00018
-    },
-    "openrouter.ai/togethercomputer/stripedhyena-hessian-7b": {
-        "model_api_name": "togethercomputer/stripedhyena-hessian-7b",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.00018,
-        "cost_output": 0.00018
-    },
-    "openrouter.ai/mistralai/mixtral-8x7b": {
-        "model_api_name": "mistralai/mixtral-8x7b",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.00054,
-        "cost_output": 0.00054
-    },
-    "openrouter.ai/nousresearch/nous-hermes-yi-34b": {
-        "model_api_name": "nousresearch/nous-hermes-yi-34b",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.00072,
-        "cost_output": 0.00072
-    },
-    "openrouter.ai/open-orca/mistral-7b-openorca": {
-        "model_api_name": "open-orca/mistral-7b-openorca",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.00014,
-        "cost_output": 0.00014
-    },
-    "openrouter.ai/huggingfaceh4/zephyr-7b-beta": {
-        "model_api_name": "huggingfaceh4/zephyr-7b-beta",
-        "model_family": "openrouter.ai",
+    "deepseek/deepseek-chat": {
+        # DeepSeek's own API (OpenAI compatible); see https://platform.deepseek.com/api-docs/pricing
+        "model_api_name": "deepseek-chat",
+        "model_family": "deepseek",
         "cost_input": 0.00014,
-        "cost_output": 0.00014
-    },
-    "openrouter.ai/openai/gpt-3.5-turbo": {
-        "model_api_name": "openai/gpt-3.5-turbo",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.001,
-        "cost_output": 0.002
-    },
-    "openrouter.ai/openai/gpt-3.5-turbo-0125": {
-        "model_api_name": "openai/gpt-3.5-turbo-0125",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.0005,
-        "cost_output": 0.0015
-    },
-    "openrouter.ai/openai/gpt-3.5-turbo-1106": {
-        "model_api_name": "openai/gpt-3.5-turbo-1106",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.001,
-        "cost_output": 0.002
-    },
-    "openrouter.ai/openai/gpt-3.5-turbo-0613": {
-        "model_api_name": "openai/gpt-3.5-turbo-0613",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.001,
-        "cost_output": 0.002
-    },
-    "openrouter.ai/openai/gpt-3.5-turbo-0301": {
-        "model_api_name": "openai/gpt-3.5-turbo-0301",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.001,
-        "cost_output": 0.002
-    },
-    "openrouter.ai/openai/gpt-3.5-turbo-16k": {
-        "model_api_name": "openai/gpt-3.5-turbo-16k",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.003,
-        "cost_output": 0.004
-    },
-    "openrouter.ai/openai/gpt-4-turbo-preview": {
-        "model_api_name": "openai/gpt-4-turbo-preview",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.01,
-        "cost_output": 0.03
-    },
-    "openrouter.ai/openai/gpt-4-1106-preview": {
-        "model_api_name": "openai/gpt-4-1106-preview",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.01,
-        "cost_output": 0.03
-    },
-    "openrouter.ai/openai/gpt-4": {
-        "model_api_name": "openai/gpt-4",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.03,
-        "cost_output": 0.06
-    },
-    "openrouter.ai/openai/gpt-4-0314": {
-        "model_api_name": "openai/gpt-4-0314",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.03,
-        "cost_output": 0.06
-    },
-    "openrouter.ai/openai/gpt-4-32k": {
-        "model_api_name": "openai/gpt-4-32k",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.06,
-        "cost_output": 0.12
-    },
-    "openrouter.ai/openai/gpt-4-32k-0314": {
-        "model_api_name": "openai/gpt-4-32k-0314",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.06,
-        "cost_output": 0.12
-    },
-    "openrouter.ai/openai/gpt-4-vision-preview": {
-        "model_api_name": "openai/gpt-4-vision-preview",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.01,
-        "cost_output": 0.03
-    },
-    "openrouter.ai/openai/gpt-3.5-turbo-instruct": {
-        "model_api_name": "openai/gpt-3.5-turbo-instruct",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.0015,
-        "cost_output": 0.002
-    },
-    "openrouter.ai/google/palm-2-chat-bison": {
-        "model_api_name": "google/palm-2-chat-bison",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.00025,
-        "cost_output": 0.0005
-    },
-    "openrouter.ai/google/palm-2-codechat-bison": {
-        "model_api_name": "google/palm-2-codechat-bison",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.00025,
-        "cost_output": 0.0005
-    },
-    "openrouter.ai/google/palm-2-chat-bison-32k": {
-        "model_api_name": "google/palm-2-chat-bison-32k",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.00025,
-        "cost_output": 0.0005
-    },
-    "openrouter.ai/google/palm-2-codechat-bison-32k": {
-        "model_api_name": "google/palm-2-codechat-bison-32k",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.00025,
-        "cost_output": 0.0005
-    },
-    "openrouter.ai/google/gemini-pro": {
-        "model_api_name": "google/gemini-pro",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.00025,
-        "cost_output": 0.0005
-    },
-    "openrouter.ai/google/gemini-pro-vision": {
-        "model_api_name": "google/gemini-pro-vision",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.00025,
-        "cost_output": 0.0005
-    },
-    "openrouter.ai/perplexity/pplx-70b-online": {
-        "model_api_name": "perplexity/pplx-70b-online",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.0,
-        "cost_output": 0.0028
-    },
-    "openrouter.ai/perplexity/pplx-7b-online": {
-        "model_api_name": "perplexity/pplx-7b-online",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.0,
         "cost_output": 0.00028
     },
-    "openrouter.ai/perplexity/pplx-7b-chat": {
-        "model_api_name": "perplexity/pplx-7b-chat",
-        "model_family": "openrouter.ai",
-        "cost_input": 7e-05,
+    "deepseek/deepseek-coder": {
+        "model_api_name": "deepseek-coder",
+        "model_family": "deepseek",
+        "cost_input": 0.00014,
         "cost_output": 0.00028
-    },
-    "openrouter.ai/perplexity/pplx-70b-chat": {
-        "model_api_name": "perplexity/pplx-70b-chat",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.0007,
-        "cost_output": 0.0028
-    },
-    "openrouter.ai/meta-llama/llama-2-70b-chat": {
-        "model_api_name": "meta-llama/llama-2-70b-chat",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.0007,
-        "cost_output": 0.0009
-    },
-    "openrouter.ai/jondurbin/airoboros-l2-70b": {
-        "model_api_name": "jondurbin/airoboros-l2-70b",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.0007,
-        "cost_output": 0.0009
-    },
-    "openrouter.ai/austism/chronos-hermes-13b": {
-        "model_api_name": "austism/chronos-hermes-13b",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.00022,
-        "cost_output": 0.00022
-    },
-    "openrouter.ai/migtissera/synthia-70b": {
-        "model_api_name": "migtissera/synthia-70b",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.005,
-        "cost_output": 0.005
-    },
-    "openrouter.ai/mistralai/mistral-7b-instruct": {
-        "model_api_name": "mistralai/mistral-7b-instruct",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.00013,
-        "cost_output": 0.00013
-    },
-    "openrouter.ai/pygmalionai/mythalion-13b": {
-        "model_api_name": "pygmalionai/mythalion-13b",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.0015,
-        "cost_output": 0.0015
-    },
-    "openrouter.ai/undi95/remm-slerp-l2-13b-6k": {
-        "model_api_name": "undi95/remm-slerp-l2-13b-6k",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.0015,
-        "cost_output": 0.0015
-    },
-    "openrouter.ai/xwin-lm/xwin-lm-70b": {
-        "model_api_name": "xwin-lm/xwin-lm-70b",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.005,
-        "cost_output": 0.005
-    },
-    "openrouter.ai/gryphe/mythomax-l2-13b-8k": {
-        "model_api_name": "gryphe/mythomax-l2-13b-8k",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.0015,
-        "cost_output": 0.0015
-    },
-    "openrouter.ai/openchat/openchat-7b": {
-        "model_api_name": "openchat/openchat-7b",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.00013,
-        "cost_output": 0.00013
-    },
-    "openrouter.ai/alpindale/goliath-120b": {
-        "model_api_name": "alpindale/goliath-120b",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.0125,
-        "cost_output": 0.0125
-    },
-    "openrouter.ai/lizpreciatior/lzlv-70b-fp16-hf": {
-        "model_api_name": "lizpreciatior/lzlv-70b-fp16-hf",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.0007,
-        "cost_output": 0.0009
-    },
-    "openrouter.ai/neversleep/noromaid-20b": {
-        "model_api_name": "neversleep/noromaid-20b",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.003,
-        "cost_output": 0.003
-    },
-    "openrouter.ai/gryphe/mythomist-7b": {
-        "model_api_name": "gryphe/mythomist-7b",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.0005,
-        "cost_output": 0.0005
-    },
-    "openrouter.ai/mistralai/mixtral-8x7b-instruct": {
-        "model_api_name": "mistralai/mixtral-8x7b-instruct",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.00027,
-        "cost_output": 0.00027
-    },
-    "openrouter.ai/cognitivecomputations/dolphin-mixtral-8x7b": {
-        "model_api_name": "cognitivecomputations/dolphin-mixtral-8x7b",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.00027,
-        "cost_output": 0.00027
-    },
-    "openrouter.ai/rwkv/rwkv-5-world-3b": {
-        "model_api_name": "rwkv/rwkv-5-world-3b",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.0,
-        "cost_output": 0.0
-    },
-    "openrouter.ai/recursal/rwkv-5-3b-ai-town": {
-        "model_api_name": "recursal/rwkv-5-3b-ai-town",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.0,
-        "cost_output": 0.0
-    },
-    "openrouter.ai/recursal/eagle-7b": {
-        "model_api_name": "recursal/eagle-7b",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.0,
-        "cost_output": 0.0
-    },
-    "openrouter.ai/anthropic/claude-2": {
-        "model_api_name": "anthropic/claude-2",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.008,
-        "cost_output": 0.024
-    },
-    "openrouter.ai/anthropic/claude-2.1": {
-        "model_api_name": "anthropic/claude-2.1",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.008,
-        "cost_output": 0.024
-    },
-    "openrouter.ai/anthropic/claude-2.0": {
-        "model_api_name": "anthropic/claude-2.0",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.008,
-        "cost_output": 0.024
-    },
-    "openrouter.ai/anthropic/claude-instant-1": {
-        "model_api_name": "anthropic/claude-instant-1",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.0008,
-        "cost_output": 0.0024
-    },
-    "openrouter.ai/anthropic/claude-instant-1.2": {
-        "model_api_name": "anthropic/claude-instant-1.2",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.0008,
-        "cost_output": 0.0024
-    },
-    "openrouter.ai/anthropic/claude-1": {
-        "model_api_name": "anthropic/claude-1",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.008,
-        "cost_output": 0.024
-    },
-    "openrouter.ai/anthropic/claude-1.2": {
-        "model_api_name": "anthropic/claude-1.2",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.008,
-        "cost_output": 0.024
-    },
-    "openrouter.ai/anthropic/claude-instant-1.0": {
-        "model_api_name": "anthropic/claude-instant-1.0",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.0008,
-        "cost_output": 0.0024
-    },
-    "openrouter.ai/anthropic/claude-instant-1.1": {
-        "model_api_name": "anthropic/claude-instant-1.1",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.0008,
-        "cost_output": 0.0024
-    },
-    "openrouter.ai/anthropic/claude-2:beta": {
-        "model_api_name": "anthropic/claude-2:beta",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.008,
-        "cost_output": 0.024
-    },
-    "openrouter.ai/anthropic/claude-2.1:beta": {
-        "model_api_name": "anthropic/claude-2.1:beta",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.008,
-        "cost_output": 0.024
-    },
-    "openrouter.ai/anthropic/claude-2.0:beta": {
-        "model_api_name": "anthropic/claude-2.0:beta",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.008,
-        "cost_output": 0.024
-    },
-    "openrouter.ai/anthropic/claude-instant-1:beta": {
-        "model_api_name": "anthropic/claude-instant-1:beta",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.0008,
-        "cost_output": 0.0024
-    },
-    "openrouter.ai/huggingfaceh4/zephyr-7b-beta:free": {
-        "model_api_name": "huggingfaceh4/zephyr-7b-beta:free",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.0,
-        "cost_output": 0.0
-    },
-    "openrouter.ai/openchat/openchat-7b:free": {
-        "model_api_name": "openchat/openchat-7b:free",
-        "model_family": "openrouter.ai",
+    }
+}
+MODEL_INFO.update({name: info for name, info in load_openrouter_models().items() if name not in MODEL_INFO})
+
+# Which ollama models there are depends on what's been pulled on the box ("ollama list"),
+# so they come from TERMI_CHAT_OLLAMA_MODELS (comma separated model names).
+for _name in [name.strip() for name in os.environ.get("TERMI_CHAT_OLLAMA_MODELS", "").split(",") if name.strip()]:
+    MODEL_INFO[f"ollama/{_name}"] = {
+        "model_api_name": _name,
+        "model_family": "ollama",
         "cost_input": 0.0,
         "cost_output": 0.0
-    },
-    "openrouter.ai/mancer/weaver": {
-        "model_api_name": "mancer/weaver",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.0045,
-        "cost_output": 0.0045
-    },
-    "openrouter.ai/mistralai/mistral-tiny": {
-        "model_api_name": "mistralai/mistral-tiny",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.00016,
-        "cost_output": 0.00047
-    },
-    "openrouter.ai/mistralai/mistral-small": {
-        "model_api_name": "mistralai/mistral-small",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.00067,
-        "cost_output": 0.002
-    },
-    "openrouter.ai/mistralai/mistral-medium": {
-        "model_api_name": "mistralai/mistral-medium",
-        "model_family": "openrouter.ai",
-        "cost_input": 0.00278,
-        "cost_output": 0.00833
     }
-}
+
+# Models openrouter.ai no longer lists stay in MODEL_INFO so --model and saved
+# conversations still know them; menus and lists offer just these.
+AVAILABLE_MODELS = {name: info for name, info in MODEL_INFO.items() if not info.get("removed")}
+
+# Short names for these families start with the family so they're easy to find
+# in the model menu; the prefix is optional when giving a model name.
+MODEL_PREFIXES = ["openrouter.ai/", "ollama/", "deepseek/"]
+
+# Families that speak the OpenAI chat completions API.
+OPENAI_COMPATIBLE_FAMILIES = ["openai", "openrouter.ai", "ollama", "deepseek"]
+
+# Families that return several completions for one request (the n parameter); for
+# the others we send a request per completion.
+N_COMPLETIONS_FAMILIES = ["openai"]
@@ -3,13 +3,22 @@ import json
 import os
 import sys
 import glob
-import requests
+import difflib
+import threading
 import readline
 from datetime import datetime
 from typing import List, Dict, Tuple, Optional
 from openai import OpenAI
 from spinner import Spinner
-from ModelInfo import MODEL_INFO
+from latency import LatencyTracker, DEFAULT_FIRST_TOKEN_FILE
+import nettrace
+import cassette
+from metrics import METRICS
+from ledger import LEDGER
+from admission import ADMISSION
+from model_picker import ModelIndex, pick_model, load_recent, remember_recent
+from streaming import StreamedResponse, abort_on_cancel, read_openai_stream, read_sse_stream
+from ModelInfo import MODEL_INFO, AVAILABLE_MODELS, MODEL_PREFIXES, OPENAI_COMPATIBLE_FAMILIES, N_COMPLETIONS_FAMILIES
 from simple_term_menu import TerminalMenu
 from tiktoken import encoding_for_model
 from utils import get_model_info, marker_message, warn_message, info_message, dashes, wrap_text, ANSI_BOLD, ANSI_YELLOW, ANSI_GREEN, ANSI_LIGHTBLUE, ANSI_RED, ANSI_RESET
@@ -17,21 +26,52 @@ from utils import get_model_info, marker_message, warn_message, info_message, da
 # Used for counting tokens
 TOKEN_ENCODING = encoding_for_model("text-davinci-003")
 
+# Response size used to estimate the cost of a request (for the budgets) until
+# the ledger has seen a few responses from the model.
+DEFAULT_ESTIMATED_OUTPUT_TOKENS = 500
+
+# How many answers the answers command asks for unless told otherwise, and at most.
+DEFAULT_COMPLETIONS = 3
+MAX_COMPLETIONS = 8
+
 # When you add a new model, add it to the MODEL_INFO dictionary.
 # See https://openai.com/pricing#language-models for pricing.
 # The first model is the default.
 
-# Used for things that need all models.
-MODEL_LIST_AS_STRING = ", ".join(MODEL_INFO.keys())
+# Used for things that need all models (that openrouter.ai still has).
+MODEL_LIST_AS_STRING = ", ".join(AVAILABLE_MODELS.keys())
 
 # Used for iteration.
 MODEL_LIST = [model for model in MODEL_INFO.keys()]
 
-# The first one is the default.
-DEFAULT_MODEL = MODEL_LIST[0]
+# The first one (that openrouter.ai hasn't removed) is the default.
+DEFAULT_MODEL = next(iter(AVAILABLE_MODELS))
 
 DEFAULT_TERMI_CHAT_DIRNAME = "termi-chats"
 
+# The OpenAI client reads OPENAI_BASE_URL itself; these let us point the other
+# families somewhere else too (e.g., the mock server in benchmarks/).
+OPENROUTER_BASE_URL = os.environ.get("TERMI_CHAT_OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+
+# Today, we hardcode this until we can figure out how to load a specific
+# type of model and character.
+#TGW_URL = "http://192.168.1.52:5089/v1/chat/completions"
+
+# For runpod.io, use something like this:
+# Create a tunnel (where the pod IP = 207.189.112.60 and ssh port is 43919) like this:
+#   ssh root@207.189.112.60 -L 5005:127.0.0.1:5000 -p 43919 -i ~/.ssh/id_rsa
+TGW_URL = os.environ.get("TERMI_CHAT_TGW_URL", "http://127.0.0.1:5005/v1/chat/completions")
+
+# A locally running ollama server (its OpenAI compatible API).
+OLLAMA_BASE_URL = os.environ.get("TERMI_CHAT_OLLAMA_BASE_URL", "http://localhost:11434/v1")
+
+# DeepSeek's OpenAI compatible API.
+DEEPSEEK_BASE_URL = os.environ.get("TERMI_CHAT_DEEPSEEK_BASE_URL", "https://api.deepseek.com/v1")
+
+# OpenAI compatible clients by family; see _get_openai_client.
+_SHARED_CLIENTS: Dict[str, OpenAI] = {}
+_SHARED_CLIENTS_LOCK = threading.Lock()
+
 MENU_ITEMS = {
     "[c] clear   - Start over the conversation (retain the System prompt)": "clear",
     "[l] load    - Load conversation context": "load",
@@ -41,7 +81,10 @@ MENU_ITEMS = {
     "[n] names   - Choose different names for the assistant and user": "names",
     "[s] save    - Save conversation context": "save",
     "[r] resend  - Resend the current context (with no new input)": "resend",
+    "[a] answers - Resend the current context for several answers to choose from": "answers",
+    "[d] draft   - Use the partial response from a cancelled request": "draft",
     "[v] view    - See conversation context": "view",
+    "[t] stats   - Show latency, throughput and cost per model": "stats",
     "[q] quit    - Quit the program": "quit",
     "[x] exit    - Quit without saving": "exit"
 }
@@ -54,8 +97,13 @@ MENU_ITEMS = {
 #     "[a] Assistant (local)": "Assistant"
 # }
 
-# Set MODEL_MENU_ITEMS to a dict that maps MODEL_INFO keys to model_api_name values.
-MODEL_MENU_ITEMS = {model: MODEL_INFO[model]["model_api_name"] for model in MODEL_INFO}
+# What to do with a draft (see use_draft).
+DRAFT_CHOICES = ["Add to conversation", "Discard", "Keep for later"]
+
+# Set MODEL_MENU_ITEMS to a dict that maps MODEL_INFO keys to model_api_name values for the
+# models that can be picked (not ones openrouter.ai removed; MODEL_INFO still has those for
+# older conversations).
+MODEL_MENU_ITEMS = {model: info["model_api_name"] for model, info in AVAILABLE_MODELS.items()}
 
 def get_file_or_dir_from_cli() -> str:
     """Check and return the file or directory specified in command line arguments.
@@ -111,14 +159,54 @@ def get_max_context_from_cli() -> int:
     # Default max context
     return 100
 
+def get_hedge_model_from_cli() -> Optional[str]:
+    """Check and return the fallback model (the "short" name) specified with --hedge.
+       When the current model is slower than its usual p95, the same request is also
+       sent to this model and whichever answers first is used.
+
+    Returns:
+    - str: the fallback model short name or None if hedging is off
+    """
+    if "--hedge" in sys.argv:
+        hedge_index = sys.argv.index("--hedge") + 1
+        if hedge_index < len(sys.argv):
+            return sys.argv[hedge_index]
+        print("Missing model name for --hedge.")
+        exit(1)
+    return None
+
+def get_stream_from_cli() -> bool:
+    """Return False if --no-stream was given; by default responses are streamed so
+       Ctrl-C can abort a request part way through."""
+    return "--no-stream" not in sys.argv
+
+def get_speculate_from_cli() -> Tuple[bool, bool]:
+    """Check for --speculate (start requests to free and local models while the send
+       menu is showing) and --speculate-paid (paid models too).
+
+    Returns:
+    - Tuple[bool, bool]: whether to speculate, and whether paid models may be speculated.
+    """
+    speculate_paid = "--speculate-paid" in sys.argv
+    return speculate_paid or "--speculate" in sys.argv, speculate_paid
+
+def get_profile_from_cli() -> bool:
+    """Return True if --profile was given (profile the session and write a report at exit)."""
+    return "--profile" in sys.argv
+
 def help_message() -> None:
    print()
-   print(f"  Usage: {os.path.basename(__file__)} [--load filename] [--model modelname] [--names name1,name2]")
+   print(f"  Usage: {os.path.basename(__file__)} [--load filename] [--model modelname] [--names name1,name2] [--hedge modelname] [--no-stream] [--speculate] [--profile]")
    print()
    print(f"    --load filename: Load conversation context from a file (contains system prompt)")
    print(f"    --model modelname: Choose a model to use ({MODEL_LIST_AS_STRING})")
    print(f"    --names name1,name2: Choose names for the assistant and user")
    print(f"    --max number: set max previous messages to use for context (this uses less tokens)")
+   print(f"    --hedge modelname: if the model is slow, also send to this model and use the first answer")
+   print(f"    --no-stream: wait for whole responses (Ctrl-C then can't keep a partial response)")
+   print(f"    --speculate: send to free and local models while you decide whether to send (Cancel stops it)")
+   print(f"    --speculate-paid: like --speculate but for paid models too (cancelled requests may still cost)")
+   print(f"    --profile: profile this session and write a report to ~/.termi-chat/profiles at exit")
    print()
 
 def get_names_from_cli(model_short_name: str) -> Tuple[str, str]:
@@ -149,23 +237,58 @@ def get_names_from_cli(model_short_name: str) -> Tuple[str, str]:
     return "Assistant", "User"
 
 class TermiChat:
-    def __init__(self, name: str, model: str, max_context: int, assistant_name: str, user_name: str, file_or_dir_from_cli: str):
+    def __init__(self, name: str, model: str, max_context: int, assistant_name: str, user_name: str, file_or_dir_from_cli: str,
+                 hedge_model: Optional[str] = None, stream: bool = True, speculate: bool = False,
+                 speculate_paid: bool = False):
         self.name = name
         self.max_context = max_context
         self.assistant_name = assistant_name
         self.user_name = user_name
 
-        # We only need the OpenAI client if we are using an OpenAI model
-        # This makes it so you don't need an API key if you are using a
-        # local model.
-        self._openaiClient = None
-
-        # Openrouter client is similar to OpenAI client.
-        self._openrouterClient = None
-
         # The total accumulated cost for the conversation(s)
         self._total_cost = 0.0
 
+        # Observed response times per model (used for timeouts) and times to the
+        # first token (used for hedging).
+        self._latency = LatencyTracker()
+        self._first_token = LatencyTracker(DEFAULT_FIRST_TOKEN_FILE)
+
+        # Per model/family performance numbers; see the stats command.
+        self._metrics = METRICS
+
+        # Persistent cost record and budgets shared with other termi-chat processes.
+        # Replayed cassettes don't cost anything so they stay out of it.
+        self._ledger = None if cassette.replaying() else LEDGER
+
+        # Details of the last request for the metrics: the Spinner (for timings)
+        # and the (input, output) token counts.
+        self._last_spinner = None
+        self._last_usage = (0, 0)
+
+        # Set from another thread (e.g., the daemon when an attached client gets Ctrl-C)
+        # to cancel the request being sent; checked when its Spinner is made in case
+        # the cancel comes before that.  Whoever sets it clears it when send returns.
+        self.cancel_requested = threading.Event()
+
+        # Stream responses so a request can be cancelled part way through; the
+        # text is still shown only when it is complete.
+        self.stream = stream
+
+        # Partial response from a request cancelled with Ctrl-C; see the draft command.
+        self.draft = None
+
+        # Start the request while the send menu is showing (see send); only for models
+        # that cost nothing unless speculate_paid.
+        self.speculate = speculate
+        self.speculate_paid = speculate_paid
+
+        # True while the send menu is showing so background requests don't draw over it.
+        self._menu_open = False
+
+        # The model that produced the last response (differs from self.model if
+        # a hedged request won).
+        self._last_model = None
+
         # Track the time so we can store it with the messages.
         self.timestamps = [self._get_timestamp()]
 
@@ -180,6 +303,11 @@ class TermiChat:
             sys.exit(1)
         self._inform_model_cost(self.model_api_name)
 
+        self.hedge_model = None
+        if hedge_model is not None:
+            self.hedge_model, _, _ = self._get_model_api_and_family(hedge_model)
+            info_message(f"Hedging slow requests to {self.hedge_model}")
+
     def _get_model_cost_values(self, model_api_name: str) -> Tuple[float, float]:
         """Get the cost values for any model_api_name as a pair of cost/1k tokens for input and output.
            If the model is not supported, we will use high cost estimates."""
@@ -208,6 +336,8 @@ class TermiChat:
         else:
             print(f"[{index}] {timestamp} {ANSI_BOLD}{ANSI_GREEN}{message['role'].title()}{ANSI_RESET}:")
         print(formatted_text)
+        if message.get("alternates"):
+            info_message(f"({len(message['alternates'])} other answers kept as alternates)")
 
     def _save_to_file(self, loaded_filename, messages: List[Dict[str, str]], filename: str) -> None:
         """Save messages to a file.
@@ -396,167 +526,427 @@ class TermiChat:
         - The model's api name if supported, None otherwise.
         - The model family if supported, None otherwise.
         """
-        if ("openrouter.ai/" + model_short_name) in MODEL_LIST:
-            # The shortnames had openrouter.ai prepended to them so we could
-            # easily search for them when selecting the model.
-            model_short_name = "openrouter.ai/" + model_short_name
-            return model_short_name, MODEL_INFO.get(model_short_name)["model_api_name"], MODEL_INFO.get(model_short_name)["model_family"]
+        for prefix in MODEL_PREFIXES:
+            if (prefix + model_short_name) in MODEL_LIST:
+                # The shortnames had openrouter.ai (or ollama, deepseek) prepended to them so we could
+                # easily search for them when selecting the model.
+                model_short_name = prefix + model_short_name
+                break
         if model_short_name not in MODEL_LIST:
             print(f"Unsupported model: {model_short_name}; valid modes: {MODEL_LIST_AS_STRING}")
             exit(1)
+        if MODEL_INFO[model_short_name].get("removed"):
+            warn_message(f"openrouter.ai stopped listing {model_short_name} on {MODEL_INFO[model_short_name]['removed']}; "
+                         "requests to it will probably fail")
         return model_short_name, MODEL_INFO.get(model_short_name)["model_api_name"], MODEL_INFO.get(model_short_name)["model_family"]
 
-    def _send_message_to_openai(self, api_messages: List[Dict[str, str]]) -> Tuple[str, float, str]:
-        """Send a message to the OpenAI API and return the response.
+    def _new_openai_client(self, family: str) -> OpenAI:
+        """Make a client for an OpenAI compatible family (see OPENAI_COMPATIBLE_FAMILIES)."""
+        kwargs = {}
+        http_client = cassette.provider_httpx_client()
+        if http_client is not None:
+            kwargs["http_client"] = http_client
+        if family == "openrouter.ai":
+            return OpenAI(base_url=OPENROUTER_BASE_URL, api_key=cassette.api_key("OPENROUTER_API_KEY"), **kwargs)
+        if family == "deepseek":
+            return OpenAI(base_url=DEEPSEEK_BASE_URL, api_key=cassette.api_key("DEEPSEEK_API_KEY"), **kwargs)
+        if family == "ollama":
+            # Ollama ignores the key but the client insists on one.
+            return OpenAI(base_url=OLLAMA_BASE_URL, api_key="ollama", **kwargs)
+        if cassette.replaying():
+            kwargs["api_key"] = cassette.api_key("OPENAI_API_KEY")
+        return OpenAI(**kwargs)
+
+    def _get_openai_client(self, family: str, private: bool = False) -> OpenAI:
+        """Return a client for an OpenAI compatible family.  The shared clients are
+           created on first use so you don't need an API key when using a local model.
+           They are shared by every TermiChat in the process (e.g., the sessions in the
+           daemon) so connections are reused.  A private client belongs to a single
+           request so it can be closed to abort that request without disturbing
+           anything else."""
+        if private:
+            return self._new_openai_client(family)
+        with _SHARED_CLIENTS_LOCK:
+            if family not in _SHARED_CLIENTS:
+                _SHARED_CLIENTS[family] = self._new_openai_client(family)
+            return _SHARED_CLIENTS[family]
+
+    def _request_function(self, model: str, api_messages: List[Dict[str, str]], private: bool = False,
+                          completions: int = 1):
+        """Return a function the Spinner can run in a thread to send api_messages to
+           model (a key in MODEL_INFO).  The function returns the raw response.
 
            Args:
+           - str: model is the model "short" name.
            - List[Dict[str, str]]: api_messages is a list of messages to send to the model.
-             These messages contain only what the api will accept.
+           - bool: private means use a client only this request uses so it can be
+             closed if the request is cancelled.
+           - int: completions is how many answers to ask for (the n parameter; only for
+             N_COMPLETIONS_FAMILIES).  Several answers aren't streamed.
+        """
+        model_api_name = MODEL_INFO[model]["model_api_name"]
+        family = MODEL_INFO[model]["model_family"]
+
+        if family in OPENAI_COMPATIBLE_FAMILIES:
+            def send_request(attempt):
+                with nettrace.trace_request(model):
+                    client = self._get_openai_client(family, private)
+                    if private:
+                        attempt.on_cancel(client.close)
+                    extra = {}
+                    if family == "openrouter.ai":
+                        extra["extra_headers"] = {
+                            "HTTP-Referer": "termi-chat",
+                            "X-Title": "termi-chat"
+                        }
+                    if completions > 1:
+                        return client.chat.completions.create(
+                            model=model_api_name,
+                            messages=api_messages,
+                            n=completions,
+                            **extra
+                        )
+                    if self.stream:
+                        # Ask for usage in the last chunk so we can still charge exactly.
+                        stream = client.chat.completions.create(
+                            model=model_api_name,
+                            messages=api_messages,
+                            stream=True,
+                            extra_body={"stream_options": {"include_usage": True}},
+                            **extra
+                        )
+                        return read_openai_stream(stream, attempt, model_api_name)
+                    return client.chat.completions.create(
+                        model=model_api_name,
+                        messages=api_messages,
+                        **extra
+                    )
+            return self._admitted(model_api_name, family, send_request)
+
+        if family == "text-generation-webui":
+            headers = {"Content-Type": "application/json"}
+            data = {
+                "messages": api_messages,
+                "mode": "chat",
+                "character": model_api_name,
+                "stream": self.stream,
+            }
+
+            def post_request(attempt):
+                # Today, we do a raw request vs. calling a proper api.
+                session = cassette.provider_session()
+                abort_on_cancel(session, attempt)
+                with nettrace.trace_request(model):
+                    if self.stream:
+                        response = session.post(TGW_URL, json=data, headers=headers, stream=True)
+                        return read_sse_stream(response, attempt, model_api_name)
+                    return session.post(TGW_URL, json=data, headers=headers)
+            return self._admitted(model_api_name, family, post_request)
+
+        print(f"Unsupported model when trying to send: {model_api_name}")
+        return None
+
+    def _admitted(self, model_api_name: str, family: str, request_function):
+        """Wrap request_function so it waits its turn for a local model server (see
+           admission.py); other families are returned as is."""
+        queue = ADMISSION.get(family)
+        if queue is None:
+            return request_function
+
+        def send_when_admitted(attempt):
+            def on_wait(place: int) -> None:
+                if self._menu_open:
+                    return
+                sys.stdout.write(f" [#{place} in line for {family}] " if place else " [sending] ")
+                sys.stdout.flush()
+            # Time spent in line counts as queueing, not against the model's timeout or
+            # latency; the Spinner's clocks start when we're admitted.
+            attempt.queued = True
+            with queue.slot(model_api_name, attempt.cancelled, on_wait) as admitted:
+                if not admitted:
+                    return None
+                attempt.started_at = time.time()
+                attempt.queued = False
+                return request_function(attempt)
+        return send_when_admitted
+
+    def _start_request(self, api_messages: List[Dict[str, str]], private: bool = False) -> Optional[Spinner]:
+        """Start sending api_messages to the current model (and the hedge, if configured)
+           in the background; wait for it with _wait_for_response.
+
+           Args:
+           - List[Dict[str, str]]: api_messages is a list of messages to send to the model.
+           - bool: private means use a client only this request uses so it can be
+             closed if the request is abandoned.
 
            Returns:
-           - Tuple[str, float]: The response from the model and the cost of the request and model name (openai).
-             Returns an error string if there was a problem.
+           - Optional[Spinner]: the Spinner running the request; None if the model isn't supported.
         """
+        hedging = self.hedge_model is not None and self.hedge_model != self.model
+        target = self._request_function(self.model, api_messages, private=private or hedging)
+        if target is None:
+            return None
+        hedge_target = None
+        if hedging:
+            hedge_target = self._request_function(self.hedge_model, api_messages, private=True)
+
+        spinner = Spinner(timeout=self._latency.timeout_for(self.model),
+                          hedge_after=self._first_token.hedge_delay_for(self.model))
+        spinner.launch(target, hedge_function=hedge_target)
+        return spinner
+
+    def _wait_for_response(self, api_messages: List[Dict[str, str]], spinner: Optional[Spinner] = None) -> Tuple[str, float, str]:
+        """Send api_messages to the current model, and if configured, hedge to
+           self.hedge_model when the current model is slower than its p95.  The
+           timeout is based on the latency we've seen from the current model.
 
-        spinner = Spinner()
-
-        def send_request():
-            nonlocal spinner
-            if self.family == "openrouter.ai":
-                # Initialize the Openrouter client
-                if self._openrouterClient is None:
-                    key = os.environ["OPENROUTER_API_KEY"]
-                    self._openrouterClient = OpenAI(
-                      base_url="https://openrouter.ai/api/v1",
-                      api_key=key
-                    )
-                try:
-                    spinner.set_response(self._openrouterClient.chat.completions.create(
-                        extra_headers={
-                            "HTTP-Referer": "termi-chat",
-                            "X-Title": "termi-chat"
-                        },
-                        model=self.model_api_name,
-                        messages=api_messages
-                    ))
-                except Exception as e:
-                    print(f"Error: {e}")
-            elif self.family == "openai":
-                if self._openaiClient is None:
-                    # Initialize the OpenAI client
-                    self._openaiClient = OpenAI()
-                try:
-                    spinner.set_response(self._openaiClient.chat.completions.create(
-                        model=self.model_api_name,
-                        messages=api_messages
-                    ))
-                except Exception as e:
-                    print(f"Error: {e}")
-            else:
-                print(f"Unsupported model when trying to send: {self.model_api_name}")
+           Args:
+           - List[Dict[str, str]]: api_messages is a list of messages to send to the model.
+           - Optional[Spinner]: spinner is a request already started with _start_request
+             for api_messages; if None, we start one.
 
-        spinner.start(send_request)
+           Returns:
+           - Tuple[str, float, str]: The response from the model, the cost of the request, and
+             the model name from the response.  Returns an error string if there was a problem
+             and "Cancelled" as the model name if the user pressed Ctrl-C.
+        """
+        if spinner is None:
+            spinner = self._start_request(api_messages)
+            if spinner is None:
+                return f"{ANSI_BOLD}{ANSI_RED}Unsupported model: {self.model_api_name}{ANSI_RESET}", 0.0, "Error"
+        self._last_spinner = spinner
+        if self.cancel_requested.is_set():
+            spinner.cancel()
+        spinner.wait()
 
         # Handle the response after spinner finishes
         response = spinner.response
-
-        if response is None:
-            warn_message("Timeout condition: Request took too long to complete")
-
         sys.stdout.flush()
 
-        # OpenAI has no status code -- so if we get a response, we assume 200 OK.
-        # See https://community.openai.com/t/http-status-for-chat-completion/541491
-        if response:
-            print()
-            print(f"response = {response}")
-            cost_per_input_1k_tokens, cost_per_output_1k_tokens = self._get_model_cost_values(self.model_api_name)
-            input_tokens = response.usage.prompt_tokens
-            output_tokens = response.usage.completion_tokens
-            total_tokens = input_tokens + output_tokens
-            cost_for_input = cost_per_input_1k_tokens * input_tokens / 1000
-            cost_for_output = cost_per_output_1k_tokens * output_tokens / 1000
-            total_for_both = cost_for_input + cost_for_output
-
-            self._total_cost += total_for_both
-            if total_for_both > 0.0:
-                warn_message(f"\nCost: ${cost_for_input:.4f} for input, ${cost_for_output:.4f} for output, total: ${total_for_both:.4f}")
-            return response.choices[0].message.content, total_for_both, "openai"
-        else:
-            warn_message(f"\nRequest failed with unknown status code")
+        if spinner.cancelled:
+            return spinner.partial_text(), 0.0, "Cancelled"
+
+        if response is None:
+            if spinner.timed_out:
+                warn_message(f"\nTimeout condition: Request took too long to complete ({spinner.timeout:.0f} seconds)")
             return f"{ANSI_BOLD}{ANSI_RED}Error talking to model {self.model_api_name}: response = {str(response)}{ANSI_RESET}", 0.0, "Error"
 
-    def _send_message_to_local_TGW(self, api_messages: List[Dict[str, str]]) -> Tuple[str, float, str]:
-        """Send a message to the text-generation-webui in the background and return immediately.
+        self._last_model = self.model
+        if spinner.source == "hedge":
+            self._last_model = self.hedge_model
+            warn_message(f"\nHedged: {self.hedge_model} answered before {self.model}")
+        return self._handle_response(response, self._last_model, api_messages)
+
+    def _handle_response(self, response, model: str, api_messages: List[Dict[str, str]]) -> Tuple[str, float, str]:
+        """Turn the raw response from model's request function into the response text, cost
+           and model name from the response."""
+        model_api_name = MODEL_INFO[model]["model_api_name"]
+        if isinstance(response, StreamedResponse):
+            return self._handle_streamed_response(response, model_api_name, api_messages)
+        if MODEL_INFO[model]["model_family"] == "text-generation-webui":
+            return self._handle_TGW_response(response, model_api_name)
+        return self._handle_openai_response(response, model_api_name)
+
+    def _wait_for_completions(self, api_messages: List[Dict[str, str]], completions: int) -> Tuple[List[Dict], float, str]:
+        """Get several answers to api_messages from the current model: in one request if
+           the family supports the n parameter, otherwise with a request per answer sent
+           at the same time.
 
-            Args:
-            - List[Dict[str, str]]: api_messages is a list of messages to send to the model.
-              These messages contain only what the api will accept.
-            - Returns:
-           - Tuple[str, float]: The response from the model and the cost of the request, and model name from response.
-             Returns an error string if there was a problem.
+           Returns:
+           - Tuple[List[Dict], float, str]: The answers (dicts with content, response_seconds
+             and response_model), the total cost, and the model name from the response or
+             "Cancelled" if the user pressed Ctrl-C or "Error" if no answers came back.
         """
+        if self.family in N_COMPLETIONS_FAMILIES:
+            targets = [self._request_function(self.model, api_messages, private=True, completions=completions)]
+        else:
+            targets = [self._request_function(self.model, api_messages, private=True) for _ in range(completions)]
+        if targets[0] is None:
+            return [], 0.0, "Error"
+
+        spinner = Spinner(timeout=self._latency.timeout_for(self.model))
+        self._last_spinner = spinner
+        if self.cancel_requested.is_set():
+            return [], 0.0, "Cancelled"
+        spinner.start_all(targets)
+        sys.stdout.flush()
+        if spinner.cancelled:
+            return [], 0.0, "Cancelled"
+        if spinner.timed_out:
+            warn_message(f"\nTimeout condition: not every answer came back in {spinner.timeout:.0f} seconds")
+
+        answers = []
+        total_cost = 0.0
+        input_tokens = output_tokens = 0
+        response_model = "Error"
+        for label, attempt in spinner.attempts.items():
+            response = spinner.responses.get(label)
+            if response is None:
+                continue
+            seconds = round(attempt.finished_at - attempt.started_at, 2)
+            if len(targets) == 1 and not isinstance(response, StreamedResponse):
+                # One request with n answers: charged once for all of them.
+                total_cost += self._charge(self.model_api_name, response.usage.prompt_tokens, response.usage.completion_tokens)
+                response_model = response.model
+                answers.extend({"content": choice.message.content, "response_seconds": seconds,
+                                "response_model": response_model} for choice in response.choices)
+            else:
+                content, cost, model = self._handle_response(response, self.model, api_messages)
+                total_cost += cost
+                if model == "Error":
+                    continue
+                response_model = model
+                answers.append({"content": content, "response_seconds": seconds, "response_model": model})
+            input_tokens += self._last_usage[0]
+            output_tokens += self._last_usage[1]
+        self._last_usage = (input_tokens, output_tokens)
+        if 0 < len(answers) < completions:
+            warn_message(f"Got {len(answers)} of the {completions} answers asked for")
+        return answers, total_cost, response_model
+
+    def _choose_answer(self, answers: List[Dict]) -> Optional[int]:
+        """Show the answers side by side with how long they are and how alike, and let
+           the user pick one.
 
-        # Today, we hardcode this until we can figure out how to load a specific
-        # type of model and character.
-        #url = "http://192.168.1.52:5089/v1/chat/completions"
-
-        # For runpod.io, use something like this:
-        # Create a tunnel (where the pod IP = 207.189.112.60 and ssh port is 43919) like this:
-        #   ssh root@207.189.112.60 -L 5005:127.0.0.1:5000 -p 43919 -i ~/.ssh/id_rsa
-        url = "http://127.0.0.1:5005/v1/chat/completions"
-        headers = {"Content-Type": "application/json"}
-
-        data = {
-            "messages": api_messages,
-            "mode": "chat",
-            "character": self.model_api_name,
-        }
-        spinner = Spinner()
-
-        def post_request():
-            nonlocal spinner
-            try:
-                # Today, we do a raw request vs. calling a proper api.
-                spinner.set_response(requests.post(url, json=data, headers=headers))
-            except Exception as e:
-                print(f"Error: {e}")
-
-        spinner.start(post_request)
-
-        # Handle the response after spinner finishes
-        response = spinner.response
+           Returns:
+           - Optional[int]: the index of the chosen answer or None to discard them all.
+        """
+        words = [answer["content"].split() for answer in answers]
+        for index, answer in enumerate(answers):
+            print()
+            dashes()
+            tokens = self._get_estimated_tokens_for_message(answer["content"])
+            info_message(f"Answer {index + 1} of {len(answers)} ({tokens} tokens, {answer['response_seconds']:.1f}s)")
+            print(wrap_text(answer["content"]))
+        dashes()
 
-        if response is None:
-            warn_message("\nTimeout condition: Request took too long to complete")
+        # How much of each answer's wording the others share; an answer that stands
+        # apart from the rest is the one to read closely.
+        options = []
+        for index, answer in enumerate(answers):
+            others = [difflib.SequenceMatcher(None, words[index], words[other]).ratio()
+                      for other in range(len(answers)) if other != index]
+            alike = f", {max(others) * 100:.0f}% like another" if others else ""
+            first_line = answer["content"].strip().split("\n")[0][:60]
+            options.append(f"Use answer {index + 1} ({len(words[index])} words{alike}): {first_line}")
+        options.append("Discard all")
+        terminal_menu = TerminalMenu(options)
+        selected_option = terminal_menu.show()
+        if selected_option is None or selected_option == len(answers):
+            return None
+        return selected_option
+
+    def _charge(self, model_api_name: str, input_tokens: int, output_tokens: int) -> float:
+        """Add the cost of a request to the total and tell the user about it.
 
-        if response and response.status_code == 200:
-            sys.stdout.flush()
+           Returns:
+           - float: the cost of the request in dollars
+        """
+        cost_per_input_1k_tokens, cost_per_output_1k_tokens = self._get_model_cost_values(model_api_name)
+        cost_for_input = cost_per_input_1k_tokens * input_tokens / 1000
+        cost_for_output = cost_per_output_1k_tokens * output_tokens / 1000
+        total_for_both = cost_for_input + cost_for_output
+
+        self._last_usage = (input_tokens, output_tokens)
+        self._total_cost += total_for_both
+        if total_for_both > 0.0:
+            warn_message(f"\nCost: ${cost_for_input:.4f} for input, ${cost_for_output:.4f} for output, total: ${total_for_both:.4f}")
+        return total_for_both
+
+    def _estimate_cost(self, api_messages: List[Dict[str, str]], completions: int = 1) -> float:
+        """Estimate what sending api_messages to the current model for completions answers
+           will cost; the response size is the model's average from the ledger."""
+        cost_per_input_1k_tokens, cost_per_output_1k_tokens = self._get_model_cost_values(self.model_api_name)
+        if cost_per_input_1k_tokens == 0.0 and cost_per_output_1k_tokens == 0.0:
+            return 0.0
+        output_tokens = self._ledger.average_completion_tokens(self.model) or DEFAULT_ESTIMATED_OUTPUT_TOKENS
+
+        # With the n parameter the prompt is only charged once.
+        prompts = 1 if self.family in N_COMPLETIONS_FAMILIES else completions
+        return (cost_per_input_1k_tokens * self.get_estimated_tokens(api_messages) * prompts +
+                cost_per_output_1k_tokens * output_tokens * completions) / 1000
+
+    def _record_metrics(self, model: str, response_time: float, response_model: str, cost: float) -> None:
+        """Record the timings, tokens and cost of the last request in the metrics registry."""
+        queue = ttft = None
+        attempt = self._last_spinner.winner() if self._last_spinner else None
+        if attempt is not None and attempt.started_at is not None:
+            queue = attempt.started_at - self._last_spinner.started_at
+            if attempt.first_token_at is not None:
+                ttft = attempt.first_token_at - attempt.started_at
+        error = response_model == "Error"
+        prompt_tokens, completion_tokens = (0, 0) if error else self._last_usage
+        self._metrics.record(model, MODEL_INFO[model]["model_family"], response_time, queue=queue or 0.0, ttft=ttft,
+                             prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, cost=cost, error=error)
+
+    def _handle_openai_response(self, response, model_api_name: str) -> Tuple[str, float, str]:
+        """Turn an OpenAI API response into the response text, cost and model name (openai)."""
+        # OpenAI has no status code -- so if we get a response, we assume 200 OK.
+        # See https://community.openai.com/t/http-status-for-chat-completion/541491
+        print()
+        print(f"response = {response}")
+        total_for_both = self._charge(model_api_name, response.usage.prompt_tokens, response.usage.completion_tokens)
+        return response.choices[0].message.content, total_for_both, "openai"
+
+    def _handle_TGW_response(self, response, model_api_name: str) -> Tuple[str, float, str]:
+        """Turn a text-generation-webui http response into the response text, cost and
+           the model name from the response."""
+        if response.status_code == 200:
             result = response.json()
 
             # Print the model so we know which one we're using
             response_model = result['model']
             marker_message(f"\nmodel = {response_model}")
-            cost_per_input_1k_tokens, cost_per_output_1k_tokens = self._get_model_cost_values(self.model_api_name)
 
             # Get the token counts.
             input_tokens = result['usage']['prompt_tokens']
             output_tokens = result['usage']['completion_tokens']
-
-            total_tokens = input_tokens + output_tokens
-            cost_for_input = cost_per_input_1k_tokens * input_tokens / 1000
-            cost_for_output = cost_per_output_1k_tokens * output_tokens / 1000
-            total_for_both = cost_for_input + cost_for_output
-
-            self._total_cost += total_for_both
-            if total_for_both > 0.0:
-                warn_message(f"\nCost: ${cost_for_input:.4f} for input, ${cost_for_output:.4f} for output, total: ${total_for_both:.4f}")
+            total_for_both = self._charge(model_api_name, input_tokens, output_tokens)
             return result["choices"][0]["message"]["content"], total_for_both, response_model
         else:
-            sys.stdout.flush()
-            if response:
-                warn_message(f"Request failed with status code {response.status_code}: {response.text}")
-            return f"{ANSI_BOLD}{ANSI_RED}Error talking to model {self.model_api_name}: response = {str(response)}{ANSI_RESET}", 0.0, "Error"
+            warn_message(f"Request failed with status code {response.status_code}: {response.text}")
+            return f"{ANSI_BOLD}{ANSI_RED}Error talking to model {model_api_name}: response = {str(response)}{ANSI_RESET}", 0.0, "Error"
+
+    def _handle_streamed_response(self, response: StreamedResponse, model_api_name: str,
+                                  api_messages: List[Dict[str, str]]) -> Tuple[str, float, str]:
+        """Turn a streamed response into the response text, cost and the model name from
+           the response.  If the server didn't report usage, we estimate the tokens."""
+        marker_message(f"\nmodel = {response.model}")
+        input_tokens = response.prompt_tokens
+        output_tokens = response.completion_tokens
+        if input_tokens is None or output_tokens is None:
+            input_tokens = self.get_estimated_tokens(api_messages)
+            output_tokens = self._get_estimated_tokens_for_message(response.text)
+            warn_message("Token usage not reported; cost is estimated")
+        total_for_both = self._charge(model_api_name, input_tokens, output_tokens)
+        return response.text, total_for_both, response.model
+
+    def _send_message_to_openai(self, api_messages: List[Dict[str, str]], spinner: Optional[Spinner] = None) -> Tuple[str, float, str]:
+        """Send a message to the OpenAI API and return the response.
+
+           Args:
+           - List[Dict[str, str]]: api_messages is a list of messages to send to the model.
+             These messages contain only what the api will accept.
+           - Optional[Spinner]: spinner is the request if it was already started (see send).
+
+           Returns:
+           - Tuple[str, float]: The response from the model and the cost of the request and model name (openai).
+             Returns an error string if there was a problem.
+        """
+        return self._wait_for_response(api_messages, spinner)
+
+    def _send_message_to_local_TGW(self, api_messages: List[Dict[str, str]], spinner: Optional[Spinner] = None) -> Tuple[str, float, str]:
+        """Send a message to the text-generation-webui in the background and return immediately.
+
+            Args:
+            - List[Dict[str, str]]: api_messages is a list of messages to send to the model.
+              These messages contain only what the api will accept.
+            - Optional[Spinner]: spinner is the request if it was already started (see send).
+            - Returns:
+           - Tuple[str, float]: The response from the model and the cost of the request, and model name from response.
+             Returns an error string if there was a problem.
+        """
+        return self._wait_for_response(api_messages, spinner)
 
     def get_estimated_tokens(self, message_list: List[Dict[str, str]]) -> int:
         """ Get the estimated number of tokens for a list of messages."""
@@ -574,8 +964,10 @@ class TermiChat:
         print("set_model(tmp_model) set the model to use")
         print("display()            display instance info")
         print("send(str, ask=False) send a message to the assistant; user_input can be empty")
+        print("send(str, completions=n) get n answers to choose from")
         print("save(filename)       save the conversation context to a file")
         print("view()               print the formatted conversation stored as self.messages")
+        print("use_draft()          add the partial response from a cancelled request")
         print("run_conversation()   start an infinite loop to keep the conversation going")
 
     def display(self) -> None:
@@ -615,6 +1007,38 @@ class TermiChat:
         for index, message in enumerate(rest_of_messages):
             self._print_message(index + 1, message)
 
+    def use_draft(self, choice: Optional[str] = None) -> None:
+        """Show the partial response kept from a cancelled request and let the user
+           add it (along with the user message that prompted it) to the conversation.
+
+           Args:
+           - str: choice is one of DRAFT_CHOICES; if None, show the draft and ask.
+        """
+        if self.draft is None:
+            print("No draft available.")
+            return
+        if choice is None:
+            info_message(f"Draft from {self.draft['model']}:")
+            print(wrap_text(self.draft["content"]))
+            terminal_menu = TerminalMenu(DRAFT_CHOICES)
+            selected_option = terminal_menu.show()
+            if selected_option is None:
+                return
+            choice = DRAFT_CHOICES[selected_option]
+        if choice == "Keep for later":
+            return
+        if choice == "Add to conversation":
+            if len(self.draft["user_input"]) > 0:
+                self.messages.append({"role": "user", "content": self.draft["user_input"], "timestamp": self._get_timestamp()})
+            self.messages.append({"role": "assistant",
+                                  "content": self.draft["content"],
+                                  "timestamp": self._get_timestamp(),
+                                  "model": self.draft["model"],
+                                  "family": MODEL_INFO[self.draft["model"]]["model_family"],
+                                  "partial": True})
+            print("Draft added to the conversation.")
+        self.draft = None
+
     def clear(self) -> None:
         """Just keep the system message and clear the rest."""
         self.messages = [{"role": "system", "content": self.messages[0]["content"], "timestamp": self._get_timestamp()}]
@@ -629,12 +1053,13 @@ class TermiChat:
         # The new filename becomes the current filename for future saves.
         self.filename = tmpOutputFilename
 
-    def set_max_context(self) -> None:
-        """Set the max context to use."""
+    def set_max_context(self, tmp_input: Optional[str] = None) -> None:
+        """Set the max context to use; if tmp_input is None, ask for it."""
         if len(self.messages) < 2:
             print("No conversation context so max context cannot be changed.")
             return
-        tmp_input = input(f"Enter the max context to use (blank = no change, max = {len(self.messages)-1}): ")
+        if tmp_input is None:
+            tmp_input = input(f"Enter the max context to use (blank = no change, max = {len(self.messages)-1}): ")
         if len(tmp_input) > 0:
             try:
                 tmp_max = int(tmp_input)
@@ -655,176 +1080,382 @@ class TermiChat:
         self._inform_model_cost(self.model_api_name)
         self.assistant_name, self.user_name = get_names_from_cli(self.model)
 
-    def send(self, user_input: str, confirm: bool = False) -> None:
+    def _may_speculate(self) -> bool:
+        """Return True if a request may start before the user confirms it: with --speculate
+           if the model (and the hedge model) cost nothing, or with --speculate-paid."""
+        if not self.speculate:
+            return False
+        if self.speculate_paid:
+            return True
+        models = [self.model] + ([self.hedge_model] if self.hedge_model is not None else [])
+        return all(MODEL_INFO[model]["cost_input"] == 0.0 and MODEL_INFO[model]["cost_output"] == 0.0 for model in models)
+
+    def _reserve(self, api_messages: List[Dict[str, str]], completions: int = 1) -> Tuple[Optional[int], Optional[str]]:
+        """Check the daily/monthly budgets and reserve what sending api_messages should cost.
+
+           Returns:
+           - Tuple[Optional[int], Optional[str]]: the reservation (None if there's nothing to
+             reserve) and, if the request would go over a budget, why (otherwise None).
+        """
+        if self._ledger is None:
+            return None, None
+        estimated_cost = self._estimate_cost(api_messages, completions)
+        if estimated_cost == 0.0:
+            return None, None
+        return self._ledger.reserve(estimated_cost)
+
+    def _abandon(self, speculation: Optional[Spinner], reservation: Optional[int],
+                 api_messages: List[Dict[str, str]]) -> None:
+        """Cancel a speculative request the user decided not to send."""
+        if speculation is not None:
+            speculation.abort()
+        self._record_cancelled(speculation, reservation, api_messages)
+
+    def _record_cancelled(self, spinner: Optional[Spinner], reservation: Optional[int],
+                          api_messages: List[Dict[str, str]], answered: Optional[str] = None) -> None:
+        """Put what cancelled attempts probably cost in the ledger.  Once a request is sent
+           the provider bills the prompt and whatever it generated before we hung up, so each
+           attempt that was sent is charged the estimated prompt tokens plus the tokens of
+           its partial text.  Requests that were never sent (or were free) just release the
+           reservation.  answered is the label of the attempt whose answer we used (e.g., when
+           the hedge won); it's recorded from the response so it's skipped here."""
+        if self._ledger is None:
+            return
+        attempts = spinner.attempts.items() if spinner is not None else []
+        prompt_tokens = None
+        for label, attempt in attempts:
+            if label == answered or attempt.started_at is None or attempt.queued:
+                continue
+            model = self.hedge_model if label == "hedge" else self.model
+            if MODEL_INFO[model]["cost_input"] == 0.0 and MODEL_INFO[model]["cost_output"] == 0.0:
+                continue
+            if prompt_tokens is None:
+                prompt_tokens = self.get_estimated_tokens(api_messages)
+            completion_tokens = self._get_estimated_tokens_for_message("".join(attempt.partial))
+            cost = (MODEL_INFO[model]["cost_input"] * prompt_tokens + MODEL_INFO[model]["cost_output"] * completion_tokens) / 1000
+            self._ledger.record(model, MODEL_INFO[model]["model_family"], prompt_tokens, completion_tokens, cost,
+                                os.path.basename(self.filename), reservation=reservation)
+            reservation = None
+        self._ledger.release(reservation)
+
+    def send(self, user_input: str, confirm: bool = False, completions: int = 1) -> None:
+        """Send user_input (nothing new if empty) with the conversation to the current model
+           and add the answer.  With completions > 1, ask for that many answers, show them
+           and add the one the user picks; the others are kept with it as alternates."""
         if len(user_input) > 0:
             self.messages.append({"role": "user", "content": user_input, "timestamp": self._get_timestamp()})
 
         api_messages = self._prepare_messages_for_api()
 
+        # Speculate: start the request now so it runs while the user reads the send menu,
+        # and abandon it if they cancel.  The budgets are checked first since it may spend.
+        speculation = None
+        reservation = over_budget = None
+        reserved = False
+        if confirm and completions == 1 and self._may_speculate():
+            reservation, over_budget = self._reserve(api_messages, completions)
+            reserved = True
+            if over_budget is None:
+                speculation = self._start_request(api_messages, private=True)
+
         if confirm:
             # Calculate tokens
             estimated_tokens = self.get_estimated_tokens(api_messages)
             print(f"Estimated tokens to be sent: {estimated_tokens}")
 
             # Give the user a chance to read their message and send or cancel.
-            options = [ f"Send to '{self.model}' assistant", "Cancel" ]
+            options = [ f"Send to '{self.model}' assistant" + (f" for {completions} answers" if completions > 1 else ""), "Cancel" ]
             terminal_menu = TerminalMenu(options)
-            selected_option = terminal_menu.show()
+            self._menu_open = speculation is not None
+            try:
+                selected_option = terminal_menu.show()
+            except KeyboardInterrupt:
+                self._abandon(speculation, reservation, api_messages)
+                raise
+            finally:
+                self._menu_open = False
             if selected_option is None:
                 # Escape was pressed so do nothing.
+                self._abandon(speculation, reservation, api_messages)
                 confirm = 'cancel'
                 self.messages.pop()
                 return
             else:
                 confirm = options[selected_option]
             if confirm.lower() == 'cancel':
+                self._abandon(speculation, reservation, api_messages)
                 warn_message("Message canceled.")
                 self.messages.pop()
                 return
+        confirmed_at = time.time()
+
+        # Check the daily/monthly budgets before spending anything.
+        if not reserved:
+            reservation, over_budget = self._reserve(api_messages, completions)
+        if over_budget is not None:
+            warn_message(over_budget)
+            if len(user_input) > 0:
+                self.messages.pop()
+            return
 
-        start_time = time.time()  # Start timing
-
-        if self.family == "openai" or self.family == "openrouter.ai":
-            assistant_response, tmp_cost, tmp_response_model = self._send_message_to_openai(api_messages)
+        # A speculative request has been running since before the menu.
+        start_time = speculation.started_at if speculation is not None else time.time()
+
+        self._last_model = None
+        self._last_spinner = None
+        self._last_usage = (0, 0)
+        if completions > 1:
+            answers, tmp_cost, tmp_response_model = self._wait_for_completions(api_messages, completions)
+            assistant_response = ""
+            if tmp_response_model == "Error":
+                assistant_response = f"{ANSI_BOLD}{ANSI_RED}Error talking to model {self.model_api_name}: no answers{ANSI_RESET}"
+        elif self.family in OPENAI_COMPATIBLE_FAMILIES:
+            assistant_response, tmp_cost, tmp_response_model = self._send_message_to_openai(api_messages, speculation)
         elif self.family == "text-generation-webui":
-            assistant_response, tmp_cost, tmp_response_model = self._send_message_to_local_TGW(api_messages)
+            assistant_response, tmp_cost, tmp_response_model = self._send_message_to_local_TGW(api_messages, speculation)
         else:
-            print(f"Unsupported model family: {family}")
+            print(f"Unsupported model family: {self.family}")
+            if self._ledger is not None:
+                self._ledger.release(reservation)
             return
 
         end_time = time.time()  # End timing
+        if self._ledger is not None:
+            if tmp_response_model == "Cancelled":
+                self._record_cancelled(self._last_spinner, reservation, api_messages)
+            elif tmp_response_model == "Error":
+                self._ledger.release(reservation)
+            else:
+                answered = self._last_model or self.model
+                self._ledger.record(answered, MODEL_INFO[answered]["model_family"], self._last_usage[0],
+                                    self._last_usage[1], tmp_cost, os.path.basename(self.filename),
+                                    reservation=reservation)
+                # The attempt that lost a hedge was sent too and the provider bills it.
+                if completions == 1 and self._last_spinner is not None:
+                    self._record_cancelled(self._last_spinner, None, api_messages, answered=self._last_spinner.source)
+
+        if tmp_response_model == "Cancelled":
+            # Ctrl-C: forget the user message like the Cancel menu option does
+            # but keep any partial response in case it's useful.
+            print()
+            warn_message("Request cancelled.")
+            if len(user_input) > 0:
+                self.messages.pop()
+            if assistant_response:
+                self.draft = {"content": assistant_response, "model": self.model, "user_input": user_input}
+                info_message(f"Kept {len(assistant_response)} characters of partial response as a draft (see the draft command).")
+            return
 
         print()
         dashes()
         response_time = end_time - start_time
         warn_message(f"Response time: {response_time:.2f} seconds")
-
-        info_message(f"{self.assistant_name}")
-        print(wrap_text(assistant_response))
-        self.messages.append({"role": "assistant",
-                 "content": assistant_response,
-                 "timestamp": self._get_timestamp(),
-                 "model": self.model,
-                 "family": self.family,
-                 "response_seconds": round(response_time, 2),
-                 "response_model": tmp_response_model,
-                 "cost_dollars": tmp_cost})
+        if speculation is not None:
+            info_message(f"Sent {confirmed_at - start_time:.2f} seconds before you confirmed; "
+                         f"answered {max(0.0, end_time - confirmed_at):.2f} seconds after")
+        answered_by = self._last_model or self.model
+
+        # Several answers at once aren't a fair sample of the model's usual latency.  The
+        # model's latency counts from when the request was sent, not from when it started
+        # waiting in line for a local server.
+        spinner = self._last_spinner
+        if tmp_response_model != "Error" and completions == 1:
+            attempt = spinner.winner() if spinner is not None else None
+            model_seconds = end_time - attempt.started_at if attempt is not None and attempt.started_at else response_time
+            self._latency.record(answered_by, model_seconds)
+            self._latency.save()
+            # A response that isn't streamed starts when it all arrives.
+            first_token_seconds = model_seconds
+            if attempt is not None and attempt.started_at and attempt.first_token_at is not None:
+                first_token_seconds = attempt.first_token_at - attempt.started_at
+            self._first_token.record(answered_by, first_token_seconds)
+            self._first_token.save()
+        elif completions == 1 and spinner is not None and spinner.timed_out:
+            # It took at least this long; without this the timeout could never grow.
+            attempt = spinner.attempts.get("primary")
+            model_seconds = end_time - attempt.started_at if attempt is not None and attempt.started_at else response_time
+            self._latency.record_timeout(self.model, model_seconds)
+            self._latency.save()
+            if attempt is None or attempt.first_token_at is None:
+                self._first_token.record_timeout(self.model, model_seconds)
+                self._first_token.save()
+        self._record_metrics(answered_by, response_time, tmp_response_model, tmp_cost)
+
+        alternates = []
+        if completions > 1 and tmp_response_model != "Error":
+            chosen = self._choose_answer(answers)
+            if chosen is None:
+                warn_message("Answers discarded.")
+                if len(user_input) > 0:
+                    self.messages.pop()
+                return
+            assistant_response = answers[chosen]["content"]
+            tmp_response_model = answers[chosen]["response_model"]
+            alternates = answers[:chosen] + answers[chosen + 1:]
+            info_message(f"Using answer {chosen + 1} from {self.assistant_name}")
+        else:
+            info_message(f"{self.assistant_name}")
+            print(wrap_text(assistant_response))
+        message = {"role": "assistant",
+                   "content": assistant_response,
+                   "timestamp": self._get_timestamp(),
+                   "model": answered_by,
+                   "family": MODEL_INFO[answered_by]["model_family"],
+                   "response_seconds": round(response_time, 2),
+                   "response_model": tmp_response_model,
+                   "cost_dollars": tmp_cost}
+        if alternates:
+            message["alternates"] = alternates
+        self.messages.append(message)
 
     def run_conversation(self):
         # Start an infinite loop to keep the conversation going
         while True:
             user_input = self._get_multiline_input("\nEnter your command (type control-d for options), or your conversation text:")
+            if not self.handle_command(user_input):
+                break
 
-            if user_input.lower() == 'm' or user_input.lower() == 'menu' or user_input.lower() == '':
-                options = list(MENU_ITEMS.keys())
-                terminal_menu = TerminalMenu(options)
-                selected_option = terminal_menu.show()
-                if selected_option is None:
-                    # Escape was pressed so do nothing.
-                    continue
-                user_input = MENU_ITEMS[options[selected_option]]
+    def handle_command(self, user_input: str) -> bool:
+        """Act on one input from the user: a command (or the menu) or text to send.
 
-            if user_input.lower() == 'model':
-                options = list(MODEL_MENU_ITEMS.keys())
-                terminal_menu = TerminalMenu(options)
-                selected_option = terminal_menu.show()
-                if selected_option is None:
-                    # Escape was pressed so do nothing.
-                    print("Model not changed.")
-                    continue
-                tmp_model = MODEL_MENU_ITEMS[options[selected_option]]
-                self.set_model(tmp_model)
-
-            elif user_input.lower() == 'info':
-                tmp_info = get_model_info(self.model_api_name)
-                print()
-                print(tmp_info)
-                print()
-
-            elif user_input.lower() == 'names':
-                tmp_input = input(f"Enter the assistant name (blank = no change, default = {assistant_name}): ")
-                if len(tmp_input) > 0:
-                    self.assistant_name = tmp_input
-                    print(f"Assistant name changed to {self.assistant_name}.")
-                else:
-                    print(f"Assistant name not changed.")
-                tmp_input = input(f"Enter the user name (blank = no change, default = {user_name}): ")
-                if len(tmp_input) > 0:
-                    self.user_name = tmp_input
-                    print(f"User name changed to {user_name}.")
-                else:
-                    print(f"User name not changed.")
-                continue
+           Returns:
+           - bool: False if the user quit.
+        """
+        if user_input.lower() == 'm' or user_input.lower() == 'menu' or user_input.lower() == '':
+            options = list(MENU_ITEMS.keys())
+            terminal_menu = TerminalMenu(options)
+            selected_option = terminal_menu.show()
+            if selected_option is None:
+                # Escape was pressed so do nothing.
+                return True
+            user_input = MENU_ITEMS[options[selected_option]]
+
+        if user_input.lower() == 'model':
+            # Too many models for a menu; type to narrow them down.
+            latency = {name: self._latency.percentile(name, 50) for name in MODEL_MENU_ITEMS}
+            index = ModelIndex(AVAILABLE_MODELS, load_recent(), {name: seconds for name, seconds in latency.items() if seconds is not None})
+            selected_model = pick_model(index, self.model)
+            if selected_model is None:
+                # Escape was pressed so do nothing.
+                print("Model not changed.")
+                return True
+            remember_recent(selected_model)
+            self.set_model(MODEL_MENU_ITEMS[selected_model])
 
-            elif user_input.lower() == 'max':
-                self.set_max_context()
-
-            elif user_input.lower() == 'view':
-                self.view()
-
-            elif user_input.lower() == 'clear':
-                self.clear()
-
-            elif user_input.lower() == 'save':
-                tmpOutputFilename = input("Enter filename to save the context (enter means current one): ")
-                if tmpOutputFilename == "":
-                    tmpOutputFilename = self.filename
-                self.save(tmpOutputFilename)
-
-            elif user_input.lower() == 'load':
-                if self.original_messages != json.dumps(self.messages):
-                    warn_message("You have unsaved changes; load anyway?")
-
-                    # Print a menu for yes/no.
-                    options = ["Yes", "No"]
-                    terminal_menu = TerminalMenu(options)
-                    selected_option = terminal_menu.show()
-                    if selected_option is None:
-                        # Escape was pressed so do nothing.
-                        continue
-                    if options[selected_option].lower() == "no":
-                        continue
-                # The new chosen filename becomes the current filename for future saves.
-                self.filename, self.messages, self.original_messages = self.check_load_file(self.filename)
-
-            elif user_input.lower() == 'quit':
-                if self.original_messages != json.dumps(self.messages):
-                    print("You have unsaved changes. Please save your context before quitting.")
-                    continue
-                print("Quitting.\n")
-                break
+        elif user_input.lower() == 'info':
+            tmp_info = get_model_info(self.model_api_name)
+            print()
+            print(tmp_info)
+            print()
 
-            elif user_input.lower() == 'exit':
+        elif user_input.lower() == 'names':
+            tmp_input = input(f"Enter the assistant name (blank = no change, default = {assistant_name}): ")
+            if len(tmp_input) > 0:
+                self.assistant_name = tmp_input
+                print(f"Assistant name changed to {self.assistant_name}.")
+            else:
+                print(f"Assistant name not changed.")
+            tmp_input = input(f"Enter the user name (blank = no change, default = {user_name}): ")
+            if len(tmp_input) > 0:
+                self.user_name = tmp_input
+                print(f"User name changed to {user_name}.")
+            else:
+                print(f"User name not changed.")
+            return True
+
+        elif user_input.lower() == 'max':
+            self.set_max_context()
+
+        elif user_input.lower() == 'view':
+            self.view()
+
+        elif user_input.lower() == 'stats':
+            print()
+            print(self._metrics.format_stats())
+            print()
+
+        elif user_input.lower() == 'draft':
+            self.use_draft()
+
+        elif user_input.lower() == 'clear':
+            self.clear()
+
+        elif user_input.lower() == 'save':
+            tmpOutputFilename = input("Enter filename to save the context (enter means current one): ")
+            if tmpOutputFilename == "":
+                tmpOutputFilename = self.filename
+            self.save(tmpOutputFilename)
+
+        elif user_input.lower() == 'load':
+            if self.original_messages != json.dumps(self.messages):
+                warn_message("You have unsaved changes; load anyway?")
 
-                # If the user has unsaved changes, we'll print a warning.
-                if self.original_messages != json.dumps(self.messages):
-                    warn_message("You have unsaved changes. Are you sure you want to exit without saving?")
-                else:
-                    print("Goodbye.\n")
-                    break
                 # Print a menu for yes/no.
                 options = ["Yes", "No"]
                 terminal_menu = TerminalMenu(options)
                 selected_option = terminal_menu.show()
                 if selected_option is None:
                     # Escape was pressed so do nothing.
-                    continue
-                if options[selected_option].lower() == "yes":
-                    warn_message("Exited with unsaved changes.\n")
-                    break
+                    return True
+                if options[selected_option].lower() == "no":
+                    return True
+            # The new chosen filename becomes the current filename for future saves.
+            self.filename, self.messages, self.original_messages = self.check_load_file(self.filename)
+
+        elif user_input.lower() == 'quit':
+            if self.original_messages != json.dumps(self.messages):
+                print("You have unsaved changes. Please save your context before quitting.")
+                return True
+            print("Quitting.\n")
+            return False
+
+        elif user_input.lower() == 'exit':
+
+            # If the user has unsaved changes, we'll print a warning.
+            if self.original_messages != json.dumps(self.messages):
+                warn_message("You have unsaved changes. Are you sure you want to exit without saving?")
+            else:
+                print("Goodbye.\n")
+                return False
+            # Print a menu for yes/no.
+            options = ["Yes", "No"]
+            terminal_menu = TerminalMenu(options)
+            selected_option = terminal_menu.show()
+            if selected_option is None:
+                # Escape was pressed so do nothing.
+                return True
+            if options[selected_option].lower() == "yes":
+                warn_message("Exited with unsaved changes.\n")
+                return False
+        else:
+
+            if user_input.lower() == 'answers':
+                if len(self.messages) < 2:
+                    print("No conversation context to send to the assistant.")
+                    return True
+                tmp_input = input(f"How many answers (2-{MAX_COMPLETIONS}, blank = {DEFAULT_COMPLETIONS}): ")
+                try:
+                    completions = int(tmp_input) if tmp_input else DEFAULT_COMPLETIONS
+                except ValueError:
+                    print("Invalid number of answers. Please enter an integer.")
+                    return True
+                if not 2 <= completions <= MAX_COMPLETIONS:
+                    print(f"Invalid number of answers. Please enter a value from 2 to {MAX_COMPLETIONS}.")
+                    return True
+                print(f"Sending {ANSI_LIGHTBLUE}unchanged{ANSI_RESET} conversation context to {self.model} assistant for {completions} answers...")
+                self.send("", True, completions)
+            elif user_input.lower() == 'resend':
+                # If the user sends a message, we'll send it to the assistant and then print the response.
+                # We'll also track the time it takes to get the response.
+                if len(self.messages) < 2:
+                    print("No conversation context to send to the assistant.")
+                    return True
+                print(f"Sending {ANSI_LIGHTBLUE}unchanged{ANSI_RESET} conversation context to {self.model} assistant...")
+                self.send("", True)
             else:
+                # Add the user's input to the messages
+                print(f"Sending conversation context to {self.model} assistant...")
+                self.send(user_input, True)
 
-                if user_input.lower() == 'resend':
-                    # If the user sends a message, we'll send it to the assistant and then print the response.
-                    # We'll also track the time it takes to get the response.
-                    if len(self.messages) < 2:
-                        print("No conversation context to send to the assistant.")
-                        continue
-                    print(f"Sending {ANSI_LIGHTBLUE}unchanged{ANSI_RESET} conversation context to {self.model} assistant...")
-                    self.send("", True)
-                else:
-                    # Add the user's input to the messages
-                    print(f"Sending conversation context to {self.model} assistant...")
-                    self.send(user_input, True)
 
- 
+        return True
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+"""
+Admission control for the local model servers (ollama and
+text-generation-webui) shared by every termi-chat process on this machine:
+the CLI, Streamlit and the proxy.
+
+A local server runs one model at a time well; requests for different models
+at once make it swap models in and out of memory over and over.  So before a
+request is sent to a local server it takes a ticket and waits until it's
+admitted: at most TERMI_CHAT_LOCAL_SLOTS (default 1) requests per server are
+in flight.  When a slot frees up, waiting requests for a model that's already
+loaded go first (so requests for one model are batched together) unless
+someone has waited more than MAX_REORDER_SECONDS, then it's first come,
+first served.  Waiters are told their place in line.
+
+The queue for each server is a small json file in ~/.termi-chat/admission,
+read and written while holding an flock on a lock file next to it.  Tickets
+of processes that died are dropped.
+
+  ./admission.py             # show who's running and waiting
+  ./admission.py --watch
+"""
+
+import os
+import sys
+import json
+import time
+import fcntl
+import argparse
+import itertools
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+from utils import TERMI_CHAT_HOME
+
+ADMISSION_DIR = os.path.join(TERMI_CHAT_HOME, "admission")
+
+# The model families served from this machine.
+LOCAL_FAMILIES = ["ollama", "text-generation-webui"]
+
+# Requests in flight per local server.
+LOCAL_SLOTS = int(os.environ.get("TERMI_CHAT_LOCAL_SLOTS", "1"))
+
+# A request for a loaded model doesn't jump ahead of one that's waited this long.
+MAX_REORDER_SECONDS = 60
+
+# How often waiters check whether it's their turn.
+POLL_SECONDS = 0.2
+
+_ticket_numbers = itertools.count(1)
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class AdmissionQueue:
+    def __init__(self, backend: str, slots: int = LOCAL_SLOTS, directory: str = ADMISSION_DIR):
+        self.backend = backend
+        self.slots = slots
+        self.directory = directory
+        self.state_file = os.path.join(directory, f"{backend}.json")
+        self.lock_file = os.path.join(directory, f"{backend}.lock")
+
+    @contextmanager
+    def _locked(self):
+        """Yield the queue state with the lock held and write it back afterwards."""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.lock_file, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.state_file, 'r') as file:
+                        state = json.load(file)
+                except (OSError, ValueError):
+                    state = {}
+                state.setdefault("running", [])
+                state.setdefault("waiting", [])
+                state.setdefault("loaded", None)
+                for name in ("running", "waiting"):
+                    state[name] = [ticket for ticket in state[name] if _alive(ticket["pid"])]
+                yield state
+                tmp_filename = f"{self.state_file}.{os.getpid()}.tmp"
+                with open(tmp_filename, 'w') as file:
+                    json.dump(state, file)
+                os.replace(tmp_filename, self.state_file)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _order(state: dict, now: float) -> List[dict]:
+        """Return the waiting tickets in the order they'll be admitted."""
+        loaded = {ticket["model"] for ticket in state["running"]} or {state["loaded"]}
+
+        def key(ticket: dict):
+            overdue = now - ticket["ts"] > MAX_REORDER_SECONDS
+            return (not overdue, ticket["model"] not in loaded, ticket["ts"])
+        return sorted(state["waiting"], key=key)
+
+    def admit(self, model: str, cancelled: Optional[threading.Event] = None,
+              on_wait: Optional[Callable[[int], None]] = None) -> Optional[str]:
+        """Wait for a slot to send a request for model.  on_wait(place) is called when
+           our place in line (1 is next) changes and on_wait(0) when we're admitted after
+           waiting.
+
+           Returns:
+           - Optional[str]: the ticket to pass to release(); None if cancelled was set
+             while we waited.
+        """
+        ticket = {"id": f"{os.getpid()}-{threading.get_ident()}-{next(_ticket_numbers)}", "pid": os.getpid(),
+                  "model": model, "ts": time.time()}
+        with self._locked() as state:
+            state["waiting"].append(ticket)
+        place = None
+        try:
+            while True:
+                with self._locked() as state:
+                    order = self._order(state, time.time())
+                    mine = [index for index, waiting in enumerate(order) if waiting["id"] == ticket["id"]]
+                    if not mine:
+                        # Someone cleaned up our ticket (we looked dead); get back in line.
+                        ticket["ts"] = time.time()
+                        state["waiting"].append(ticket)
+                        continue
+                    if mine[0] < self.slots - len(state["running"]):
+                        state["waiting"] = [waiting for waiting in state["waiting"] if waiting["id"] != ticket["id"]]
+                        state["running"].append(ticket)
+                        state["loaded"] = model
+                        admitted, ticket = ticket["id"], None
+                        break
+                if place != mine[0] + 1:
+                    place = mine[0] + 1
+                    if on_wait is not None:
+                        on_wait(place)
+                if cancelled is not None:
+                    if cancelled.wait(POLL_SECONDS):
+                        return None
+                else:
+                    time.sleep(POLL_SECONDS)
+        finally:
+            # Leave the line if we gave up (cancelled or Ctrl-C).
+            if ticket is not None:
+                with self._locked() as state:
+                    state["waiting"] = [waiting for waiting in state["waiting"] if waiting["id"] != ticket["id"]]
+        if place is not None and on_wait is not None:
+            on_wait(0)
+        return admitted
+
+    def release(self, ticket: Optional[str]) -> None:
+        if ticket is None:
+            return
+        with self._locked() as state:
+            state["running"] = [running for running in state["running"] if running["id"] != ticket]
+
+    @contextmanager
+    def slot(self, model: str, cancelled: Optional[threading.Event] = None,
+             on_wait: Optional[Callable[[int], None]] = None):
+        """admit() and release() around a request; yields False if cancelled while waiting."""
+        ticket = self.admit(model, cancelled, on_wait)
+        try:
+            yield ticket is not None
+        finally:
+            self.release(ticket)
+
+    def idle(self) -> bool:
+        """Return True if nothing is running or waiting."""
+        with self._locked() as state:
+            return not state["running"] and not state["waiting"]
+
+    def snapshot(self) -> Dict[str, list]:
+        """Return the running tickets and the waiting ones in admission order."""
+        with self._locked() as state:
+            return {"running": state["running"], "waiting": self._order(state, time.time())}
+
+# One queue per local server.
+ADMISSION = {family: AdmissionQueue(family) for family in LOCAL_FAMILIES}
+
+def format_queues() -> str:
+    lines = []
+    now = time.time()
+    for family, queue in ADMISSION.items():
+        snapshot = queue.snapshot()
+        lines.append(f"{family} ({len(snapshot['running'])} of {queue.slots} slots in use)")
+        for ticket in snapshot["running"]:
+            lines.append(f"  running  {ticket['model']:40} pid {ticket['pid']:<8} {now - ticket['ts']:.0f}s")
+        for place, ticket in enumerate(snapshot["waiting"], 1):
+            lines.append(f"  #{place:<7} {ticket['model']:40} pid {ticket['pid']:<8} {now - ticket['ts']:.0f}s")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the requests running and waiting for the local model servers")
+    parser.add_argument("--watch", action="store_true", help="refresh every second")
+    args = parser.parse_args()
+    if not args.watch:
+        print(format_queues())
+        return
+    try:
+        while True:
+            sys.stdout.write("\033[H\033[J" + format_queues() + "\n")
+            sys.stdout.flush()
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+"""
+Spend and latency trends across the whole conversation archive.
+
+  ./analyze.py ../termi-chats                     # per model and per day
+  ./analyze.py ../termi-chats --by conversation --top 20
+  ./analyze.py ../termi-chats --since 2024-03-01 --by model day conversation
+
+Every assistant message in the archive (the json files under the given
+directories) becomes a row in a columnar (Parquet) dataset in
+~/.termi-chat/archive: conversation, day, model, family, cost_dollars and
+response_seconds.  The first run parses every file using a process pool;
+later runs only parse files that changed since the last run (and drop files
+that were deleted), so analyzing a large archive stays quick.  The
+summaries are computed on the columns with pyarrow's group_by.
+"""
+
+import os
+import sys
+import json
+import glob
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from tabulate import tabulate
+from ModelInfo import MODEL_INFO
+from utils import TERMI_CHAT_HOME
+
+DEFAULT_DATASET_DIR = os.path.join(TERMI_CHAT_HOME, "archive")
+
+# Parse in the process pool only when there's enough work to pay for starting it.
+MIN_FILES_FOR_POOL = 32
+
+# Merge the dataset's parts into one when there are more than this.
+MAX_PARTS = 16
+
+SCHEMA = pa.schema([
+    ("conversation", pa.string()),
+    ("day", pa.string()),
+    ("model", pa.string()),
+    ("family", pa.string()),
+    ("cost_dollars", pa.float64()),
+    ("response_seconds", pa.float64()),
+])
+
+def read_conversation(filename: str) -> Dict[str, list]:
+    """Return the columns (see SCHEMA) for the assistant messages in one conversation file.
+       Files that aren't termi-chat conversations give no rows."""
+    columns = {name: [] for name in SCHEMA.names}
+    try:
+        with open(filename, 'r') as file:
+            messages = json.load(file)
+    except (OSError, ValueError):
+        return columns
+    if not isinstance(messages, list):
+        return columns
+    for message in messages:
+        if not isinstance(message, dict) or message.get("role") != "assistant":
+            continue
+        model = message.get("model") or "unknown"
+
+        # termi-chat writes YYYY-MM-DD-HH:MM:SS and Streamlit YYYY-MM-DD-HH:MM.
+        timestamp = message.get("timestamp") or ""
+        cost = message.get("cost_dollars", message.get("cost"))
+        seconds = message.get("response_seconds")
+        columns["conversation"].append(filename)
+        columns["day"].append(timestamp[:10] or None)
+        columns["model"].append(model)
+        columns["family"].append(message.get("family") or MODEL_INFO.get(model, {}).get("model_family"))
+        columns["cost_dollars"].append(float(cost) if isinstance(cost, (int, float)) else None)
+        columns["response_seconds"].append(float(seconds) if isinstance(seconds, (int, float)) else None)
+    return columns
+
+class ArchiveDataset:
+    """The Parquet parts plus a manifest of which part holds each conversation file
+       (and the file's mtime and size when it was read)."""
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.manifest_file = os.path.join(directory, "manifest.json")
+        self.manifest = {"files": {}, "next_part": 0}
+        try:
+            with open(self.manifest_file, 'r') as file:
+                self.manifest = json.load(file)
+        except (OSError, ValueError):
+            pass
+
+    def _save_manifest(self) -> None:
+        tmp_filename = f"{self.manifest_file}.{os.getpid()}.tmp"
+        with open(tmp_filename, 'w') as file:
+            json.dump(self.manifest, file)
+        os.replace(tmp_filename, self.manifest_file)
+
+    def _new_part(self) -> str:
+        part = f"part-{self.manifest['next_part']:05d}.parquet"
+        self.manifest["next_part"] += 1
+        return part
+
+    def update(self, filenames: List[str], workers: Optional[int]) -> int:
+        """Read the files that are new or changed into a new part.
+
+           Returns:
+           - int: the number of files read
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        files = self.manifest["files"]
+        current = {}
+        for filename in filenames:
+            stat = os.stat(filename)
+            current[filename] = [stat.st_mtime, stat.st_size]
+        changed = [filename for filename, signature in current.items()
+                   if files.get(filename, {}).get("signature") != signature]
+        # Files that weren't asked for this time (e.g., a different directory or glob)
+        # stay in the dataset; only the ones that are gone from disk are dropped.
+        deleted = [filename for filename in files if filename not in current and not os.path.exists(filename)]
+        if not changed and not deleted:
+            return 0
+
+        if len(changed) >= MIN_FILES_FOR_POOL and workers != 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(read_conversation, changed, chunksize=16))
+        else:
+            results = [read_conversation(filename) for filename in changed]
+
+        if changed:
+            part = self._new_part()
+            columns = {name: [value for result in results for value in result[name]] for name in SCHEMA.names}
+            pq.write_table(pa.Table.from_pydict(columns, schema=SCHEMA), os.path.join(self.directory, part))
+            for filename in changed:
+                files[filename] = {"signature": current[filename], "part": part}
+        for filename in deleted:
+            del files[filename]
+        self._save_manifest()
+        self._drop_unused_parts()
+        if len(self._parts()) > MAX_PARTS:
+            self.compact()
+        return len(changed)
+
+    def _parts(self) -> Dict[str, List[str]]:
+        """Return the conversation files that each part is the current copy for."""
+        parts: Dict[str, List[str]] = {}
+        for filename, entry in self.manifest["files"].items():
+            parts.setdefault(entry["part"], []).append(filename)
+        return parts
+
+    def _drop_unused_parts(self) -> None:
+        used = self._parts()
+        for path in glob.glob(os.path.join(self.directory, "part-*.parquet")):
+            if os.path.basename(path) not in used:
+                os.unlink(path)
+
+    def table(self) -> pa.Table:
+        """Return every current row; a part can hold old copies of files that were read again later."""
+        tables = []
+        for part, filenames in self._parts().items():
+            table = pq.read_table(os.path.join(self.directory, part))
+            tables.append(table.filter(pc.is_in(table["conversation"], value_set=pa.array(filenames, pa.string()))))
+        if not tables:
+            return SCHEMA.empty_table()
+        return pa.concat_tables(tables)
+
+    def compact(self) -> None:
+        """Rewrite the current rows as one part."""
+        table = self.table()
+        part = self._new_part()
+        pq.write_table(table, os.path.join(self.directory, part))
+        for entry in self.manifest["files"].values():
+            entry["part"] = part
+        self._save_manifest()
+        self._drop_unused_parts()
+
+def archive_files(paths: List[str]) -> List[str]:
+    """Return the json files in paths (files or directories, searched recursively)."""
+    filenames = []
+    for path in paths:
+        if os.path.isdir(path):
+            filenames.extend(glob.glob(os.path.join(path, "**", "*.json"), recursive=True))
+        else:
+            filenames.append(path)
+    return sorted({os.path.abspath(filename) for filename in filenames})
+
+def summarize(table: pa.Table, key: str, top: Optional[int]) -> str:
+    """Return a table of messages, cost and response time per key (model, day or conversation)."""
+    table = table.filter(pc.is_valid(table[key]))
+    grouped = table.group_by(key).aggregate([
+        ("model", "count"),
+        ("cost_dollars", "sum"),
+        ("cost_dollars", "mean"),
+        ("response_seconds", "mean"),
+        ("response_seconds", "approximate_median"),
+        ("response_seconds", "max"),
+    ])
+    sort_key = key if key == "day" else "cost_dollars_sum"
+    grouped = grouped.sort_by([(sort_key, "ascending" if key == "day" else "descending")])
+    if top is not None:
+        grouped = grouped.slice(0, top)
+
+    def dollars(value):
+        return "-" if value is None else f"${value:.5f}"
+
+    def seconds(value):
+        return "-" if value is None else f"{value:.2f}"
+
+    rows = []
+    for row in grouped.to_pylist():
+        label = row[key]
+        if key == "conversation":
+            label = os.path.basename(label)
+        rows.append([label, row["model_count"], dollars(row["cost_dollars_sum"]), dollars(row["cost_dollars_mean"]),
+                     seconds(row["response_seconds_mean"]), seconds(row["response_seconds_approximate_median"]),
+                     seconds(row["response_seconds_max"])])
+    return tabulate(rows, headers=[key.capitalize(), "Responses", "Total Cost", "Avg Cost", "Avg Seconds",
+                                   "Median Seconds", "Max Seconds"], tablefmt="grid")
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize cost and response time across the conversation archive")
+    parser.add_argument("paths", nargs="*", default=["termi-chats"], help="conversation files or directories")
+    parser.add_argument("--by", nargs="+", default=["model", "day"], choices=["model", "day", "conversation"])
+    parser.add_argument("--since", help="only messages from this day (YYYY-MM-DD) on")
+    parser.add_argument("--top", type=int, help="show only this many rows per table")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET_DIR, help="where to keep the columnar dataset")
+    parser.add_argument("--workers", type=int, help="processes for reading files (default: one per CPU)")
+    parser.add_argument("--rebuild", action="store_true", help="read every file again")
+    args = parser.parse_args()
+
+    filenames = archive_files(args.paths)
+    if not filenames:
+        print(f"No conversation files found in {', '.join(args.paths)}")
+        sys.exit(1)
+    dataset = ArchiveDataset(args.dataset)
+    if args.rebuild:
+        dataset.manifest["files"] = {}
+
+    read = dataset.update(filenames, args.workers)
+    print(f"{len(filenames)} conversation files ({read} read, {len(filenames) - read} unchanged)")
+
+    # The dataset can hold files from other runs; report on the ones asked for.
+    table = dataset.table()
+    table = table.filter(pc.is_in(table["conversation"], value_set=pa.array(filenames, pa.string())))
+    if args.since:
+        table = table.filter(pc.greater_equal(table["day"], args.since))
+    for key in args.by:
+        print()
+        print(summarize(table, key, args.top))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Background inference for the Streamlit app.  Streamlit reruns the script on
+every click and a request made inline in the script is lost when that
+happens, so sends become jobs: the request runs on a shared worker pool and
+the result is added to the conversation when it's done, whatever the user
+did in the meantime.  The page polls the queue to show progress.
+
+Each conversation has a JobQueue.  Its jobs run one at a time, in the order
+they were sent, so each prompt sees the answers to the ones before it;
+different conversations run in parallel on the pool.
+
+Finished jobs are kept for a while so every session showing a conversation
+can show how its requests went (see finished_since).
+"""
+
+import time
+import threading
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+# Requests running at once across all conversations.
+JOB_WORKERS = 4
+
+# Finished jobs each queue remembers.
+KEEP_FINISHED = 50
+
+_job_ids = itertools.count(1)
+
+class Job:
+    def __init__(self, prompt: str, model: str):
+        self.id = next(_job_ids)
+        self.prompt = prompt
+        self.model = model
+
+        # queued -> running -> done (or error)
+        self.status = "queued"
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+
+        # Place in line while waiting for a local model server (see admission.py).
+        self.place: Optional[int] = None
+
+    def wait_in_line(self, place: int) -> None:
+        """AdmissionQueue on_wait callback; 0 means we're through."""
+        self.place = place or None
+
+    def finished(self) -> bool:
+        return self.status in ("done", "error")
+
+    def elapsed(self) -> float:
+        """Seconds since the job started running (or was sent if it's still queued)."""
+        return (self.finished_at or time.time()) - (self.started_at or self.submitted_at)
+
+class JobQueue:
+    def __init__(self, pool: ThreadPoolExecutor):
+        self.pool = pool
+        self.jobs: List[Job] = []
+        self._waiting: List[tuple] = []
+        self._running = False
+        self._lock = threading.Lock()
+
+    def submit(self, job: Job, run: Callable[[Job], None]) -> Job:
+        """Queue job; run(job) does the request and adds the result to the conversation.
+           run can set job.error to report a problem."""
+        with self._lock:
+            self.jobs.append(job)
+            self._waiting.append((job, run))
+            if not self._running:
+                self._start_next()
+        return job
+
+    def _start_next(self) -> None:
+        # Called with the lock held.
+        if not self._waiting:
+            self._running = False
+            return
+        self._running = True
+        self.pool.submit(self._run, *self._waiting.pop(0))
+
+    def _run(self, job: Job, run: Callable[[Job], None]) -> None:
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            run(job)
+        except Exception as e:
+            job.error = f"Error: {e}"
+        finally:
+            job.finished_at = time.time()
+            job.status = "error" if job.error else "done"
+            with self._lock:
+                finished = [old for old in self.jobs if old.finished()]
+                forget = {old.id for old in finished[:-KEEP_FINISHED]}
+                if forget:
+                    self.jobs = [old for old in self.jobs if old.id not in forget]
+                self._start_next()
+
+    def pending(self) -> List[Job]:
+        return [job for job in self.jobs if not job.finished()]
+
+    def finished_since(self, job_id: int) -> List[Job]:
+        """Return the finished jobs sent after job job_id.  Jobs finish in the order they
+           were sent so a session only needs to remember the last one it showed."""
+        with self._lock:
+            return [job for job in self.jobs if job.finished() and job.id > job_id]
+
+def new_pool(workers: int = JOB_WORKERS) -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="termi-chat-job")
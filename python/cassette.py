@@ -0,0 +1,366 @@
+"""
+Record/replay of provider HTTP traffic ("cassettes") so performance changes
+can be tested offline, for free, and reproducibly.
+
+  TERMI_CHAT_CASSETTE=calls.jsonl TERMI_CHAT_CASSETTE_MODE=record   # talk to the real providers and save
+  TERMI_CHAT_CASSETTE=calls.jsonl TERMI_CHAT_CASSETTE_MODE=replay   # serve the saved responses, no network
+
+Each interaction is one JSON line with the request (method, url, body) and
+the response (status, headers, and the body as chunks with the time each
+one arrived).  Replay sleeps to reproduce the original timing scaled by
+TERMI_CHAT_REPLAY_SCALE (1 = original, 0.5 = twice as fast, 0 = no delay).
+
+A replayed request is matched on method, url and body.  If there's no exact
+match (e.g., the conversation grew), we use the next recording for the same
+url and model so a session can still be replayed after small changes.
+
+This works at the transport level so it covers every client we use: the
+httpx based ones (OpenAI SDK, ollama) and requests (text-generation-webui).
+"""
+
+import os
+import json
+import time
+import base64
+import threading
+from typing import Dict, List, Optional
+
+def _cassette_from_env():
+    filename = os.environ.get("TERMI_CHAT_CASSETTE", "")
+    mode = os.environ.get("TERMI_CHAT_CASSETTE_MODE", "replay")
+    if filename == "":
+        return None, None
+    if mode not in ("record", "replay"):
+        print(f"Unknown TERMI_CHAT_CASSETTE_MODE {mode}; use record or replay")
+        return None, None
+    return filename, mode
+
+CASSETTE_FILE, CASSETTE_MODE = _cassette_from_env()
+REPLAY_SCALE = float(os.environ.get("TERMI_CHAT_REPLAY_SCALE", "1.0"))
+
+# Headers that don't make sense to replay.
+_SKIP_HEADERS = {"content-length", "transfer-encoding", "connection", "date", "set-cookie"}
+
+def enabled() -> bool:
+    return CASSETTE_FILE is not None
+
+def recording() -> bool:
+    return CASSETTE_MODE == "record"
+
+def replaying() -> bool:
+    return CASSETTE_MODE == "replay"
+
+def _encode(data: bytes) -> dict:
+    try:
+        return {"text": data.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"b64": base64.b64encode(data).decode("ascii")}
+
+def _decode(item: dict) -> bytes:
+    if "b64" in item:
+        return base64.b64decode(item["b64"])
+    return item["text"].encode("utf-8")
+
+def _normalize_body(body: bytes) -> str:
+    """Return the body as a string with JSON keys sorted so equal requests match."""
+    try:
+        return json.dumps(json.loads(body), sort_keys=True)
+    except Exception:
+        return body.decode("utf-8", errors="replace")
+
+def _body_model(body: str) -> Optional[str]:
+    try:
+        data = json.loads(body)
+        return data.get("model") or data.get("character")
+    except Exception:
+        return None
+
+class Recording:
+    """Collects one interaction while the response is read and writes it when done."""
+    def __init__(self, cassette, method: str, url: str, body: bytes):
+        self.cassette = cassette
+        self.started = time.perf_counter()
+        self.interaction = {"request": {"method": method, "url": url, "body": _normalize_body(body)},
+                            "response": {"status": None, "headers": {}, "headers_at": 0.0, "chunks": []}}
+        self._written = False
+
+    def got_headers(self, status: int, headers: Dict[str, str], decoded: bool) -> None:
+        response = self.interaction["response"]
+        response["status"] = status
+        response["headers_at"] = round(time.perf_counter() - self.started, 4)
+        response["headers"] = {k: v for k, v in headers.items()
+                               if k.lower() not in _SKIP_HEADERS and not (decoded and k.lower() == "content-encoding")}
+
+    def got_chunk(self, data: bytes) -> None:
+        if data:
+            chunk = _encode(data)
+            chunk["at"] = round(time.perf_counter() - self.started, 4)
+            self.interaction["response"]["chunks"].append(chunk)
+
+    def done(self, complete: bool = True) -> None:
+        if self._written:
+            return
+        self._written = True
+        if not complete:
+            self.interaction["response"]["incomplete"] = True
+        self.cassette.append(self.interaction)
+
+class Cassette:
+    def __init__(self, filename: str, mode: str):
+        self.filename = filename
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._interactions: List[dict] = []
+        self._used = set()
+        if mode == "replay":
+            self._interactions = self._load()
+
+    def _load(self) -> List[dict]:
+        try:
+            with open(self.filename, 'r') as file:
+                return [json.loads(line) for line in file if line.strip()]
+        except FileNotFoundError:
+            print(f"Cassette not found: {self.filename}")
+            return []
+
+    def append(self, interaction: dict) -> None:
+        with self._lock:
+            os.makedirs(os.path.dirname(self.filename) or ".", exist_ok=True)
+            with open(self.filename, 'a') as file:
+                file.write(json.dumps(interaction) + "\n")
+
+    def find(self, method: str, url: str, body: bytes) -> Optional[dict]:
+        """Return the recorded interaction for this request: an unused exact match,
+           then any exact match, then an unused (then any) one for the same url and model."""
+        body = _normalize_body(body)
+        model = _body_model(body)
+        exact = lambda i: i["request"]["method"] == method and i["request"]["url"] == url and i["request"]["body"] == body
+        similar = lambda i: i["request"]["method"] == method and i["request"]["url"] == url and \
+                            _body_model(i["request"]["body"]) == model
+        with self._lock:
+            for matches in (exact, similar):
+                candidates = [n for n, i in enumerate(self._interactions) if matches(i)]
+                unused = [n for n in candidates if n not in self._used]
+                if unused or candidates:
+                    n = (unused or candidates)[0]
+                    self._used.add(n)
+                    return self._interactions[n]
+        return None
+
+def replay_chunks(interaction: dict, scale: float = None):
+    """Yield the recorded body chunks with the recorded timing (scaled).  The
+       headers delay should already have been applied by the caller."""
+    if scale is None:
+        scale = REPLAY_SCALE
+    response = interaction["response"]
+    previous = response.get("headers_at", 0.0)
+    for chunk in response["chunks"]:
+        delay = (chunk["at"] - previous) * scale
+        previous = chunk["at"]
+        if delay > 0:
+            time.sleep(delay)
+        yield _decode(chunk)
+
+def wait_for_headers(interaction: dict, scale: float = None) -> None:
+    if scale is None:
+        scale = REPLAY_SCALE
+    delay = interaction["response"].get("headers_at", 0.0) * scale
+    if delay > 0:
+        time.sleep(delay)
+
+_cassette = None
+_cassette_lock = threading.Lock()
+
+def get_cassette() -> Optional[Cassette]:
+    """Return the process wide cassette (None if record/replay is off)."""
+    global _cassette
+    if not enabled():
+        return None
+    with _cassette_lock:
+        if _cassette is None:
+            _cassette = Cassette(CASSETTE_FILE, CASSETTE_MODE)
+        return _cassette
+
+def _missing(method: str, url: str) -> bytes:
+    return json.dumps({"error": {"message": f"No recorded response for {method} {url} in {CASSETTE_FILE}",
+                                 "type": "cassette_miss"}}).encode("utf-8")
+
+def cassette_httpx_transport(inner=None):
+    """Return an httpx transport that records through inner (default: a plain
+       HTTPTransport) or replays from the cassette."""
+    import httpx
+
+    class RecordingStream(httpx.SyncByteStream):
+        def __init__(self, stream, recording: Recording):
+            self._stream = stream
+            self._recording = recording
+
+        def __iter__(self):
+            complete = False
+            try:
+                for data in self._stream:
+                    self._recording.got_chunk(data)
+                    yield data
+                complete = True
+            finally:
+                self._recording.done(complete)
+
+        def close(self):
+            self._recording.done(False)
+            self._stream.close()
+
+    class ReplayStream(httpx.SyncByteStream):
+        def __init__(self, interaction: dict):
+            self._interaction = interaction
+
+        def __iter__(self):
+            yield from replay_chunks(self._interaction)
+
+    class CassetteTransport(httpx.BaseTransport):
+        def __init__(self):
+            self._inner = inner if inner is not None else httpx.HTTPTransport()
+            self._cassette = get_cassette()
+
+        def handle_request(self, request):
+            body = request.read()
+            url = str(request.url)
+            if self._cassette.mode == "replay":
+                interaction = self._cassette.find(request.method, url, body)
+                if interaction is None:
+                    return httpx.Response(404, headers={"Content-Type": "application/json"},
+                                          content=_missing(request.method, url))
+                wait_for_headers(interaction)
+                return httpx.Response(interaction["response"]["status"], headers=interaction["response"]["headers"],
+                                      stream=ReplayStream(interaction))
+            recording = Recording(self._cassette, request.method, url, body)
+            response = self._inner.handle_request(request)
+            # We record the raw bytes so keep content-encoding as is.
+            recording.got_headers(response.status_code, dict(response.headers), decoded=False)
+            return httpx.Response(response.status_code, headers=response.headers,
+                                  stream=RecordingStream(response.stream, recording), extensions=response.extensions)
+
+        def close(self):
+            self._inner.close()
+
+    return CassetteTransport()
+
+def mount_cassette_adapter(session) -> None:
+    """Make a requests.Session record to or replay from the cassette.  The session's
+       current adapters (e.g., for tracing) are used when recording."""
+    import requests
+    from requests.adapters import BaseAdapter
+    from requests.structures import CaseInsensitiveDict
+
+    class RecordingRaw:
+        """Wraps the urllib3 response so we see each chunk as requests reads it."""
+        def __init__(self, raw, recording: Recording):
+            self._raw = raw
+            self._recording = recording
+
+        def stream(self, amt=2**16, decode_content=None):
+            complete = False
+            try:
+                for data in self._raw.stream(amt, decode_content=decode_content):
+                    self._recording.got_chunk(data)
+                    yield data
+                complete = True
+            finally:
+                self._recording.done(complete)
+
+        def close(self):
+            self._recording.done(False)
+            self._raw.close()
+
+        def __getattr__(self, name):
+            return getattr(self._raw, name)
+
+    class ReplayRaw:
+        def __init__(self, interaction: dict):
+            self._chunks = replay_chunks(interaction)
+            self.closed = False
+
+        def stream(self, amt=2**16, decode_content=None):
+            yield from self._chunks
+
+        def read(self, amt=None, decode_content=None):
+            return b"".join(self._chunks)
+
+        def close(self):
+            self.closed = True
+
+        def release_conn(self):
+            pass
+
+    class CassetteAdapter(BaseAdapter):
+        def __init__(self, inner):
+            super().__init__()
+            self._inner = inner
+            self._cassette = get_cassette()
+
+        def send(self, request, stream=False, **kwargs):
+            body = request.body or b""
+            if isinstance(body, str):
+                body = body.encode("utf-8")
+            if self._cassette.mode == "replay":
+                interaction = self._cassette.find(request.method, request.url, body)
+                response = requests.Response()
+                response.request = request
+                response.url = request.url
+                response.connection = self
+                if interaction is None:
+                    response.status_code = 404
+                    response.headers = CaseInsensitiveDict({"Content-Type": "application/json"})
+                    response._content = _missing(request.method, request.url)
+                    return response
+                wait_for_headers(interaction)
+                response.status_code = interaction["response"]["status"]
+                response.headers = CaseInsensitiveDict(interaction["response"]["headers"])
+                response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+                response.raw = ReplayRaw(interaction)
+                return response
+            recording = Recording(self._cassette, request.method, request.url, body)
+            response = self._inner.send(request, stream=True, **kwargs)
+            # requests hands us decoded bytes so drop content-encoding.
+            recording.got_headers(response.status_code, dict(response.headers), decoded=True)
+            response.raw = RecordingRaw(response.raw, recording)
+            return response
+
+        def close(self):
+            self._inner.close()
+
+    for prefix in ("http://", "https://"):
+        session.mount(prefix, CassetteAdapter(session.get_adapter(prefix)))
+
+def api_key(name: str) -> Optional[str]:
+    """Return the API key in environment variable name (None if not set).  When
+       replaying, nothing goes to the provider so a placeholder is fine."""
+    if replaying():
+        return os.environ.get(name) or "replay"
+    return os.environ.get(name)
+
+def provider_httpx_transport():
+    """Return the httpx transport for provider calls with tracing and/or record/replay
+       applied or None if neither is on (use the client's default)."""
+    import nettrace
+    transport = nettrace.traced_httpx_transport() if nettrace.enabled() else None
+    if enabled():
+        transport = cassette_httpx_transport(transport)
+    return transport
+
+def provider_httpx_client():
+    """Like provider_httpx_transport but return an httpx.Client to pass as http_client
+       to OpenAI(...)."""
+    import httpx
+    transport = provider_httpx_transport()
+    if transport is None:
+        return None
+    return httpx.Client(transport=transport, timeout=httpx.Timeout(600.0, connect=10.0))
+
+def provider_session():
+    """Return a requests.Session for provider calls with tracing and/or record/replay applied."""
+    import requests
+    import nettrace
+    session = nettrace.traced_session() if nettrace.enabled() else requests.Session()
+    if enabled():
+        mount_cassette_adapter(session)
+    return session
@@ -0,0 +1,316 @@
+#!/usr/bin/env python
+"""
+A long-lived termi-chat process so starting a chat doesn't pay for python
+startup, imports, loading the tokenizer and new TLS connections every time.
+
+The daemon keeps the provider clients (and their connection pools), the
+tokenizer, the model registry and the open conversations (sessions) in one
+process and listens on a Unix socket (TERMI_CHAT_SOCKET, default
+~/.termi-chat/termi-chat.sock).  termi-chat-attach.py is the thin client: it
+starts the daemon if needed, attaches to a session, and can detach and
+re-attach later from any terminal.
+
+  ./chat_daemon.py                  # run in the foreground (termi-chat-attach.py starts it for you)
+  ./termi-chat-attach.py --load conversation.json --model Assistant
+
+The protocol is JSON lines.  The client sends {"op": ..., "session": ..., ...}
+and the daemon answers with any number of {"out": text} lines (what TermiChat
+printed) followed by one {"done": true, "state": {...}} (or "error").
+Terminal interaction (menus, confirmations, input) happens in the client.
+"""
+
+import os
+import sys
+import json
+import socket
+import argparse
+import threading
+import socketserver
+from typing import Dict, Optional
+from utils import DAEMON_SOCKET, info_message, wrap_text
+
+class OutputRouter:
+    """Installed as sys.stdout: what a connection's thread prints goes to that
+       connection; everything else (e.g., request threads) goes to the daemon's stdout."""
+    def __init__(self, stdout):
+        self.stdout = stdout
+        self._local = threading.local()
+
+    def attach(self, send) -> None:
+        self._local.send = send
+
+    def detach(self) -> None:
+        self._local.send = None
+
+    def write(self, text: str) -> int:
+        send = getattr(self._local, "send", None)
+        if send is None:
+            return self.stdout.write(text)
+        if text:
+            send({"out": text})
+        return len(text)
+
+    def flush(self) -> None:
+        self.stdout.flush()
+
+    def isatty(self) -> bool:
+        return False
+
+class Session:
+    def __init__(self, name: str, instance):
+        self.name = name
+        self.instance = instance
+
+        # One request at a time per conversation even if several terminals are attached.
+        self.lock = threading.Lock()
+        self.attached = 0
+
+    def state(self) -> dict:
+        instance = self.instance
+        return {"session": self.name, "model": instance.model, "max_context": instance.max_context,
+                "assistant_name": instance.assistant_name, "user_name": instance.user_name,
+                "spent": instance._get_spent(instance._total_cost), "filename": instance.filename,
+                "messages": len(instance.messages), "has_draft": instance.draft is not None,
+                "unsaved": instance.original_messages != json.dumps(instance.messages),
+                "attached": self.attached}
+
+class ChatDaemon:
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self.sessions: Dict[str, Session] = {}
+        self._lock = threading.Lock()
+        self.server = None
+
+        # Import (and load the tokenizer and model registry) once, up front.
+        import TermiChat as termi_chat_module
+        self.termi_chat = termi_chat_module
+
+    def _session(self, request: dict) -> Session:
+        with self._lock:
+            session = self.sessions.get(request.get("session"))
+        if session is None:
+            raise ValueError(f"No session named {request.get('session')}")
+        return session
+
+    def op_list(self, request: dict, connection) -> dict:
+        with self._lock:
+            return {"sessions": [session.state() for session in self.sessions.values()]}
+
+    def op_menus(self, request: dict, connection) -> dict:
+        return {"menu_items": self.termi_chat.MENU_ITEMS, "model_menu_items": self.termi_chat.MODEL_MENU_ITEMS,
+                "draft_choices": self.termi_chat.DRAFT_CHOICES}
+
+    def op_open(self, request: dict, connection) -> dict:
+        """Attach to session request["session"], creating it if needed."""
+        name = request["session"]
+        with self._lock:
+            session = self.sessions.get(name)
+        if session is None:
+            instance = self.termi_chat.TermiChat(name, request["model"], request.get("max_context", 100),
+                                                 request.get("assistant_name", "Assistant"),
+                                                 request.get("user_name", "User"), request["filename"],
+                                                 request.get("hedge_model"), request.get("stream", True))
+            with self._lock:
+                # Someone else may have opened it while we were loading.
+                session = self.sessions.setdefault(name, Session(name, instance))
+        else:
+            info_message(f"Attached to session {name}.")
+        connection.session = session
+        session.attached += 1
+        return {}
+
+    def op_estimate(self, request: dict, connection) -> dict:
+        instance = self._session(request).instance
+        api_messages = instance._prepare_messages_for_api()
+        if request.get("text"):
+            api_messages.append({"role": "user", "content": request["text"]})
+        return {"tokens": instance.get_estimated_tokens(api_messages)}
+
+    def op_send(self, request: dict, connection) -> dict:
+        session = self._session(request)
+        with session.lock:
+            try:
+                session.instance.send(request.get("text", ""))
+            finally:
+                session.instance.cancel_requested.clear()
+        return {}
+
+    def op_cancel(self, request: dict, connection) -> dict:
+        """Sent on its own connection by a client whose user pressed Ctrl-C.  The send may
+           not have made its Spinner yet (then _last_spinner is the previous one), so we
+           also set the flag send checks when it does."""
+        session = self._session(request)
+        if not session.lock.locked():
+            # Nothing is being sent; don't cancel the next request.
+            return {}
+        session.instance.cancel_requested.set()
+        spinner = session.instance._last_spinner
+        if spinner is not None:
+            spinner.cancel()
+        return {}
+
+    def op_model(self, request: dict, connection) -> dict:
+        self._session(request).instance.set_model(request["model"])
+        return {}
+
+    def op_info(self, request: dict, connection) -> dict:
+        print()
+        print(self.termi_chat.get_model_info(self._session(request).instance.model_api_name))
+        print()
+        return {}
+
+    def op_names(self, request: dict, connection) -> dict:
+        instance = self._session(request).instance
+        if request.get("assistant_name"):
+            instance.assistant_name = request["assistant_name"]
+        if request.get("user_name"):
+            instance.user_name = request["user_name"]
+        print(f"Names are now {instance.assistant_name} and {instance.user_name}.")
+        return {}
+
+    def op_max(self, request: dict, connection) -> dict:
+        self._session(request).instance.set_max_context(request.get("value", ""))
+        return {}
+
+    def op_view(self, request: dict, connection) -> dict:
+        self._session(request).instance.view()
+        return {}
+
+    def op_stats(self, request: dict, connection) -> dict:
+        print()
+        print(self._session(request).instance._metrics.format_stats())
+        print()
+        return {}
+
+    def op_show_draft(self, request: dict, connection) -> dict:
+        instance = self._session(request).instance
+        if instance.draft is None:
+            print("No draft available.")
+        else:
+            info_message(f"Draft from {instance.draft['model']}:")
+            print(wrap_text(instance.draft["content"]))
+        return {}
+
+    def op_draft(self, request: dict, connection) -> dict:
+        self._session(request).instance.use_draft(request["choice"])
+        return {}
+
+    def op_clear(self, request: dict, connection) -> dict:
+        self._session(request).instance.clear()
+        return {}
+
+    def op_save(self, request: dict, connection) -> dict:
+        instance = self._session(request).instance
+        instance.save(request.get("filename") or instance.filename)
+        return {}
+
+    def op_load(self, request: dict, connection) -> dict:
+        instance = self._session(request).instance
+        filename, messages, original_messages = instance.check_load_file(request["filename"])
+        if filename != "":
+            instance.filename, instance.messages, instance.original_messages = filename, messages, original_messages
+        return {}
+
+    def op_close(self, request: dict, connection) -> dict:
+        session = self._session(request)
+        if session.state()["unsaved"] and not request.get("force"):
+            raise ValueError("Session has unsaved changes; save it first or close with force")
+        with self._lock:
+            self.sessions.pop(session.name, None)
+        print(f"Closed session {session.name}.")
+        return {}
+
+    def op_shutdown(self, request: dict, connection) -> dict:
+        print("Daemon shutting down.")
+        threading.Thread(target=self.server.shutdown, daemon=True).start()
+        return {}
+
+    def handle(self, request: dict, connection) -> dict:
+        operation = getattr(self, f"op_{request.get('op')}", None)
+        if operation is None:
+            raise ValueError(f"Unknown op {request.get('op')}")
+        return operation(request, connection)
+
+    def serve(self) -> None:
+        daemon = self
+        router = OutputRouter(sys.stdout)
+        sys.stdout = router
+
+        class Handler(socketserver.StreamRequestHandler):
+            def setup(self):
+                super().setup()
+                self.session: Optional[Session] = None
+                self._write_lock = threading.Lock()
+
+            def send(self, message: dict) -> None:
+                with self._write_lock:
+                    self.wfile.write((json.dumps(message) + "\n").encode("utf-8"))
+                    self.wfile.flush()
+
+            def handle(self):
+                router.attach(self.send)
+                try:
+                    for line in self.rfile:
+                        if not line.strip():
+                            continue
+                        reply = {"done": True}
+                        request = {}
+                        try:
+                            request = json.loads(line)
+                            reply.update(daemon.handle(request, self))
+                        except SystemExit:
+                            # TermiChat exits on things like a missing file; that mustn't stop the daemon.
+                            reply["error"] = "Request failed; see the messages above"
+                        except Exception as e:
+                            reply["error"] = str(e)
+                        if self.session is not None and self.session.name in daemon.sessions:
+                            reply["state"] = self.session.state()
+                        self.send(reply)
+                        if request.get("op") == "cancel":
+                            # Cancels come on a connection of their own; we're done with it.
+                            break
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    router.detach()
+                    if self.session is not None:
+                        self.session.attached -= 1
+
+        if os.path.exists(self.socket_path):
+            # A stale socket from a daemon that died; a live one would answer.
+            try:
+                with socket.socket(socket.AF_UNIX) as probe:
+                    probe.connect(self.socket_path)
+                print(f"A daemon is already listening on {self.socket_path}", file=router.stdout)
+                return
+            except OSError:
+                os.unlink(self.socket_path)
+        os.makedirs(os.path.dirname(self.socket_path) or ".", exist_ok=True)
+
+        # Only we may connect.  The socket gets its mode when it's bound so set the umask
+        # for that rather than chmod afterwards, which leaves a window.
+        umask = os.umask(0o077)
+        try:
+            server = socketserver.ThreadingUnixStreamServer(self.socket_path, Handler)
+        finally:
+            os.umask(umask)
+        with server:
+            server.daemon_threads = True
+            self.server = server
+            print(f"termi-chat daemon listening on {self.socket_path}", file=router.stdout, flush=True)
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                if os.path.exists(self.socket_path):
+                    os.unlink(self.socket_path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the termi-chat daemon")
+    parser.add_argument("--socket", default=DAEMON_SOCKET, help="Unix socket to listen on")
+    args = parser.parse_args()
+    ChatDaemon(args.socket).serve()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Named conversations for the Streamlit app, kept by the server instead of the
+browser session so one Streamlit process can host any number of them and a
+browser reload (or a second tab) picks up where you left off.
+
+Each conversation is a MessageStore plus the JobQueue for its requests and is
+saved as a json file (the same format as Save/Load Conversation) in
+TERMI_CHAT_CONVERSATIONS (default ~/.termi-chat/conversations) whenever it
+changes.  Conversations are read from there the first time they're used.
+"""
+
+import os
+import re
+import threading
+from typing import Dict, List
+from concurrent.futures import ThreadPoolExecutor
+from message_store import MessageStore
+from background_jobs import JobQueue
+from utils import TERMI_CHAT_HOME, warn_message
+
+CONVERSATIONS_DIR = os.environ.get("TERMI_CHAT_CONVERSATIONS", os.path.join(TERMI_CHAT_HOME, "conversations"))
+
+# Names become file names.
+_NAME_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._ -]*$")
+
+def valid_name(name: str) -> bool:
+    return bool(_NAME_PATTERN.match(name)) and len(name) <= 100
+
+class Conversation:
+    def __init__(self, name: str, filename: str, store: MessageStore, pool: ThreadPoolExecutor):
+        self.name = name
+        self.filename = filename
+        self.store = store
+        self.jobs = JobQueue(pool)
+        self._lock = threading.Lock()
+
+    def save(self) -> None:
+        """Write the conversation to its file (replacing the old copy in one step)."""
+        with self._lock:
+            text = self.store.to_json()
+            tmp_filename = f"{self.filename}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_filename, 'w') as file:
+                    file.write(text)
+                os.replace(tmp_filename, self.filename)
+            except OSError as e:
+                warn_message(f"Unable to save conversation {self.name} to {self.filename}: {e}")
+
+    def replace(self, store: MessageStore) -> None:
+        """Start over with store (Clear or Load Conversation)."""
+        self.store = store
+        self.save()
+
+class ConversationRegistry:
+    """Every conversation the server has used, by name; shared by all browser sessions."""
+    def __init__(self, pool: ThreadPoolExecutor, directory: str = CONVERSATIONS_DIR):
+        self.pool = pool
+        self.directory = directory
+        self.conversations: Dict[str, Conversation] = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def names(self) -> List[str]:
+        """Return the names of the conversations in memory and on disk."""
+        names = set(self.conversations)
+        try:
+            names.update(os.path.splitext(entry)[0] for entry in os.listdir(self.directory) if entry.endswith(".json"))
+        except OSError:
+            pass
+        return sorted(names, key=str.lower)
+
+    def get(self, name: str, default_system_context: str) -> Conversation:
+        """Return the conversation called name, reading it from disk or starting it if need be."""
+        if not valid_name(name):
+            raise ValueError(f"Invalid conversation name: {name}")
+        with self._lock:
+            conversation = self.conversations.get(name)
+            if conversation is None:
+                filename = os.path.join(self.directory, f"{name}.json")
+                store = None
+                new = False
+                try:
+                    with open(filename, 'r') as file:
+                        store = MessageStore.load(file.read(), default_system_context)
+                except FileNotFoundError:
+                    new = True
+                except (OSError, ValueError, KeyError) as e:
+                    warn_message(f"Unable to read conversation {name} from {filename}: {e}")
+                conversation = Conversation(name, filename, store or MessageStore(default_system_context), self.pool)
+                self.conversations[name] = conversation
+                if new:
+                    conversation.save()
+            return conversation
@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+"""
+Run the same prompts against several models and compare the answers, time
+and cost -- the "paste it into each model" routine, done in one batch.
+
+Examples:
+  ./eval_models.py --models gpt-4-0613 mistralai/mixtral-8x7b Assistant --prompts prompts.txt
+  ./eval_models.py --models gpt-4-0613 Assistant --prompts prompts.txt --concurrency openai=8 --outputs 60
+  ./eval_models.py --results eval-results.jsonl --summary-only
+
+Each (model, prompt) cell goes through the normal TermiChat.send path with a
+fresh conversation (the system prompt plus the prompt).  Requests to each
+model family run in parallel up to that family's concurrency limit so we
+don't hammer a local text-generation-webui or ollama box while the hosted
+providers go as fast as we allow.
+
+Every finished cell is appended to the results JSONL file as soon as it's
+done.  Running the same command again skips cells that already succeeded so
+an interrupted run picks up where it left off (failed cells are retried).
+The summary table is built from everything in the results file.
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import tempfile
+import threading
+from contextlib import redirect_stdout
+from datetime import datetime
+from typing import Dict, List
+from loadgen import read_prompts, DEFAULT_SYSTEM_PROMPT
+from ModelInfo import MODEL_INFO, MODEL_PREFIXES
+from latency import LatencyTracker
+from utils import percentile
+
+DEFAULT_RESULTS_FILE = "eval-results.jsonl"
+
+# Local model servers handle one request at a time well; hosted providers don't mind more.
+DEFAULT_CONCURRENCY = {"openai": 4, "openrouter.ai": 4, "deepseek": 4, "text-generation-webui": 1, "ollama": 1}
+
+def prompt_id(prompt: str) -> str:
+    """Identify a prompt by its text so reordering the prompt file doesn't break resume."""
+    return hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:12]
+
+def resolve_model(model: str) -> str:
+    """Return the MODEL_INFO key for model; like the CLI, the MODEL_PREFIXES are optional."""
+    for name in [model] + [prefix + model for prefix in MODEL_PREFIXES]:
+        if name in MODEL_INFO:
+            return name
+    raise ValueError(f"Unknown model {model}; see MODEL_INFO in ModelInfo.py")
+
+def read_results(filename: str) -> List[dict]:
+    results = []
+    try:
+        with open(filename, 'r') as file:
+            for line in file:
+                if line.strip():
+                    try:
+                        results.append(json.loads(line))
+                    except ValueError:
+                        # A partial line from a run that was killed mid-write.
+                        pass
+    except FileNotFoundError:
+        pass
+    return results
+
+def parse_concurrency(values: List[str]) -> Dict[str, int]:
+    concurrency = dict(DEFAULT_CONCURRENCY)
+    for value in values:
+        family, _, limit = value.partition("=")
+        if family not in DEFAULT_CONCURRENCY or not limit.isdigit() or int(limit) < 1:
+            raise ValueError(f"Bad --concurrency {value}; use family=N with family one of {', '.join(DEFAULT_CONCURRENCY)}")
+        concurrency[family] = int(limit)
+    return concurrency
+
+class EvalRunner:
+    def __init__(self, args, system_prompt: str):
+        self.args = args
+        self.system_prompt = system_prompt
+        self.stop = threading.Event()
+        # Shared by every worker and kept in the workdir so eval runs don't end up in
+        # the latency history real sessions use for their timeouts and hedging.
+        self.latency = LatencyTracker(os.path.join(args.workdir, "latency.json"))
+        self.first_token = LatencyTracker(os.path.join(args.workdir, "first_token.json"))
+        self._write_lock = threading.Lock()
+        self._done = 0
+        self._total = 0
+
+    def _new_instance(self, TermiChat, model: str, worker: str):
+        filename = os.path.join(self.args.workdir, f"eval-{worker}.json")
+        with open(filename, 'w') as file:
+            json.dump([{"role": "system", "content": self.system_prompt}], file)
+        instance = TermiChat(f"eval-{worker}", model, self.args.max_context, "Assistant", "User", filename,
+                             stream=not self.args.no_stream)
+        instance._latency = self.latency
+        instance._first_token = self.first_token
+        return instance
+
+    def run_cell(self, instance, model: str, prompt: str) -> dict:
+        instance.messages = [{"role": "system", "content": self.system_prompt}]
+        started = time.time()
+        instance.send(prompt)
+        latency = time.time() - started
+        reply = instance.messages[-1]
+        error = reply.get("role") != "assistant" or reply.get("response_model") == "Error"
+        ttft = None
+        attempt = instance._last_spinner.winner() if instance._last_spinner else None
+        if attempt is not None and attempt.first_token_at is not None:
+            ttft = attempt.first_token_at - attempt.started_at
+        prompt_tokens, completion_tokens = instance._last_usage
+        return {"model": model, "prompt_id": prompt_id(prompt), "prompt": prompt,
+                "output": reply.get("content", "") if reply.get("role") == "assistant" else "",
+                "latency": round(latency, 3), "ttft": round(ttft, 3) if ttft is not None else None,
+                "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "cost": reply.get("cost_dollars", 0.0) if not error else 0.0,
+                "response_model": reply.get("response_model"), "error": error,
+                "timestamp": datetime.now().isoformat(timespec="seconds")}
+
+    def _record(self, result: dict, output) -> None:
+        with self._write_lock:
+            with open(self.args.results, 'a') as file:
+                file.write(json.dumps(result) + "\n")
+            self._done += 1
+            status = "error" if result["error"] else f"{result['latency']:.2f}s"
+            print(f"[{self._done}/{self._total}] {result['model']} {result['prompt_id']} {status}", file=output, flush=True)
+
+    def _worker(self, TermiChat, family: str, worker: int, cells: List[tuple], cells_lock: threading.Lock, output) -> None:
+        """Take cells for family until there are none left; keep one TermiChat per model."""
+        instances = {}
+        while not self.stop.is_set():
+            with cells_lock:
+                if not cells:
+                    return
+                model, prompt = cells.pop(0)
+            if model not in instances:
+                instances[model] = self._new_instance(TermiChat, model, f"{family}-{worker}-{len(instances)}")
+            self._record(self.run_cell(instances[model], model, prompt), output)
+
+    def run(self, TermiChat, cells: List[tuple], concurrency: Dict[str, int], output) -> None:
+        by_family: Dict[str, List[tuple]] = {}
+        for model, prompt in cells:
+            by_family.setdefault(MODEL_INFO[model]["model_family"], []).append((model, prompt))
+        self._total = len(cells)
+
+        threads = []
+        for family, family_cells in by_family.items():
+            cells_lock = threading.Lock()
+            for worker in range(min(concurrency.get(family, 1), len(family_cells))):
+                threads.append(threading.Thread(target=self._worker,
+                                                args=(TermiChat, family, worker, family_cells, cells_lock, output),
+                                                daemon=True))
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            # Cells in flight are lost; they run again next time.
+            self.stop.set()
+            print("\nInterrupted; run the same command again to resume.", file=output)
+
+def _short(text: str, width: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= width else text[:width - 3] + "..."
+
+def summarize(results: List[dict], models: List[str], outputs: int) -> str:
+    """Return the summary table (one row per model) and, if outputs > 0, a table
+       of every cell with its output cut to that many characters."""
+    from tabulate import tabulate
+
+    # The last result for a cell wins (a retry after an error replaces it).
+    cells = {}
+    for result in results:
+        cells[(result["model"], result["prompt_id"])] = result
+    if not models:
+        models = sorted({model for model, _ in cells})
+
+    rows = []
+    for model in models:
+        items = [result for (name, _), result in cells.items() if name == model]
+        ok = [result for result in items if not result["error"]]
+        latencies = [result["latency"] for result in ok]
+        ttfts = [result["ttft"] for result in ok if result.get("ttft") is not None]
+        rows.append([model, len(items), len(items) - len(ok),
+                     f"{percentile(latencies, 50):.2f}" if latencies else "-",
+                     f"{percentile(latencies, 95):.2f}" if latencies else "-",
+                     f"{percentile(ttfts, 50):.2f}" if ttfts else "-",
+                     round(sum(result["prompt_tokens"] for result in ok) / len(ok)) if ok else "-",
+                     round(sum(result["completion_tokens"] for result in ok) / len(ok)) if ok else "-",
+                     f"${sum(result['cost'] for result in ok):.5f}"])
+    text = tabulate(rows, headers=["Model", "Cells", "Errors", "Latency p50", "Latency p95", "TTFT p50",
+                                   "Avg In Tokens", "Avg Out Tokens", "Cost"], tablefmt="grid")
+
+    if outputs > 0:
+        cell_rows = []
+        for (model, _), result in sorted(cells.items(), key=lambda item: (item[1]["prompt_id"], item[0][0])):
+            if model in models:
+                cell_rows.append([_short(result["prompt"], 30), model, f"{result['latency']:.2f}",
+                                  result["completion_tokens"], f"${result['cost']:.5f}",
+                                  "ERROR" if result["error"] else _short(result["output"], outputs)])
+        text += "\n" + tabulate(cell_rows, headers=["Prompt", "Model", "Latency", "Out Tokens", "Cost", "Output"],
+                                tablefmt="grid")
+    return text
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a prompt set against several models and compare them")
+    parser.add_argument("--models", nargs="+", default=[], help="model short names (see MODEL_INFO)")
+    parser.add_argument("--prompts", nargs="+", default=[], help="text (one prompt per line) or conversation json files")
+    parser.add_argument("--system", default=DEFAULT_SYSTEM_PROMPT, help="system prompt for every cell")
+    parser.add_argument("--results", default=DEFAULT_RESULTS_FILE, help="JSONL results file (also used to resume)")
+    parser.add_argument("--concurrency", nargs="*", default=[],
+                        help=f"per family limits like openai=8 (default {', '.join(f'{k}={v}' for k, v in DEFAULT_CONCURRENCY.items())})")
+    parser.add_argument("--outputs", type=int, default=0, help="also show each cell's output cut to this many characters")
+    parser.add_argument("--max-context", type=int, default=100)
+    parser.add_argument("--no-stream", action="store_true")
+    parser.add_argument("--summary-only", action="store_true", help="just print the table for --results")
+    args = parser.parse_args()
+
+    try:
+        models = [resolve_model(model) for model in args.models]
+        concurrency = parse_concurrency(args.concurrency)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if not args.summary_only:
+        if not models or not args.prompts:
+            parser.error("give --models and --prompts (or --summary-only)")
+        prompts = list(dict.fromkeys(read_prompts(args.prompts)))
+        finished = {(result["model"], result["prompt_id"]) for result in read_results(args.results)
+                    if not result["error"]}
+        cells = [(model, prompt) for prompt in prompts for model in models
+                 if (model, prompt_id(prompt)) not in finished]
+        skipped = len(prompts) * len(models) - len(cells)
+        print(f"{len(prompts)} prompts x {len(models)} models: {len(cells)} to run, {skipped} already done")
+
+        if cells:
+            args.workdir = tempfile.mkdtemp(prefix="termi-chat-eval-")
+            from TermiChat import TermiChat
+
+            # TermiChat talks to the terminal; keep that out of the way of our progress lines.
+            real_stdout = sys.stdout
+            with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                EvalRunner(args, args.system).run(TermiChat, cells, concurrency, real_stdout)
+
+    print(summarize(read_results(args.results), models, args.outputs))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+LatencyTracker remembers how long each model took to answer so we can pick
+timeouts from what the model actually does instead of a fixed 60 seconds.
+It is also used to decide when to hedge a request: a second tracker keeps
+the time to the first token (the whole response time when it isn't
+streamed), and if the primary model hasn't started answering by that p95,
+it's probably stuck on a slow provider.  Once it's answering we let it finish.
+
+A request that times out is recorded at the timeout (we know it took at
+least that long) so the next timeout backs off instead of staying too short
+to ever see the model's slow answers.
+
+The history is saved in TERMI_CHAT_HOME so it carries over between runs.
+"""
+
+import os
+import json
+import threading
+from typing import Dict, List, Optional
+from utils import TERMI_CHAT_HOME, percentile
+
+DEFAULT_LATENCY_FILE = os.path.join(TERMI_CHAT_HOME, "latency.json")
+DEFAULT_FIRST_TOKEN_FILE = os.path.join(TERMI_CHAT_HOME, "first_token.json")
+
+# Keep only the most recent samples; providers change over time.
+MAX_SAMPLES = 200
+
+# Don't trust percentiles until we've seen a few responses.
+MIN_SAMPLES = 5
+
+# Used when we don't have enough history for a model.
+DEFAULT_TIMEOUT = 60
+DEFAULT_HEDGE_DELAY = 10.0
+
+class LatencyTracker:
+    def __init__(self, filename: str = DEFAULT_LATENCY_FILE, max_samples: int = MAX_SAMPLES):
+        self.filename = filename
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._samples: Dict[str, List[float]] = self._load()
+
+    def _load(self) -> Dict[str, List[float]]:
+        """Load the saved latency history; a missing or bad file just means no history."""
+        try:
+            with open(self.filename, 'r') as file:
+                return json.load(file)
+        except Exception:
+            return {}
+
+    def save(self) -> None:
+        """Write the latency history so the next run starts with it.  We write a
+           temporary file and rename it so concurrent savers can't corrupt it."""
+        with self._lock:
+            data = json.dumps(self._samples)
+            try:
+                os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+                tmp_filename = f"{self.filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_filename, 'w') as file:
+                    file.write(data)
+                os.replace(tmp_filename, self.filename)
+            except Exception as e:
+                print(f"Unable to save latency history to {self.filename}: {e}")
+
+    def record(self, model: str, seconds: float) -> None:
+        """Remember that model took seconds to respond."""
+        with self._lock:
+            samples = self._samples.setdefault(model, [])
+            samples.append(round(seconds, 3))
+            del samples[:-self.max_samples]
+
+    def record_timeout(self, model: str, seconds: float) -> None:
+        """Remember that model hadn't answered after seconds (when we gave up)."""
+        self.record(model, seconds)
+
+    def percentile(self, model: str, pct: float) -> Optional[float]:
+        """Return the pct percentile latency for model or None if we don't have
+           enough samples to say."""
+        with self._lock:
+            samples = list(self._samples.get(model, []))
+        if len(samples) < MIN_SAMPLES:
+            return None
+        return percentile(samples, pct)
+
+    def timeout_for(self, model: str, multiplier: float = 3.0, floor: float = 15, ceiling: float = 600) -> float:
+        """Return how long to wait for model before giving up.  This is a multiple
+           of the observed p99, or of the slowest of the last few responses if that's
+           more (so one timeout is enough to back off), clamped to [floor, ceiling]."""
+        p99 = self.percentile(model, 99)
+        if p99 is None:
+            return DEFAULT_TIMEOUT
+        with self._lock:
+            recent = max(self._samples[model][-MIN_SAMPLES:])
+        return min(max(max(p99, recent) * multiplier, floor), ceiling)
+
+    def hedge_delay_for(self, model: str) -> float:
+        """Return how long to wait for model's first token before firing a hedged
+           request; call this on the time-to-first-token tracker."""
+        p95 = self.percentile(model, 95)
+        if p95 is None:
+            return DEFAULT_HEDGE_DELAY
+        return p95
@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+"""
+A persistent record of what every priced request cost, across runs and across
+the CLI, Streamlit and the proxy, and the daily/monthly budgets checked
+against it before a request is sent.
+
+The ledger is a SQLite database in write-ahead-log mode (TERMI_CHAT_LEDGER,
+default ~/.termi-chat/ledger.db) so several processes can write to it at once
+while others read.  Each request is a row in "requests"; "daily_totals" keeps
+a running sum per day and model, updated in the same transaction, so budget
+checks and reports read a handful of rows no matter how many requests there
+are.
+
+Budgets are in dollars and set with TERMI_CHAT_DAILY_BUDGET and
+TERMI_CHAT_MONTHLY_BUDGET.  Before a paid request is sent, its estimated cost
+is reserved; if that plus what's been spent (and what other in-flight
+requests reserved) is over a budget, the request is refused.  When the
+response arrives the reservation is replaced by the real cost.
+
+  ./ledger.py                # spending per model for the last 7 days and this month
+  ./ledger.py --days 30
+"""
+
+import os
+import time
+import sqlite3
+import argparse
+import threading
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from utils import TERMI_CHAT_HOME, warn_message
+
+DEFAULT_LEDGER_FILE = os.environ.get("TERMI_CHAT_LEDGER", os.path.join(TERMI_CHAT_HOME, "ledger.db"))
+
+def _budget(name: str) -> Optional[float]:
+    value = os.environ.get(name)
+    return float(value) if value else None
+
+DAILY_BUDGET = _budget("TERMI_CHAT_DAILY_BUDGET")
+MONTHLY_BUDGET = _budget("TERMI_CHAT_MONTHLY_BUDGET")
+
+# A reservation older than this belongs to a process that died mid-request.
+RESERVATION_SECONDS = 600
+
+# Wait this long for another writer to finish before giving up.
+BUSY_TIMEOUT_MS = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS requests (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    day TEXT NOT NULL,
+    source TEXT,
+    conversation TEXT,
+    model TEXT NOT NULL,
+    family TEXT,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    cost REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS requests_ts ON requests (ts);
+CREATE TABLE IF NOT EXISTS daily_totals (
+    day TEXT NOT NULL,
+    model TEXT NOT NULL,
+    family TEXT,
+    requests INTEGER NOT NULL,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    cost REAL NOT NULL,
+    PRIMARY KEY (day, model)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS reservations (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    cost REAL NOT NULL
+);
+"""
+
+class Ledger:
+    def __init__(self, filename: str = DEFAULT_LEDGER_FILE, daily_budget: Optional[float] = DAILY_BUDGET,
+                 monthly_budget: Optional[float] = MONTHLY_BUDGET):
+        self.filename = filename
+        self.daily_budget = daily_budget
+        self.monthly_budget = monthly_budget
+
+        # sqlite3 connections can't be shared between threads so each thread gets its own.
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.filename) or ".", exist_ok=True)
+
+            # isolation_level=None: we issue BEGIN IMMEDIATE ourselves so writers queue
+            # up on the lock (busy_timeout) instead of failing part way through.
+            connection = sqlite3.connect(self.filename, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def _write(self, statements) -> Optional[int]:
+        """Run statements(cursor) in one write transaction; returns what it returns."""
+        connection = self._connection()
+        cursor = connection.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            result = statements(cursor)
+            cursor.execute("COMMIT")
+            return result
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _days(now: float) -> Tuple[str, str]:
+        """Return today and the first day of this month (local time) as YYYY-MM-DD."""
+        today = datetime.fromtimestamp(now).strftime("%Y-%m-%d")
+        return today, today[:8] + "01"
+
+    @staticmethod
+    def _spent(cursor: sqlite3.Cursor, since_day: str) -> float:
+        cursor.execute("SELECT COALESCE(SUM(cost), 0.0) FROM daily_totals WHERE day >= ?", (since_day,))
+        return cursor.fetchone()[0]
+
+    def record(self, model: str, family: str, prompt_tokens: int, completion_tokens: int, cost: float,
+               conversation: Optional[str] = None, source: str = "cli", reservation: Optional[int] = None) -> None:
+        """Add a request to the ledger and drop its reservation (if any)."""
+        now = time.time()
+        day, _ = self._days(now)
+
+        def statements(cursor: sqlite3.Cursor) -> None:
+            cursor.execute("INSERT INTO requests (ts, day, source, conversation, model, family, prompt_tokens, "
+                           "completion_tokens, cost) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                           (now, day, source, conversation, model, family, prompt_tokens, completion_tokens, cost))
+            cursor.execute("INSERT INTO daily_totals (day, model, family, requests, prompt_tokens, completion_tokens, cost) "
+                           "VALUES (?, ?, ?, 1, ?, ?, ?) ON CONFLICT (day, model) DO UPDATE SET "
+                           "requests = requests + 1, prompt_tokens = prompt_tokens + excluded.prompt_tokens, "
+                           "completion_tokens = completion_tokens + excluded.completion_tokens, "
+                           "cost = cost + excluded.cost",
+                           (day, model, family, prompt_tokens, completion_tokens, cost))
+            if reservation is not None:
+                cursor.execute("DELETE FROM reservations WHERE id = ?", (reservation,))
+        try:
+            self._write(statements)
+        except (sqlite3.Error, OSError) as e:
+            warn_message(f"Unable to record the cost in the ledger {self.filename}: {e}")
+
+    def reserve(self, estimated_cost: float) -> Tuple[Optional[int], Optional[str]]:
+        """Check the budgets and, if there's room, reserve estimated_cost until the
+           request is recorded (or released).
+
+           Returns:
+           - Tuple[Optional[int], Optional[str]]: the reservation (None if there are no
+             budgets) and, if the request would go over a budget, why (otherwise None).
+        """
+        if self.daily_budget is None and self.monthly_budget is None:
+            return None, None
+        now = time.time()
+        today, month = self._days(now)
+
+        def statements(cursor: sqlite3.Cursor) -> Tuple[Optional[int], Optional[str]]:
+            cursor.execute("DELETE FROM reservations WHERE ts < ?", (now - RESERVATION_SECONDS,))
+            cursor.execute("SELECT COALESCE(SUM(cost), 0.0) FROM reservations")
+            reserved = cursor.fetchone()[0] + estimated_cost
+            for budget, since_day, period in ((self.daily_budget, today, "daily"), (self.monthly_budget, month, "monthly")):
+                if budget is None:
+                    continue
+                spent = self._spent(cursor, since_day)
+                if spent + reserved > budget:
+                    return None, (f"Over the {period} budget: ${spent:.4f} spent of ${budget:.2f} and this request "
+                                  f"could cost ${estimated_cost:.4f}; not sent.")
+            cursor.execute("INSERT INTO reservations (ts, cost) VALUES (?, ?)", (now, estimated_cost))
+            return cursor.lastrowid, None
+        try:
+            return self._write(statements)
+        except (sqlite3.Error, OSError) as e:
+            # Don't stop the user from chatting because the ledger is broken.
+            warn_message(f"Unable to check the budget in the ledger {self.filename}: {e}")
+            return None, None
+
+    def release(self, reservation: Optional[int]) -> None:
+        """Drop a reservation for a request that failed or was cancelled."""
+        if reservation is None:
+            return
+        try:
+            self._write(lambda cursor: cursor.execute("DELETE FROM reservations WHERE id = ?", (reservation,)))
+        except (sqlite3.Error, OSError) as e:
+            warn_message(f"Unable to update the ledger {self.filename}: {e}")
+
+    def spent(self, since_day: str) -> float:
+        """Return the dollars spent from since_day (YYYY-MM-DD) on."""
+        return self._spent(self._connection().cursor(), since_day)
+
+    def spent_today_and_month(self) -> Tuple[float, float]:
+        """Return the dollars spent today and this month (what the budgets are checked against)."""
+        today, month = self._days(time.time())
+        try:
+            return self.spent(today), self.spent(month)
+        except (sqlite3.Error, OSError):
+            return 0.0, 0.0
+
+    def average_completion_tokens(self, model: str) -> Optional[float]:
+        """Return the average response size for model over the last 30 days (None if unknown)."""
+        since_day = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d")
+        try:
+            cursor = self._connection().cursor()
+            cursor.execute("SELECT SUM(completion_tokens), SUM(requests) FROM daily_totals WHERE model = ? AND day >= ?",
+                           (model, since_day))
+            completion_tokens, requests = cursor.fetchone()
+        except (sqlite3.Error, OSError):
+            return None
+        return completion_tokens / requests if requests else None
+
+    def summary(self, since_day: str) -> List[tuple]:
+        """Return (model, family, requests, prompt tokens, completion tokens, cost) per model from since_day on."""
+        cursor = self._connection().cursor()
+        cursor.execute("SELECT model, family, SUM(requests), SUM(prompt_tokens), SUM(completion_tokens), SUM(cost) "
+                       "FROM daily_totals WHERE day >= ? GROUP BY model ORDER BY SUM(cost) DESC", (since_day,))
+        return cursor.fetchall()
+
+    def format_report(self, days: int = 7) -> str:
+        today, month = self._days(time.time())
+        since_day = (datetime.now() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        lines = [f"{'Model':50} {'Requests':>9} {'In Tokens':>11} {'Out Tokens':>11} {'Cost':>11}"]
+        for model, _, requests, prompt_tokens, completion_tokens, cost in self.summary(since_day):
+            lines.append(f"{model:50} {requests:9} {prompt_tokens:11} {completion_tokens:11} {f'${cost:.4f}':>11}")
+        lines.append("")
+        for label, spent, budget in ((f"Last {days} days", self.spent(since_day), None),
+                                     ("Today", self.spent(today), self.daily_budget),
+                                     ("This month", self.spent(month), self.monthly_budget)):
+            limit = f" of ${budget:.2f}" if budget is not None else ""
+            lines.append(f"{label}: ${spent:.4f}{limit}")
+        return "\n".join(lines)
+
+# One ledger per process; connections are opened on first use.
+LEDGER = Ledger()
+
+def main():
+    parser = argparse.ArgumentParser(description="Show what termi-chat has spent")
+    parser.add_argument("--days", type=int, default=7, help="show spending per model for this many days")
+    parser.add_argument("--ledger", default=DEFAULT_LEDGER_FILE, help="ledger database file")
+    args = parser.parse_args()
+    print(Ledger(args.ledger).format_report(args.days))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+"""
+Headless load generator for model endpoints (e.g., our self-hosted
+text-generation-webui and ollama boxes).  It runs N concurrent conversations
+through the same TermiChat.send path users go through so the numbers match
+what users see, and paces requests to a target rate.
+
+Examples:
+  ./loadgen.py --model Assistant --prompts prompts.txt --concurrency 4 --rate 2 --requests 100
+  ./loadgen.py --model ollama/llama3.1:latest --prompts ../sample_conversations/*.json --duration 60
+
+Prompts come from text files (one prompt per line) or termi-chat conversation
+files (their user messages).  Each conversation starts from --conversation (a
+termi-chat json file; default is a bare system prompt), sends prompts in turn,
+and starts over after --turns prompts.
+
+The report is JSON on stdout: throughput, latency/ttft/tokens-per-second
+percentiles, token counts, cost and error rate.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+from contextlib import redirect_stdout
+from typing import List
+from utils import percentile
+
+DEFAULT_SYSTEM_PROMPT = "You are a helpful assistant."
+
+def read_prompts(filenames: List[str]) -> List[str]:
+    """Return the prompts from text files (one per line) and conversation files
+       (the user messages)."""
+    prompts = []
+    for filename in filenames:
+        with open(filename, 'r') as file:
+            if filename.endswith(".json"):
+                prompts += [message["content"] for message in json.load(file) if message.get("role") == "user"]
+            else:
+                prompts += [line.strip() for line in file if line.strip()]
+    return prompts
+
+class Pacer:
+    """Hands out request slots: at most max_requests, spaced 1/rate seconds apart
+       (rate 0 means as fast as the workers can go), until the deadline."""
+    def __init__(self, rate: float, max_requests: int, deadline: float):
+        self.rate = rate
+        self.max_requests = max_requests
+        self.deadline = deadline
+        self.started_at = time.time()
+        self._issued = 0
+        self._lock = threading.Lock()
+
+    def next_slot(self):
+        """Block until the next request may start; return its scheduled start time or
+           None when we're done."""
+        with self._lock:
+            if self.max_requests and self._issued >= self.max_requests:
+                return None
+            scheduled = self.started_at + (self._issued / self.rate if self.rate > 0 else 0.0)
+            self._issued += 1
+        if self.deadline and scheduled >= self.deadline:
+            return None
+        delay = scheduled - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        return scheduled
+
+def run_conversation(TermiChat, worker: int, args, base_messages: list, prompts: List[str], pacer: Pacer,
+                     results: list, results_lock: threading.Lock, latency) -> None:
+    """One conversation: keep sending prompts until the pacer says stop."""
+    filename = os.path.join(args.workdir, f"loadgen-{worker}.json")
+    with open(filename, 'w') as file:
+        json.dump(base_messages, file)
+    instance = TermiChat(f"loadgen-{worker}", args.model, args.max_context, "Assistant", "User", filename,
+                         stream=not args.no_stream)
+    instance._latency, instance._first_token = latency
+
+    turn = 0
+    index = worker
+    while True:
+        scheduled = pacer.next_slot()
+        if scheduled is None:
+            break
+        if args.turns and turn >= args.turns:
+            instance.messages = json.loads(json.dumps(base_messages))
+            turn = 0
+        prompt = prompts[index % len(prompts)]
+        index += args.concurrency
+        turn += 1
+
+        started = time.time()
+        instance.send(prompt)
+        latency = time.time() - started
+
+        reply = instance.messages[-1]
+        error = reply.get("role") != "assistant" or reply.get("response_model") == "Error"
+        ttft = None
+        attempt = instance._last_spinner.winner() if instance._last_spinner else None
+        if attempt is not None and attempt.first_token_at is not None:
+            ttft = attempt.first_token_at - attempt.started_at
+        prompt_tokens, completion_tokens = instance._last_usage
+        if error and len(instance.messages) >= 2:
+            # Don't let failed turns pile up in the conversation.
+            del instance.messages[-2:]
+        with results_lock:
+            results.append({"worker": worker, "queue_delay": started - scheduled, "latency": latency, "ttft": ttft,
+                            "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                            "cost": reply.get("cost_dollars", 0.0) if not error else 0.0, "error": error})
+
+def _distribution(values: List[float]) -> dict:
+    if not values:
+        return {}
+    return {"p50": percentile(values, 50), "p90": percentile(values, 90), "p95": percentile(values, 95),
+            "p99": percentile(values, 99), "mean": sum(values) / len(values), "max": max(values)}
+
+def summarize(results: list, elapsed: float, args) -> dict:
+    ok = [result for result in results if not result["error"]]
+    tokens_per_second = []
+    for result in ok:
+        generation = result["latency"] - (result["ttft"] or 0.0)
+        if result["completion_tokens"] and generation > 0:
+            tokens_per_second.append(result["completion_tokens"] / generation)
+    completion_tokens = sum(result["completion_tokens"] for result in ok)
+    return {
+        "config": {"model": args.model, "concurrency": args.concurrency, "rate": args.rate,
+                   "requests": args.requests, "duration": args.duration, "turns": args.turns,
+                   "stream": not args.no_stream},
+        "elapsed_seconds": elapsed,
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "error_rate": (len(results) - len(ok)) / len(results) if results else 0.0,
+        "throughput_rps": len(ok) / elapsed if elapsed > 0 else 0.0,
+        "output_tokens_per_second": completion_tokens / elapsed if elapsed > 0 else 0.0,
+        "latency_seconds": _distribution([result["latency"] for result in ok]),
+        "ttft_seconds": _distribution([result["ttft"] for result in ok if result["ttft"] is not None]),
+        "queue_delay_seconds": _distribution([result["queue_delay"] for result in results]),
+        "tokens_per_second": _distribution(tokens_per_second),
+        "prompt_tokens": sum(result["prompt_tokens"] for result in ok),
+        "completion_tokens": completion_tokens,
+        "cost_dollars": sum(result["cost"] for result in ok),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Run concurrent termi-chat conversations against a model")
+    parser.add_argument("--model", required=True, help="model short name (see MODEL_INFO)")
+    parser.add_argument("--prompts", nargs="+", required=True, help="text (one prompt per line) or conversation json files")
+    parser.add_argument("--conversation", help="termi-chat json file each conversation starts from")
+    parser.add_argument("--concurrency", type=int, default=1, help="number of concurrent conversations")
+    parser.add_argument("--rate", type=float, default=0.0, help="target requests/second across all conversations (0 = unlimited)")
+    parser.add_argument("--requests", type=int, default=0, help="total requests to send (0 = until --duration)")
+    parser.add_argument("--duration", type=float, default=0.0, help="seconds to run (0 = until --requests)")
+    parser.add_argument("--turns", type=int, default=10, help="start a conversation over after this many prompts (0 = never)")
+    parser.add_argument("--max-context", type=int, default=100)
+    parser.add_argument("--no-stream", action="store_true")
+    parser.add_argument("--output", help="also write the report to this file")
+    args = parser.parse_args()
+    if not args.requests and not args.duration:
+        parser.error("give --requests and/or --duration")
+
+    prompts = read_prompts(args.prompts)
+    if not prompts:
+        parser.error("no prompts found")
+    base_messages = [{"role": "system", "content": DEFAULT_SYSTEM_PROMPT}]
+    if args.conversation:
+        with open(args.conversation, 'r') as file:
+            base_messages = json.load(file)
+    args.workdir = tempfile.mkdtemp(prefix="termi-chat-loadgen-")
+
+    from TermiChat import TermiChat
+    from admission import ADMISSION
+    from latency import LatencyTracker
+
+    # One pair of trackers for every worker, kept in the workdir so the load we generate
+    # doesn't end up in the latency history real sessions use for their timeouts and hedging.
+    latency = (LatencyTracker(os.path.join(args.workdir, "latency.json")),
+               LatencyTracker(os.path.join(args.workdir, "first_token.json")))
+
+    # We're measuring the server under --concurrency requests so let them all in
+    # (requests from other termi-chat processes still wait; see admission.py).
+    for queue in ADMISSION.values():
+        queue.slots = max(queue.slots, args.concurrency)
+
+    results = []
+    results_lock = threading.Lock()
+    started = time.time()
+    pacer = Pacer(args.rate, args.requests, started + args.duration if args.duration else 0.0)
+    threads = [threading.Thread(target=run_conversation,
+                                args=(TermiChat, worker, args, base_messages, prompts, pacer, results, results_lock, latency),
+                                daemon=True)
+               for worker in range(args.concurrency)]
+
+    # TermiChat talks to the terminal; keep that out of the report.
+    real_stdout = sys.stdout
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        except KeyboardInterrupt:
+            pass
+    elapsed = time.time() - started
+
+    with results_lock:
+        report = summarize(list(results), elapsed, args)
+    text = json.dumps(report, indent=2)
+    print(text, file=real_stdout)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+MessageStore holds a conversation for the Streamlit app as one list of
+messages (the same dicts we save to and load from the json files) plus views
+that are kept up to date as messages are added, so nothing is rebuilt or
+copied on a rerun or a send:
+
+  * api_messages: role and content only, which is what the APIs accept; the
+    dicts share their content strings with the messages
+  * the turns: the index of each assistant message, for drawing the history
+
+Loading parses the json array one message at a time straight into the store.
+
+Requests add messages from the job pool while the page is being drawn, so the
+store's methods take a lock; draw with turns() rather than indexing messages.
+"""
+
+import json
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+def iter_json_array(text: str) -> Iterator[dict]:
+    """Yield the items of the json array in text one at a time."""
+    index = len(text) - len(text.lstrip(_WHITESPACE))
+    if text[index:index + 1] != "[":
+        raise ValueError("Expected a json array of messages")
+    index += 1
+    while True:
+        while index < len(text) and text[index] in _WHITESPACE + ",":
+            index += 1
+        if index >= len(text):
+            raise ValueError("Unterminated json array")
+        if text[index] == "]":
+            return
+        item, index = _DECODER.raw_decode(text, index)
+        yield item
+
+class MessageStore:
+    def __init__(self, system_context: str):
+        self.messages: List[Dict] = [{"role": "system", "content": system_context}]
+        self.api_messages: List[Dict[str, str]] = [{"role": "system", "content": system_context}]
+        self.assistant_indexes: List[int] = []
+        self.total_cost = 0.0
+        self._lock = threading.RLock()
+
+    @property
+    def system_context(self) -> str:
+        return self.messages[0]["content"]
+
+    def set_system_context(self, system_context: str) -> None:
+        with self._lock:
+            self.messages[0]["content"] = system_context
+            self.api_messages[0]["content"] = system_context
+
+    def append(self, message: Dict) -> None:
+        with self._lock:
+            self.messages.append(message)
+            self.api_messages.append({"role": message["role"], "content": message["content"]})
+            if message["role"] == "assistant":
+                self.assistant_indexes.append(len(self.messages) - 1)
+                cost = message.get("cost")
+                if isinstance(cost, (int, float)):
+                    self.total_cost += cost
+
+    def pop(self) -> Dict:
+        """Remove and return the last message."""
+        with self._lock:
+            message = self.messages.pop()
+            self.api_messages.pop()
+            if self.assistant_indexes and self.assistant_indexes[-1] == len(self.messages):
+                self.assistant_indexes.pop()
+                cost = message.get("cost")
+                if isinstance(cost, (int, float)):
+                    self.total_cost -= cost
+            return message
+
+    def turn_count(self) -> int:
+        return len(self.assistant_indexes)
+
+    def turn(self, number: int) -> Tuple[Optional[Dict], Dict]:
+        """Return the user message (None if there isn't one) and the assistant message of a turn."""
+        with self._lock:
+            index = self.assistant_indexes[number]
+            previous = self.messages[index - 1]
+            return (previous if previous["role"] == "user" else None), self.messages[index]
+
+    def turns(self, first: int, last: int) -> List[Tuple[Optional[Dict], Dict]]:
+        """Return turns first up to (not including) last; fewer if the store has fewer."""
+        with self._lock:
+            return [self.turn(number) for number in range(first, min(last, len(self.assistant_indexes)))]
+
+    @classmethod
+    def load(cls, text: str, default_system_context: str) -> "MessageStore":
+        """Make a store from a saved conversation; the system prompt is the first
+           message if there is one."""
+        store = None
+        for message in iter_json_array(text):
+            if store is None:
+                if message["role"] == "system":
+                    store = cls(message["content"])
+                    continue
+                store = cls(default_system_context)
+            store.append(message)
+        return store or cls(default_system_context)
+
+    def to_json(self) -> str:
+        with self._lock:
+            return json.dumps(self.messages, indent=4)
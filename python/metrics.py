@@ -0,0 +1,144 @@
+"""
+An in-process metrics registry so we can compare models and providers on
+performance.  Each request records queue time, time to first token, total
+latency, tokens/sec, token counts and cost under both its model and its
+family (and its client when going through the proxy).
+
+Use format_stats() for the stats menu command and prometheus_text() (or
+start_metrics_server()) to expose the numbers to Prometheus.
+"""
+
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from utils import percentile
+
+# Keep this many recent samples per metric for percentiles.
+MAX_SAMPLES = 1000
+
+# Sampled metrics (we report percentiles for these).
+TIMINGS = ["queue_seconds", "ttft_seconds", "latency_seconds", "tokens_per_second"]
+
+# Counted metrics (we report totals for these).
+COUNTERS = ["requests", "errors", "prompt_tokens", "completion_tokens", "cost_dollars"]
+
+class _Series:
+    """The samples and totals for one model or family."""
+    def __init__(self):
+        self.samples = {name: deque(maxlen=MAX_SAMPLES) for name in TIMINGS}
+        self.totals = {name: 0.0 for name in COUNTERS}
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, str], _Series] = {}
+
+    def _get(self, kind: str, name: str) -> _Series:
+        key = (kind, name)
+        if key not in self._series:
+            self._series[key] = _Series()
+        return self._series[key]
+
+    def record(self, model: str, family: str, latency: float, queue: float = 0.0,
+               ttft: Optional[float] = None, prompt_tokens: int = 0, completion_tokens: int = 0,
+               cost: float = 0.0, error: bool = False, client: Optional[str] = None) -> None:
+        """Record one request.  ttft is None if we don't know when the first token
+           arrived (e.g., non-streamed responses); we use the latency in that case.
+           If client is given (e.g., by the proxy), it's also recorded under the client."""
+        if ttft is None:
+            ttft = latency
+        generation_time = latency - ttft
+        if generation_time <= 0:
+            generation_time = latency
+        tokens_per_second = completion_tokens / generation_time if generation_time > 0 else 0.0
+
+        with self._lock:
+            all_series = [self._get("model", model), self._get("family", family)]
+            if client is not None:
+                all_series.append(self._get("client", client))
+            for series in all_series:
+                series.totals["requests"] += 1
+                if error:
+                    series.totals["errors"] += 1
+                    continue
+                series.samples["queue_seconds"].append(queue)
+                series.samples["ttft_seconds"].append(ttft)
+                series.samples["latency_seconds"].append(latency)
+                if completion_tokens > 0:
+                    series.samples["tokens_per_second"].append(tokens_per_second)
+                series.totals["prompt_tokens"] += prompt_tokens
+                series.totals["completion_tokens"] += completion_tokens
+                series.totals["cost_dollars"] += cost
+
+    def snapshot(self) -> Dict[Tuple[str, str], Dict[str, float]]:
+        """Return {(kind, name): {metric: value}} with p50/p95/p99 for each timing
+           and the totals for each counter."""
+        result = {}
+        with self._lock:
+            for key, series in self._series.items():
+                values = dict(series.totals)
+                for name in TIMINGS:
+                    samples = list(series.samples[name])
+                    for pct in (50, 95, 99):
+                        values[f"{name}_p{pct}"] = percentile(samples, pct)
+                result[key] = values
+        return result
+
+    def format_stats(self) -> str:
+        """Return a table of the metrics for printing in the terminal."""
+        snapshot = self.snapshot()
+        if not snapshot:
+            return "No requests recorded yet."
+        header = f"{'':7} {'name':40} {'reqs':>5} {'errs':>4} {'latency p50/p95/p99':>22} {'ttft p50/p95':>14} {'tok/s p50':>9} {'tokens in/out':>15} {'cost':>9}"
+        lines = [header, "-" * len(header)]
+        for (kind, name), values in sorted(snapshot.items()):
+            latency = f"{values['latency_seconds_p50']:.2f}/{values['latency_seconds_p95']:.2f}/{values['latency_seconds_p99']:.2f}"
+            ttft = f"{values['ttft_seconds_p50']:.2f}/{values['ttft_seconds_p95']:.2f}"
+            tokens = f"{int(values['prompt_tokens'])}/{int(values['completion_tokens'])}"
+            lines.append(f"{kind:7} {name[:40]:40} {int(values['requests']):>5} {int(values['errors']):>4} {latency:>22} {ttft:>14} "
+                         f"{values['tokens_per_second_p50']:>9.1f} {tokens:>15} ${values['cost_dollars']:>8.4f}")
+        return "\n".join(lines)
+
+    def prometheus_text(self) -> str:
+        """Return the metrics in the Prometheus text exposition format."""
+        lines = []
+        snapshot = self.snapshot()
+        for name in TIMINGS:
+            lines.append(f"# TYPE termi_chat_{name} summary")
+            for (kind, label), values in sorted(snapshot.items()):
+                for pct in (50, 95, 99):
+                    lines.append(f'termi_chat_{name}{{{kind}="{_escape(label)}",quantile="0.{pct}"}} {values[f"{name}_p{pct}"]}')
+        for name in COUNTERS:
+            lines.append(f"# TYPE termi_chat_{name}_total counter")
+            for (kind, label), values in sorted(snapshot.items()):
+                lines.append(f'termi_chat_{name}_total{{{kind}="{_escape(label)}"}} {values[name]}')
+        return "\n".join(lines) + "\n"
+
+# The registry shared by everything in this process.
+METRICS = MetricsRegistry()
+
+def _escape(label: str) -> str:
+    return label.replace("\\", "\\\\").replace('"', '\\"')
+
+def start_metrics_server(registry: MetricsRegistry, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve registry at http://host:port/metrics in a background thread."""
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Don't clutter the console with scrapes.
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,226 @@
+"""
+A type-ahead model picker for the CLI's "model" command.  With the whole
+openrouter.ai catalog there are hundreds of models, too many to scroll
+through in a menu, so you type and the list narrows as you go:
+
+  * each word you type must match the start of a word in the model's name or
+    family ("open gpt" finds openrouter.ai/openai/gpt-3.5-turbo), or failing
+    that its letters in order ("mxtrl" finds mixtral)
+  * "free" matches models that cost nothing and e.g. "32k" matches models
+    with a 32K context
+  * with nothing typed you see the models you picked recently and the ones
+    with the lowest measured latency, then the rest
+
+Up/down (or Tab) to move, Enter to pick, Esc or Ctrl-C to cancel.  The words
+are looked up in a prefix index built once, so filtering takes well under a
+millisecond per keystroke.  The letters-in-order match only checks the models
+that have all of the letters (a per-letter index) and that matched the other
+words, which are looked up first.
+"""
+
+import os
+import re
+import sys
+import json
+import select
+from typing import Dict, List, Optional
+from utils import TERMI_CHAT_HOME, ANSI_BOLD, ANSI_GREEN, ANSI_YELLOW, ANSI_RESET
+
+RECENT_MODELS_FILE = os.path.join(TERMI_CHAT_HOME, "recent_models.json")
+MAX_RECENT = 8
+MAX_FASTEST = 5
+
+# Rows of models shown at once.
+MAX_ROWS = 15
+
+_WORD_SPLIT = re.compile(r"[\s/:._-]+")
+
+def load_recent(filename: str = RECENT_MODELS_FILE) -> List[str]:
+    try:
+        with open(filename, 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return []
+
+def remember_recent(model: str, filename: str = RECENT_MODELS_FILE) -> None:
+    """Put model at the front of the recent models."""
+    recent = [model] + [other for other in load_recent(filename) if other != model]
+    try:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        tmp_filename = f"{filename}.{os.getpid()}.tmp"
+        with open(tmp_filename, 'w') as file:
+            json.dump(recent[:MAX_RECENT], file)
+        os.replace(tmp_filename, filename)
+    except OSError:
+        pass
+
+class ModelIndex:
+    def __init__(self, model_info: Dict[str, dict], recent: List[str] = (), latency: Optional[Dict[str, float]] = None):
+        """model_info is MODEL_INFO (or the like); latency is the median seconds per model
+           for the ones we've measured."""
+        self.names = list(model_info)
+        self.info = model_info
+        self.latency = latency or {}
+        self.recent = [name for name in recent if name in model_info]
+        self.fastest = sorted(self.latency, key=self.latency.get)[:MAX_FASTEST]
+        self.fastest = [name for name in self.fastest if name in model_info]
+
+        # Matches are listed recent models first, then in MODEL_INFO order.
+        rank = {name: position for position, name in enumerate(self.recent)}
+        self.rank = [rank.get(name, len(rank) + position) for position, name in enumerate(self.names)]
+
+        self.prefixes: Dict[str, set] = {}
+        self.letters: Dict[str, set] = {}
+        self.text: List[str] = []
+        for position, name in enumerate(self.names):
+            info = model_info[name]
+            words = _WORD_SPLIT.split(f"{name} {info['model_family']}".lower())
+            if info["cost_input"] == 0.0 and info["cost_output"] == 0.0:
+                words.append("free")
+            context_length = info.get("context_length")
+            if context_length:
+                words.append(f"{context_length // 1000}k")
+            self.text.append(" ".join(words))
+            for letter in set(self.text[-1]):
+                self.letters.setdefault(letter, set()).add(position)
+            for word in words:
+                for end in range(1, len(word) + 1):
+                    self.prefixes.setdefault(word[:end], set()).add(position)
+
+    def _matches(self, term: str, within: Optional[set] = None) -> set:
+        """Return the positions of the models matching term; when term isn't the start
+           of a word, only the ones in within (the matches so far) are checked."""
+        found = self.prefixes.get(term)
+        if found is not None:
+            return found
+
+        # Not the start of any word; try the letters in order, but only on the models
+        # that have every letter.
+        candidates = within
+        for letter in sorted(set(term), key=lambda letter: len(self.letters.get(letter, ()))):
+            having = self.letters.get(letter, set())
+            candidates = having if candidates is None else candidates & having
+            if not candidates:
+                return set()
+        pattern = re.compile(".*?".join(re.escape(letter) for letter in term))
+        return {position for position in candidates if pattern.search(self.text[position])}
+
+    def search(self, query: str) -> List[str]:
+        """Return the names of the models matching every word of query."""
+        # Split the query the way the names were so "gpt-3.5" or "openai/gpt-4" match.
+        terms = [term for term in _WORD_SPLIT.split(query.lower()) if term]
+        if not terms:
+            return [self.names[position] for position in sorted(range(len(self.names)), key=self.rank.__getitem__)]
+        # Words found in the prefix index first (longest first) so the slower
+        # letters-in-order match has the fewest models left to check.
+        found = None
+        for term in sorted(terms, key=lambda term: (term not in self.prefixes, -len(term))):
+            matches = self._matches(term, found)
+            found = set(matches) if found is None else found & matches
+            if not found:
+                return []
+
+        # Names containing the query as typed come first.
+        typed = query.strip().lower()
+        return [self.names[position] for position in
+                sorted(found, key=lambda position: (typed not in self.names[position].lower(), self.rank[position]))]
+
+    def label(self, name: str) -> str:
+        info = self.info[name]
+        if info["cost_input"] == 0.0 and info["cost_output"] == 0.0:
+            price = "free"
+        else:
+            price = f"${info['cost_input']:.5f}/${info['cost_output']:.5f}"
+        context_length = info.get("context_length")
+        context = f"{context_length // 1000}K" if context_length else "-"
+        latency = f"{self.latency[name]:.1f}s" if name in self.latency else ""
+        return f"{name:55} {info['model_family']:22} {price:>19} {context:>6} {latency:>6}"
+
+    def sections(self, query: str) -> List[tuple]:
+        """Return (heading, names) to show for query."""
+        if query.strip():
+            matches = self.search(query)
+            return [(f"{len(matches)} matching", matches)]
+        sections = []
+        if self.recent:
+            sections.append(("Recent", self.recent))
+        if self.fastest:
+            sections.append(("Fastest measured", self.fastest))
+        sections.append(("All models", self.search("")))
+        return sections
+
+def _read_key(fd: int) -> str:
+    key = os.read(fd, 1).decode(errors="ignore")
+    if key == "\x1b":
+        # An arrow key sends more; Esc on its own doesn't.
+        while select.select([fd], [], [], 0.03)[0]:
+            key += os.read(fd, 1).decode(errors="ignore")
+            if key[-1].isalpha() or key[-1] == "~":
+                break
+    return key
+
+def pick_model(index: ModelIndex, current: Optional[str] = None) -> Optional[str]:
+    """Let the user type to find a model; returns its name or None if cancelled."""
+    if not sys.stdin.isatty():
+        query = input("Model (type part of its name): ")
+        matches = index.search(query)
+        return matches[0] if matches else None
+
+    import tty
+    import termios
+    fd = sys.stdin.fileno()
+    saved = termios.tcgetattr(fd)
+    query = ""
+    selected = 0
+    out = sys.stdout
+    try:
+        tty.setcbreak(fd)
+        while True:
+            sections = index.sections(query)
+            choices = [name for _, names in sections for name in names]
+            selected = max(0, min(selected, len(choices) - 1))
+
+            # Draw the query and a window of the list around the selection.
+            start = max(0, selected - MAX_ROWS + 1)
+            lines = []
+            row = 0
+            for heading, names in sections:
+                if row + len(names) > start and row < start + MAX_ROWS:
+                    lines.append(f"{ANSI_BOLD}{ANSI_GREEN}{heading}{ANSI_RESET}")
+                for name in names:
+                    if start <= row < start + MAX_ROWS:
+                        marker = ">" if row == selected else " "
+                        text = f"{marker} {index.label(name)}"
+                        if row == selected:
+                            text = f"{ANSI_YELLOW}{text}{ANSI_RESET}"
+                        elif name == current:
+                            text = f"{ANSI_BOLD}{text}{ANSI_RESET}"
+                        lines.append(text)
+                    row += 1
+            # Leave the cursor after the query.
+            out.write(f"\r\033[JModel: {query}" + "".join("\n" + line for line in lines))
+            if lines:
+                out.write(f"\033[{len(lines)}F")
+            out.write(f"\r\033[{len('Model: ') + len(query)}C")
+            out.flush()
+
+            key = _read_key(fd)
+            if key in ("\r", "\n"):
+                if choices:
+                    return choices[selected]
+            elif key in ("\x1b", "\x03", "\x04"):
+                return None
+            elif key in ("\x1b[A", "\x1bOA"):
+                selected -= 1
+            elif key in ("\x1b[B", "\x1bOB", "\t"):
+                selected += 1
+            elif key in ("\x7f", "\x08"):
+                query = query[:-1]
+                selected = 0
+            elif key.isprintable() and not key.startswith("\x1b"):
+                query += key
+                selected = 0
+    finally:
+        termios.tcsetattr(fd, termios.TCSADRAIN, saved)
+        out.write("\r\033[J")
+        out.flush()
@@ -0,0 +1,286 @@
+#!/usr/bin/env python
+"""
+Opt-in network phase tracing for provider calls.  When a request is slow, this
+tells us whether the time went to DNS, the TCP connect, the TLS handshake,
+waiting for the first byte, or transferring the body.  That separates network
+problems (e.g., the ssh tunnel to text-generation-webui) from model problems.
+
+Turn it on with TERMI_CHAT_TRACE=1 (writes TERMI_CHAT_HOME/trace.jsonl) or
+TERMI_CHAT_TRACE=/some/file.jsonl.  Each request is one JSON line.
+
+Summarize a trace file by endpoint with:
+  ./nettrace.py [trace_file]
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+from utils import TERMI_CHAT_HOME, percentile
+
+DEFAULT_TRACE_FILE = os.path.join(TERMI_CHAT_HOME, "trace.jsonl")
+
+# The phases we report, in the order they happen.
+PHASES = ["dns", "connect", "tls", "send", "wait", "body"]
+
+def _trace_file_from_env() -> Optional[str]:
+    value = os.environ.get("TERMI_CHAT_TRACE", "")
+    if value == "" or value == "0":
+        return None
+    if value == "1":
+        return DEFAULT_TRACE_FILE
+    return value
+
+TRACE_FILE = _trace_file_from_env()
+
+_local = threading.local()
+_write_lock = threading.Lock()
+
+def enabled() -> bool:
+    return TRACE_FILE is not None
+
+class PhaseTrace:
+    """Timings for one request.  Phases can be entered more than once (e.g., a
+       redirect) so durations accumulate."""
+    def __init__(self, label: str):
+        self.label = label
+        self.endpoint = None
+        self.started_at = time.time()
+        self.durations: Dict[str, float] = {}
+        self._open: Dict[str, float] = {}
+        self.error = None
+
+    def begin(self, phase: str) -> None:
+        self._open[phase] = time.perf_counter()
+
+    def end(self, phase: str) -> None:
+        started = self._open.pop(phase, None)
+        if started is not None:
+            self.durations[phase] = self.durations.get(phase, 0.0) + time.perf_counter() - started
+
+    def as_record(self) -> dict:
+        # Whatever is still open (usually the body) ends now.
+        for phase in list(self._open):
+            self.end(phase)
+        record = {"timestamp": datetime.fromtimestamp(self.started_at).isoformat(timespec="seconds"),
+                  "endpoint": self.endpoint, "label": self.label,
+                  "total": round(time.time() - self.started_at, 4),
+                  # No connect phase means we reused a pooled connection.
+                  "reused": "connect" not in self.durations}
+        for phase in PHASES:
+            record[phase] = round(self.durations.get(phase, 0.0), 4)
+        # Our connect timings include the DNS lookup; report just the TCP part.
+        record["connect"] = round(max(record["connect"] - record["dns"], 0.0), 4)
+        if self.error:
+            record["error"] = self.error
+        return record
+
+def current() -> Optional[PhaseTrace]:
+    """Return the trace for the request running on this thread (if any)."""
+    return getattr(_local, "trace", None)
+
+@contextmanager
+def trace_request(label: str):
+    """Trace the HTTP calls made on this thread inside the with block and write
+       one record to the trace file.  Does nothing if tracing is off."""
+    if not enabled():
+        yield None
+        return
+    _install_dns_hook()
+    trace = PhaseTrace(label)
+    _local.trace = trace
+    try:
+        yield trace
+    except BaseException as e:
+        trace.error = str(e) or type(e).__name__
+        raise
+    finally:
+        _local.trace = None
+        _write(trace.as_record())
+
+def _write(record: dict) -> None:
+    try:
+        with _write_lock:
+            os.makedirs(os.path.dirname(TRACE_FILE) or ".", exist_ok=True)
+            with open(TRACE_FILE, "a") as file:
+                file.write(json.dumps(record) + "\n")
+    except Exception as e:
+        print(f"Unable to write trace to {TRACE_FILE}: {e}")
+
+_dns_hook_installed = False
+
+def _install_dns_hook() -> None:
+    """Time DNS lookups made while a trace is active.  Both httpx and requests end
+       up in socket.getaddrinfo so this covers every client we use."""
+    global _dns_hook_installed
+    if _dns_hook_installed:
+        return
+    _dns_hook_installed = True
+    original_getaddrinfo = socket.getaddrinfo
+
+    def traced_getaddrinfo(*args, **kwargs):
+        trace = current()
+        if trace is None:
+            return original_getaddrinfo(*args, **kwargs)
+        trace.begin("dns")
+        try:
+            return original_getaddrinfo(*args, **kwargs)
+        finally:
+            trace.end("dns")
+    socket.getaddrinfo = traced_getaddrinfo
+
+# httpcore trace events mapped to our phases.  httpcore's connect_tcp includes
+# the DNS lookup which we subtract when writing the record.
+_HTTPCORE_PHASES = {
+    "connection.connect_tcp": "connect",
+    "connection.start_tls": "tls",
+    "http11.send_request_headers": "send",
+    "http11.send_request_body": "send",
+    "http11.receive_response_headers": "wait",
+    "http11.receive_response_body": "body",
+    "http2.send_request_headers": "send",
+    "http2.send_request_body": "send",
+    "http2.receive_response_headers": "wait",
+    "http2.receive_response_body": "body",
+}
+
+def _httpcore_event(event_name: str, info: dict) -> None:
+    trace = current()
+    if trace is None:
+        return
+    name, _, state = event_name.rpartition(".")
+    phase = _HTTPCORE_PHASES.get(name)
+    if phase is None:
+        return
+    if state == "started":
+        trace.begin(phase)
+    elif state in ("complete", "failed"):
+        trace.end(phase)
+
+def traced_httpx_transport():
+    """Return an httpx transport that reports phases to the active trace."""
+    import httpx
+
+    class TracingTransport(httpx.HTTPTransport):
+        def handle_request(self, request):
+            trace = current()
+            if trace is not None:
+                trace.endpoint = trace.endpoint or f"{request.url.host}:{request.url.port or (443 if request.url.scheme == 'https' else 80)}"
+                request.extensions["trace"] = _httpcore_event
+            return super().handle_request(request)
+
+    return TracingTransport()
+
+def traced_httpx_client():
+    """Return an httpx.Client that reports phases to the active trace.  Pass it as
+       http_client to OpenAI(...)."""
+    import httpx
+    return httpx.Client(transport=traced_httpx_transport(), timeout=httpx.Timeout(600.0, connect=10.0))
+
+def traced_session():
+    """Return a requests.Session that reports phases to the active trace."""
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    class _Traced:
+        def _new_conn(self):
+            trace = current()
+            if trace is None:
+                return super()._new_conn()
+            trace.endpoint = trace.endpoint or f"{self.host}:{self.port}"
+            trace.begin("connect")
+            try:
+                return super()._new_conn()
+            finally:
+                trace.end("connect")
+
+        def request(self, *args, **kwargs):
+            trace = current()
+            if trace is None:
+                return super().request(*args, **kwargs)
+            trace.endpoint = trace.endpoint or f"{self.host}:{self.port}"
+            # For plain http, the connect happens inside request(); don't count it twice.
+            connect_before = trace.durations.get("connect", 0.0)
+            started = time.perf_counter()
+            try:
+                return super().request(*args, **kwargs)
+            finally:
+                send = time.perf_counter() - started - (trace.durations.get("connect", 0.0) - connect_before)
+                trace.durations["send"] = trace.durations.get("send", 0.0) + max(send, 0.0)
+
+        def getresponse(self, *args, **kwargs):
+            trace = current()
+            if trace is None:
+                return super().getresponse(*args, **kwargs)
+            trace.begin("wait")
+            try:
+                return super().getresponse(*args, **kwargs)
+            finally:
+                trace.end("wait")
+                trace.begin("body")
+
+    class TracedHTTPConnection(_Traced, HTTPConnection):
+        pass
+
+    class TracedHTTPSConnection(_Traced, HTTPSConnection):
+        def connect(self):
+            trace = current()
+            if trace is None:
+                return super().connect()
+            # connect() is TCP connect (_new_conn) then the TLS handshake.
+            started = time.perf_counter()
+            super().connect()
+            tls = time.perf_counter() - started - trace.durations.get("connect", 0.0)
+            trace.durations["tls"] = trace.durations.get("tls", 0.0) + max(tls, 0.0)
+
+    class TracedHTTPPool(HTTPConnectionPool):
+        ConnectionCls = TracedHTTPConnection
+
+    class TracedHTTPSPool(HTTPSConnectionPool):
+        ConnectionCls = TracedHTTPSConnection
+
+    class TracingAdapter(HTTPAdapter):
+        def init_poolmanager(self, *args, **kwargs):
+            super().init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = {"http": TracedHTTPPool, "https": TracedHTTPSPool}
+
+    session = requests.Session()
+    session.mount("http://", TracingAdapter())
+    session.mount("https://", TracingAdapter())
+    return session
+
+def summarize(records: List[dict]) -> str:
+    """Return a table of p50/p95 per phase for each endpoint."""
+    by_endpoint: Dict[str, List[dict]] = {}
+    for record in records:
+        by_endpoint.setdefault(record.get("endpoint") or "unknown", []).append(record)
+    lines = []
+    header = f"{'endpoint':32} {'reqs':>5} {'errs':>4} {'reused':>6} " + " ".join(f"{phase + ' p50/p95':>15}" for phase in PHASES + ["total"])
+    lines.append(header)
+    lines.append("-" * len(header))
+    for endpoint, items in sorted(by_endpoint.items()):
+        errors = sum(1 for item in items if item.get("error"))
+        reused = sum(1 for item in items if item.get("reused"))
+        cells = []
+        for phase in PHASES + ["total"]:
+            values = [item.get(phase, 0.0) for item in items]
+            cells.append(f"{percentile(values, 50):.3f}/{percentile(values, 95):.3f}".rjust(15))
+        lines.append(f"{endpoint[:32]:32} {len(items):>5} {errors:>4} {reused:>6} " + " ".join(cells))
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    trace_file = sys.argv[1] if len(sys.argv) > 1 else (TRACE_FILE or DEFAULT_TRACE_FILE)
+    try:
+        with open(trace_file, 'r') as file:
+            records = [json.loads(line) for line in file if line.strip()]
+    except FileNotFoundError:
+        print(f"File not found: {trace_file}")
+        sys.exit(1)
+    print(summarize(records))
@@ -0,0 +1,153 @@
+"""
+Profiling for real termi-chat sessions (use --profile).  Slowdowns show up on
+big conversations so we want to capture them where they happen rather than
+in a synthetic test.
+
+While profiling is on we:
+  * run cProfile on the main thread (saved as a .prof file for snakeviz, etc.)
+  * sample the main thread's stack every few milliseconds and save the stacks
+    in the "folded" format used by flamegraph.pl and speedscope
+  * time each call to the hot paths (load, _prepare_messages_for_api,
+    get_estimated_tokens, send, view, wrap_text, save) and record their peak
+    memory with tracemalloc
+
+Everything is written to TERMI_CHAT_HOME/profiles when the program exits.
+"""
+
+import os
+import sys
+import time
+import atexit
+import pstats
+import cProfile
+import threading
+import functools
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List
+from utils import TERMI_CHAT_HOME, percentile
+
+DEFAULT_PROFILE_DIR = os.path.join(TERMI_CHAT_HOME, "profiles")
+
+# Seconds between stack samples.
+SAMPLE_INTERVAL = 0.005
+
+class SessionProfiler:
+    def __init__(self, output_dir: str = DEFAULT_PROFILE_DIR, interval: float = SAMPLE_INTERVAL):
+        self.output_dir = output_dir
+        self.interval = interval
+        self._profile = cProfile.Profile()
+        self._stacks = Counter()
+        self._calls: Dict[str, List[float]] = {}
+        self._peaks: Dict[str, int] = {}
+        # Per-thread stack of the highest traced memory seen inside each
+        # instrumented call that is still running.  reset_peak() is global, so
+        # an inner call folds the peak it is about to wipe into its parent.
+        self._peak_stacks = threading.local()
+        self._stop = threading.Event()
+        self._sampler = None
+        self._main_thread_id = threading.main_thread().ident
+        self._start_snapshot = None
+        self._started_at = None
+
+    def instrument(self, owner, name: str) -> None:
+        """Replace owner.name (a method on a class or a function in a module) with a
+           wrapper that times each call and records its peak memory."""
+        function = getattr(owner, name)
+        label = f"{getattr(owner, '__name__', owner)}.{name}"
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            stack = self._peak_stack()
+            if stack:
+                stack[-1] = max(stack[-1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            stack.append(before)
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                peak = max(tracemalloc.get_traced_memory()[1], stack.pop())
+                if stack:
+                    stack[-1] = max(stack[-1], peak)
+                self._calls.setdefault(label, []).append(elapsed)
+                self._peaks[label] = max(self._peaks.get(label, 0), peak - before)
+        setattr(owner, name, wrapper)
+
+    def _peak_stack(self) -> List[int]:
+        """Return this thread's stack of running instrumented calls' peaks."""
+        if not hasattr(self._peak_stacks, "stack"):
+            self._peak_stacks.stack = []
+        return self._peak_stacks.stack
+
+    def start(self) -> None:
+        self._started_at = datetime.now()
+        tracemalloc.start(25)
+        self._start_snapshot = tracemalloc.take_snapshot()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+        self._profile.enable()
+        atexit.register(self.stop_and_report)
+
+    def _sample(self) -> None:
+        """Collect the main thread's stack every interval seconds."""
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._main_thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self._stacks[";".join(reversed(stack))] += 1
+
+    def stop_and_report(self) -> None:
+        """Stop profiling and write the report files; safe to call more than once."""
+        if self._stop.is_set():
+            return
+        self._profile.disable()
+        self._stop.set()
+        end_snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, f"termi-chat-{self._started_at.strftime('%Y%m%d-%H%M%S')}")
+
+        self._profile.dump_stats(base + ".prof")
+        with open(base + ".folded", "w") as file:
+            for stack, count in self._stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+        with open(base + ".txt", "w") as file:
+            file.write(f"termi-chat profile {self._started_at.isoformat(timespec='seconds')} - {datetime.now().isoformat(timespec='seconds')}\n\n")
+            file.write("Hot paths (seconds):\n")
+            file.write(f"{'function':45} {'calls':>6} {'total':>9} {'p50':>9} {'p95':>9} {'max':>9} {'peak KiB':>9}\n")
+            for label, times in sorted(self._calls.items(), key=lambda item: -sum(item[1])):
+                file.write(f"{label:45} {len(times):>6} {sum(times):>9.4f} {percentile(times, 50):>9.4f} "
+                           f"{percentile(times, 95):>9.4f} {max(times):>9.4f} {self._peaks.get(label, 0) / 1024:>9.1f}\n")
+
+            file.write("\nMemory growth since start (top 20 by line):\n")
+            for stat in end_snapshot.compare_to(self._start_snapshot, "lineno")[:20]:
+                file.write(f"{stat}\n")
+
+            file.write("\ncProfile (top 40 by cumulative time):\n")
+            stats = pstats.Stats(self._profile, stream=file)
+            stats.sort_stats("cumulative").print_stats(40)
+
+        print(f"Profile written to {base}.txt (also {base}.prof and {base}.folded for flamegraphs)")
+
+def enable_profiling(termi_chat_class, termi_chat_module, output_dir: str = DEFAULT_PROFILE_DIR) -> SessionProfiler:
+    """Instrument the TermiChat hot paths and start profiling.  Call this before
+       making the TermiChat instance so loading the conversation is captured."""
+    profiler = SessionProfiler(output_dir)
+    for name in ["check_load_file", "_load_json_file", "_prepare_messages_for_api",
+                 "get_estimated_tokens", "send", "view", "save"]:
+        profiler.instrument(termi_chat_class, name)
+
+    # TermiChat calls wrap_text through its module's namespace.
+    profiler.instrument(termi_chat_module, "wrap_text")
+    profiler.start()
+    return profiler
@@ -0,0 +1,407 @@
+#!/usr/bin/env python
+"""
+A local OpenAI compatible proxy so other tools get termi-chat's routing and
+cost tracking.  Point any OpenAI client at it:
+
+  ./proxy.py --port 5080 --cache-size 1000
+  OPENAI_BASE_URL=http://127.0.0.1:5080/v1 OPENAI_API_KEY=unused some-tool
+
+POST /v1/chat/completions is routed by the "model" field using MODEL_INFO (a
+short name like "Assistant" or "deepseek/deepseek-chat", or a model_api_name)
+to openai, openrouter.ai, deepseek, ollama or text-generation-webui.  The
+provider keys come from the proxy's environment, not the caller.
+
+Streamed responses are passed through event by event.  Every request is
+metered (tokens and cost) per model, family and client; the client is the
+X-Termi-Chat-Client header or the caller's address.  See GET /stats (a table)
+and GET /metrics (Prometheus).  GET /v1/models lists the models.  Costs also go
+to the ledger and requests that would go over the daily/monthly budget are
+refused with a 402 (see ledger.py).  Requests for ollama and
+text-generation-webui wait their turn with the other termi-chat processes
+using them (see admission.py).
+
+With --cache-size, identical requests are answered from memory.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import select
+import hashlib
+import argparse
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+import httpx
+import cassette
+from metrics import METRICS
+from ledger import LEDGER
+from admission import ADMISSION, POLL_SECONDS
+from ModelInfo import MODEL_INFO, AVAILABLE_MODELS, MODEL_PREFIXES, OPENAI_COMPATIBLE_FAMILIES
+from TermiChat import OPENROUTER_BASE_URL, DEEPSEEK_BASE_URL, OLLAMA_BASE_URL, TGW_URL, TOKEN_ENCODING, DEFAULT_ESTIMATED_OUTPUT_TOKENS
+
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1")
+
+def route(model_name: str) -> Optional[str]:
+    """Return the MODEL_INFO key for a model name from a request (None if we don't know it)."""
+    for name in [model_name] + [prefix + model_name for prefix in MODEL_PREFIXES]:
+        if name in MODEL_INFO:
+            return name
+    for name, info in MODEL_INFO.items():
+        if info["model_api_name"] == model_name:
+            return name
+    return None
+
+def upstream_request(model: str, body: dict) -> Tuple[str, dict, dict]:
+    """Return the url, headers and body to send body to the provider for model."""
+    info = MODEL_INFO[model]
+    family = info["model_family"]
+    body = dict(body, model=info["model_api_name"])
+    headers = {"Content-Type": "application/json"}
+    if family == "text-generation-webui":
+        body.pop("model")
+        body.update({"mode": "chat", "character": info["model_api_name"]})
+        return TGW_URL, headers, body
+    if family == "openrouter.ai":
+        headers.update({"Authorization": f"Bearer {cassette.api_key('OPENROUTER_API_KEY')}",
+                        "HTTP-Referer": "termi-chat", "X-Title": "termi-chat"})
+        return f"{OPENROUTER_BASE_URL}/chat/completions", headers, body
+    if family == "deepseek":
+        headers["Authorization"] = f"Bearer {cassette.api_key('DEEPSEEK_API_KEY')}"
+        return f"{DEEPSEEK_BASE_URL}/chat/completions", headers, body
+    if family == "ollama":
+        return f"{OLLAMA_BASE_URL}/chat/completions", headers, body
+    headers["Authorization"] = f"Bearer {cassette.api_key('OPENAI_API_KEY')}"
+    return f"{OPENAI_BASE_URL}/chat/completions", headers, body
+
+def cost_for(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    info = MODEL_INFO[model]
+    return info["cost_input"] * prompt_tokens / 1000 + info["cost_output"] * completion_tokens / 1000
+
+def estimate_tokens(messages: list, text: str) -> Tuple[int, int]:
+    """Estimate (prompt, completion) tokens when the provider doesn't report usage."""
+    prompt = sum(len(TOKEN_ENCODING.encode(str(message.get("content", "")))) for message in messages)
+    return prompt, len(TOKEN_ENCODING.encode(text))
+
+def estimate_cost(model: str, body: dict) -> float:
+    """Estimate the cost of a request for the budget check; the response is max_tokens
+       if the caller set it, otherwise the model's average from the ledger."""
+    prompt_tokens, _ = estimate_tokens(body.get("messages", []), "")
+    completion_tokens = body.get("max_tokens") or LEDGER.average_completion_tokens(model) or DEFAULT_ESTIMATED_OUTPUT_TOKENS
+    return cost_for(model, prompt_tokens, completion_tokens)
+
+def stream_lines(response: httpx.Response):
+    """Yield the lines of a streamed response followed by an empty line."""
+    yield from response.iter_lines()
+    yield ""
+
+class ResponseCache:
+    """LRU cache of successful responses keyed by the request body."""
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(body: dict) -> str:
+        return hashlib.sha256(json.dumps(body, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (self.ttl and time.time() - entry[0] > self.ttl):
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, value) -> None:
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+def make_handler(upstream: httpx.Client, cache: Optional[ResponseCache], verbose: bool):
+    class ProxyHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            if verbose:
+                super().log_message(format, *args)
+
+        def _send_body(self, status: int, content_type: str, data: bytes) -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _send_error_json(self, status: int, message: str) -> None:
+            body = {"error": {"message": message, "type": "invalid_request_error" if status < 500 else "upstream_error"}}
+            self._send_body(status, "application/json", json.dumps(body).encode("utf-8"))
+
+        def _start_stream(self) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+        def _write_chunk(self, data: bytes) -> None:
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        def _end_stream(self) -> None:
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+        def do_GET(self):
+            if self.path == "/v1/models":
+                data = {"object": "list", "data": [{"id": name, "object": "model", "owned_by": info["model_family"]}
+                                                   for name, info in AVAILABLE_MODELS.items()]}
+                self._send_body(200, "application/json", json.dumps(data).encode("utf-8"))
+            elif self.path == "/metrics":
+                text = METRICS.prometheus_text()
+                if cache is not None:
+                    text += (f"# TYPE termi_chat_proxy_cache_hits_total counter\ntermi_chat_proxy_cache_hits_total {cache.hits}\n"
+                             f"# TYPE termi_chat_proxy_cache_misses_total counter\ntermi_chat_proxy_cache_misses_total {cache.misses}\n")
+                self._send_body(200, "text/plain; version=0.0.4", text.encode("utf-8"))
+            elif self.path == "/stats":
+                text = METRICS.format_stats() + "\n"
+                if cache is not None:
+                    text += f"\ncache: {cache.hits} hits, {cache.misses} misses\n"
+                self._send_body(200, "text/plain", text.encode("utf-8"))
+            else:
+                self._send_error_json(404, f"Unknown path {self.path}")
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/v1/chat/completions":
+                self._send_error_json(404, f"Unknown path {self.path}")
+                return
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            except ValueError:
+                self._send_error_json(400, "Request body is not JSON")
+                return
+            model = route(str(body.get("model", "")))
+            if model is None:
+                self._send_error_json(404, f"Unknown model {body.get('model')}; see /v1/models")
+                return
+            client = self.headers.get("X-Termi-Chat-Client") or self.client_address[0]
+            started = time.time()
+
+            key = None
+            if cache is not None:
+                key = ResponseCache.key(body)
+                cached = cache.get(key)
+                if cached is not None:
+                    self._replay(cached, body.get("stream", False))
+                    METRICS.record(model, MODEL_INFO[model]["model_family"], time.time() - started, client=client)
+                    return
+
+            reservation = None
+            estimated_cost = estimate_cost(model, body)
+            if estimated_cost > 0.0:
+                reservation, over_budget = LEDGER.reserve(estimated_cost)
+                if over_budget is not None:
+                    self._send_error_json(402, over_budget)
+                    return
+
+            # Requests for a local model server wait their turn (see admission.py).
+            queue = ADMISSION.get(MODEL_INFO[model]["model_family"])
+            ticket = None
+            if queue is not None:
+                ticket = self._admit(queue, MODEL_INFO[model]["model_api_name"])
+                if ticket is None:
+                    # The caller hung up while waiting.
+                    LEDGER.release(reservation)
+                    return
+            waited = time.time() - started
+            try:
+                if body.get("stream"):
+                    usage, text, ttft, events = self._proxy_stream(model, body)
+                else:
+                    usage, text, ttft, events = self._proxy_json(model, body)
+            except httpx.HTTPError as e:
+                self._send_error_json(502, f"Error talking to {MODEL_INFO[model]['model_family']}: {e}")
+                METRICS.record(model, MODEL_INFO[model]["model_family"], time.time() - started, error=True, client=client)
+                LEDGER.release(reservation)
+                return
+            except (BrokenPipeError, ConnectionResetError):
+                # The caller went away; leaving the with block closed the upstream request.
+                LEDGER.release(reservation)
+                return
+            finally:
+                if queue is not None:
+                    queue.release(ticket)
+            latency = time.time() - started
+
+            if usage is None:
+                METRICS.record(model, MODEL_INFO[model]["model_family"], latency, error=True, client=client)
+                LEDGER.release(reservation)
+                return
+            prompt_tokens, completion_tokens = usage
+            if prompt_tokens is None or completion_tokens is None:
+                prompt_tokens, completion_tokens = estimate_tokens(body.get("messages", []), text)
+            cost = cost_for(model, prompt_tokens, completion_tokens)
+            METRICS.record(model, MODEL_INFO[model]["model_family"], latency, queue=waited, ttft=ttft,
+                           prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, cost=cost, client=client)
+            LEDGER.record(model, MODEL_INFO[model]["model_family"], prompt_tokens, completion_tokens, cost,
+                          client, source="proxy", reservation=reservation)
+            if key is not None and events is not None:
+                cache.put(key, events)
+
+        def _client_gone(self) -> bool:
+            """Return True if the caller closed its connection."""
+            try:
+                readable, _, _ = select.select([self.connection], [], [], 0)
+                return bool(readable) and not self.connection.recv(1, socket.MSG_PEEK)
+            except OSError:
+                return True
+
+        def _admit(self, queue, model_api_name: str) -> Optional[str]:
+            """Wait our turn for a local model server and return the ticket; None if the
+               caller hung up while we waited (so it doesn't take a slot for nobody)."""
+            hung_up = threading.Event()
+            admitted = threading.Event()
+
+            def watch() -> None:
+                while not admitted.wait(POLL_SECONDS):
+                    if self._client_gone():
+                        hung_up.set()
+                        return
+            threading.Thread(target=watch, daemon=True).start()
+            try:
+                return queue.admit(model_api_name, hung_up)
+            finally:
+                admitted.set()
+
+        def _replay(self, cached, stream: bool) -> None:
+            if stream:
+                self._start_stream()
+                for event in cached:
+                    self._write_chunk(event)
+                self._end_stream()
+            else:
+                self._send_body(200, "application/json", cached)
+
+        def _proxy_json(self, model: str, body: dict):
+            """Forward a non-streamed request; return (usage, text, ttft, cacheable body)."""
+            url, headers, upstream_body = upstream_request(model, body)
+            response = upstream.post(url, json=upstream_body, headers=headers)
+            data = response.content
+            self._send_body(response.status_code, response.headers.get("Content-Type", "application/json"), data)
+            if response.status_code != 200:
+                return None, "", None, None
+            try:
+                result = json.loads(data)
+                usage = result.get("usage") or {}
+                text = result["choices"][0]["message"]["content"] or ""
+            except (ValueError, KeyError, IndexError, TypeError):
+                return (None, None), "", None, None
+            return (usage.get("prompt_tokens"), usage.get("completion_tokens")), text, None, data
+
+        def _proxy_stream(self, model: str, body: dict):
+            """Forward a streamed request event by event; return (usage, text, ttft, events)."""
+            family = MODEL_INFO[model]["model_family"]
+            wants_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+            upstream_body = body
+            if family in OPENAI_COMPATIBLE_FAMILIES and not wants_usage:
+                # Ask for usage so we can meter; the caller didn't ask so we drop it again.
+                upstream_body = dict(body, stream_options=dict(body.get("stream_options") or {}, include_usage=True))
+            url, headers, upstream_body = upstream_request(model, upstream_body)
+
+            usage = (None, None)
+            pieces = []
+            events = []
+            ttft = None
+            started = time.time()
+            with upstream.stream("POST", url, json=upstream_body, headers=headers) as response:
+                if response.status_code != 200:
+                    self._send_body(response.status_code, response.headers.get("Content-Type", "application/json"),
+                                    response.read())
+                    return None, "", None, None
+                self._start_stream()
+                event = []
+                # An empty line ends an event (stream_lines adds one in case the stream didn't).
+                for line in stream_lines(response):
+                    if line:
+                        event.append(line)
+                        continue
+                    if not event:
+                        continue
+                    data = "\n".join(event)
+                    event = []
+                    keep = True
+                    if data.startswith("data: {"):
+                        try:
+                            chunk = json.loads(data[6:])
+                        except ValueError:
+                            chunk = {}
+                        if chunk.get("usage"):
+                            usage = (chunk["usage"].get("prompt_tokens"), chunk["usage"].get("completion_tokens"))
+                            keep = wants_usage or bool(chunk.get("choices"))
+                        for choice in chunk.get("choices") or []:
+                            content = (choice.get("delta") or {}).get("content")
+                            if content:
+                                if ttft is None:
+                                    ttft = time.time() - started
+                                pieces.append(content)
+                    if keep:
+                        encoded = (data + "\n\n").encode("utf-8")
+                        events.append(encoded)
+                        self._write_chunk(encoded)
+                self._end_stream()
+            return usage, "".join(pieces), ttft, events
+
+    return ProxyHandler
+
+def start_proxy(host: str, port: int, cache_size: int = 0, cache_ttl: float = 0.0, max_connections: int = 100,
+                verbose: bool = False) -> ThreadingHTTPServer:
+    """Start the proxy in a background thread and return the server."""
+    transport = cassette.provider_httpx_transport()
+    if transport is None:
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        transport = httpx.HTTPTransport(limits=limits)
+    # One pooled client for every request so connections to each provider are reused.
+    upstream = httpx.Client(transport=transport, timeout=httpx.Timeout(600.0, connect=10.0))
+    cache = ResponseCache(cache_size, cache_ttl) if cache_size > 0 else None
+
+    class ProxyServer(ThreadingHTTPServer):
+        daemon_threads = True
+
+        # Lots of tools may connect at once; don't refuse them while threads start.
+        request_queue_size = 128
+
+    server = ProxyServer((host, port), make_handler(upstream, cache, verbose))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI compatible proxy with routing, metering and caching")
+    parser.add_argument("--host", default="127.0.0.1", help="keep this local: the proxy uses your provider keys")
+    parser.add_argument("--port", type=int, default=5080)
+    parser.add_argument("--cache-size", type=int, default=0, help="cache this many responses (0 = no cache)")
+    parser.add_argument("--cache-ttl", type=float, default=0.0, help="seconds a cached response is good for (0 = forever)")
+    parser.add_argument("--max-connections", type=int, default=100, help="max upstream connections")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    server = start_proxy(args.host, args.port, args.cache_size, args.cache_ttl, args.max_connections, args.verbose)
+    print(f"termi-chat proxy listening on http://{args.host}:{server.server_address[1]}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+if __name__ == "__main__":
+    main()
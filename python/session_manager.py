@@ -0,0 +1,338 @@
+#!/usr/bin/env python
+"""
+Hold many conversations (sessions) in one termi-chat process and switch
+between them without waiting for a response.
+
+  ./session_manager.py ../termi-chats/work.json ../termi-chats/fun.json --model Assistant
+
+Type these on a line by itself (finish with Ctrl-D as usual):
+
+  :ls                 list the sessions
+  :2                  switch to session 2
+  :n / :p             switch to the next / previous session
+  :new FILE [MODEL]   open another conversation
+
+The Ctrl-D menu has the same choices.  When you send, you can send in the
+background: the request keeps running (and its output is kept) while you
+switch to another session and type there.  You're told when it's done and
+its output is shown when you switch back.  Everything else works like
+termi-chat.py; quit/exit closes the current session.
+
+All sessions share the provider clients (and their connection pools) and the
+tokenizer.  To bound memory, the messages of sessions that have been idle
+for --idle-minutes, or beyond the --max-resident most recently used, are
+swapped out to ~/.termi-chat/swap and read back when you switch to them.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from typing import List, Optional
+from simple_term_menu import TerminalMenu
+from chat_daemon import OutputRouter
+from utils import TERMI_CHAT_HOME, marker_message, warn_message, info_message, ANSI_BOLD, ANSI_GREEN, ANSI_YELLOW, ANSI_RESET
+
+SWAP_DIR = os.path.join(TERMI_CHAT_HOME, "swap")
+
+# Extra Ctrl-D menu items; the rest come from TermiChat.MENU_ITEMS.
+SESSION_MENU_ITEMS = {
+    "[:] switch  - Switch to another session": ":switch",
+    "[+] new     - Open another conversation": ":new",
+}
+
+class SessionOutput(OutputRouter):
+    """Like the daemon's router but the terminal is still a terminal."""
+    def isatty(self) -> bool:
+        return self.stdout.isatty()
+
+class Session:
+    def __init__(self, number: int, instance, terminal):
+        self.number = number
+        self.instance = instance
+        self.terminal = terminal
+
+        # What a background request printed while we weren't looking.
+        self.output: List[str] = []
+        self.watching = False
+        self.thread: Optional[threading.Thread] = None
+        self.notified = True
+        self.last_used = time.time()
+        self.swap_file: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def busy(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def write(self, message: dict) -> None:
+        """OutputRouter callback for the thread running this session's request."""
+        with self._lock:
+            if self.watching:
+                self.terminal.write(message["out"])
+                self.terminal.flush()
+            else:
+                self.output.append(message["out"])
+
+    def watch(self) -> None:
+        """Show what was kept and show further output as it arrives."""
+        with self._lock:
+            text, self.output = "".join(self.output), []
+            self.watching = True
+        if text:
+            sys.stdout.write(text)
+            sys.stdout.flush()
+
+    def unwatch(self) -> None:
+        with self._lock:
+            self.watching = False
+
+    def label(self) -> str:
+        instance = self.instance
+        status = ""
+        if self.busy():
+            status = " (busy)"
+        elif self.output:
+            status = " (new output)"
+        elif self.swap_file is not None:
+            status = " (swapped)"
+        return f"[{self.number}] {instance.name} {instance.model}{status}"
+
+    def swap_out(self) -> None:
+        """Write the messages to disk and drop them from memory."""
+        instance = self.instance
+        os.makedirs(SWAP_DIR, exist_ok=True)
+        self.swap_file = os.path.join(SWAP_DIR, f"{os.getpid()}-{self.number}.json")
+        with open(self.swap_file, 'w') as file:
+            json.dump({"messages": instance.messages, "original_messages": instance.original_messages,
+                       "timestamps": instance.timestamps, "draft": instance.draft}, file)
+        instance.messages = instance.original_messages = instance.timestamps = instance.draft = None
+
+    def swap_in(self) -> None:
+        if self.swap_file is None:
+            return
+        instance = self.instance
+        with open(self.swap_file, 'r') as file:
+            swapped = json.load(file)
+        instance.messages, instance.original_messages = swapped["messages"], swapped["original_messages"]
+        instance.timestamps, instance.draft = swapped["timestamps"], swapped["draft"]
+        os.unlink(self.swap_file)
+        self.swap_file = None
+
+class SessionManager:
+    def __init__(self, args):
+        self.args = args
+        self.sessions: List[Session] = []
+        self.current: Optional[Session] = None
+        self._next_number = 1
+        self.router = SessionOutput(sys.stdout)
+
+        # Import (and load the tokenizer and model registry) once for every session.
+        import TermiChat as termi_chat_module
+        self.termi_chat = termi_chat_module
+
+    def open(self, filename: str, model: str) -> Optional[Session]:
+        name = os.path.splitext(os.path.basename(filename.rstrip("/")))[0]
+        assistant_name, _, user_name = (self.args.names or "Assistant,User").partition(",")
+        try:
+            instance = self.termi_chat.TermiChat(name, model, self.args.max, assistant_name, user_name or "User",
+                                                 filename, self.args.hedge, not self.args.no_stream)
+        except SystemExit:
+            # TermiChat exits on things like a missing file; that mustn't end the other sessions.
+            warn_message(f"Could not open {filename}.")
+            return None
+        session = Session(self._next_number, instance, self.router.stdout)
+        self._next_number += 1
+        self.sessions.append(session)
+        return session
+
+    def switch(self, session: Session) -> None:
+        if session is not self.current:
+            session.swap_in()
+            self.current = session
+            marker_message(f"Session {session.label()}")
+        session.last_used = time.time()
+        session.notified = True
+        session.watch()
+        session.unwatch()
+
+    def list_sessions(self) -> None:
+        for session in self.sessions:
+            marker = "*" if session is self.current else " "
+            instance = session.instance
+            spent = instance._get_spent(instance._total_cost)
+            print(f"{marker} {session.label():60} spent={spent}  {instance.filename}")
+
+    def swap_idle(self) -> None:
+        """Swap out sessions idle too long and the least recently used beyond --max-resident."""
+        candidates = [session for session in self.sessions
+                      if session is not self.current and not session.busy() and session.swap_file is None]
+        candidates.sort(key=lambda session: session.last_used)
+        resident = len([session for session in self.sessions if session.swap_file is None])
+        now = time.time()
+        for session in candidates:
+            if resident > self.args.max_resident or now - session.last_used > self.args.idle_minutes * 60:
+                session.swap_out()
+                resident -= 1
+
+    def notify(self) -> None:
+        """Say which background requests finished since the last prompt."""
+        for session in self.sessions:
+            if session is not self.current and not session.notified and not session.busy():
+                session.notified = True
+                info_message(f"Session {session.number} ({session.instance.name}) has a response; :{session.number} to see it.")
+
+    def _run_send(self, session: Session, text: str) -> None:
+        self.router.attach(session.write)
+        try:
+            session.instance.send(text)
+        finally:
+            self.router.detach()
+
+    def send(self, text: str) -> None:
+        session = self.current
+        instance = session.instance
+        if text == "" and len(instance.messages) < 2:
+            print("No conversation context to send to the assistant.")
+            return
+        api_messages = instance._prepare_messages_for_api()
+        if text:
+            api_messages.append({"role": "user", "content": text})
+        print(f"Estimated tokens to be sent: {instance.get_estimated_tokens(api_messages)}")
+        options = [f"Send to '{instance.model}' assistant", "Send in the background", "Cancel"]
+        selected_option = TerminalMenu(options).show()
+        if selected_option is None or options[selected_option] == "Cancel":
+            warn_message("Message canceled.")
+            return
+
+        session.notified = False
+        session.thread = threading.Thread(target=self._run_send, args=(session, text), daemon=True)
+        if options[selected_option] != "Send in the background":
+            session.watch()
+        session.thread.start()
+        if options[selected_option] == "Send in the background":
+            info_message("Sending in the background; switch to another session with :N or :ls to list them.")
+            return
+
+        cancelling = False
+        try:
+            while session.thread.is_alive():
+                try:
+                    session.thread.join(0.1)
+                    if cancelling and instance._last_spinner is not None:
+                        instance._last_spinner.cancel()
+                except KeyboardInterrupt:
+                    # The request runs in another thread so cancel it like the Spinner would.
+                    cancelling = True
+        finally:
+            session.unwatch()
+            session.notified = True
+
+    def _choose_session(self) -> Optional[Session]:
+        options = [session.label() for session in self.sessions]
+        selected_option = TerminalMenu(options).show()
+        return None if selected_option is None else self.sessions[selected_option]
+
+    def _new_session(self, words: List[str]) -> None:
+        if not words:
+            words = input("Enter the conversation file (and optionally a model): ").split()
+            if not words:
+                return
+        model = words[1] if len(words) > 1 else self.current.instance.model
+        session = self.open(words[0], model)
+        if session is not None:
+            self.switch(session)
+
+    def close_current(self) -> None:
+        session = self.current
+        self.sessions.remove(session)
+        info_message(f"Closed session {session.number} ({session.instance.name}).")
+        self.current = None
+        if self.sessions:
+            self.switch(self.sessions[0])
+
+    def handle(self, user_input: str) -> None:
+        """Session commands and sends here; everything else goes to the current TermiChat."""
+        session = self.current
+        command = user_input.strip()
+        if command.lower() in ('m', 'menu', ''):
+            menu_items = dict(SESSION_MENU_ITEMS)
+            menu_items.update(self.termi_chat.MENU_ITEMS)
+            options = list(menu_items.keys())
+            selected_option = TerminalMenu(options).show()
+            if selected_option is None:
+                return
+            command = user_input = menu_items[options[selected_option]]
+
+        words = command.split()
+        if command == ":ls":
+            self.list_sessions()
+        elif command == ":switch":
+            chosen = self._choose_session()
+            if chosen is not None:
+                self.switch(chosen)
+        elif command in (":n", ":p"):
+            step = 1 if command == ":n" else -1
+            self.switch(self.sessions[(self.sessions.index(session) + step) % len(self.sessions)])
+        elif len(words) == 1 and words[0][:1] == ":" and words[0][1:].isdigit():
+            chosen = [other for other in self.sessions if other.number == int(words[0][1:])]
+            if chosen:
+                self.switch(chosen[0])
+            else:
+                warn_message(f"No session {words[0][1:]}; :ls lists them.")
+        elif words and words[0] == ":new":
+            self._new_session(words[1:])
+        elif session.busy():
+            warn_message(f"Session {session.number} is waiting for a response; switch to another session or wait.")
+        elif command.lower() == 'resend':
+            self.send("")
+        elif command.lower() in self.termi_chat.MENU_ITEMS.values():
+            if not session.instance.handle_command(command.lower()):
+                self.close_current()
+        else:
+            self.send(user_input)
+
+    def run(self) -> None:
+        sys.stdout = self.router
+        try:
+            while self.sessions:
+                self.notify()
+                self.swap_idle()
+                instance = self.current.instance
+                others = "  ".join(session.label() for session in self.sessions if session is not self.current)
+                if others:
+                    print(f"{ANSI_BOLD}{ANSI_GREEN}Other sessions:{ANSI_RESET} {others}")
+                user_input = instance._get_multiline_input(f"\n{ANSI_YELLOW}[{self.current.number}] {instance.name}{ANSI_RESET}: "
+                                                           "enter your command (control-d for options, :ls for sessions), or your conversation text:")
+                self.current.last_used = time.time()
+                self.handle(user_input)
+        finally:
+            sys.stdout = self.router.stdout
+            for session in self.sessions:
+                if session.swap_file is not None and os.path.exists(session.swap_file):
+                    os.unlink(session.swap_file)
+
+def main():
+    parser = argparse.ArgumentParser(description="Several termi-chat conversations in one process")
+    parser.add_argument("files", nargs="+", help="conversation files (or directories to pick one from)")
+    parser.add_argument("--model", help="model short name for every session (default: the first in MODEL_INFO)")
+    parser.add_argument("--names", help="assistant and user names as name1,name2")
+    parser.add_argument("--max", type=int, default=100, help="max previous messages to use for context")
+    parser.add_argument("--hedge", help="fallback model for slow requests")
+    parser.add_argument("--no-stream", action="store_true")
+    parser.add_argument("--max-resident", type=int, default=4, help="sessions to keep in memory; others are swapped out")
+    parser.add_argument("--idle-minutes", type=float, default=30, help="swap out sessions idle this long")
+    args = parser.parse_args()
+
+    manager = SessionManager(args)
+    model = args.model or manager.termi_chat.DEFAULT_MODEL
+    for filename in args.files:
+        manager.open(filename, model)
+    if not manager.sessions:
+        sys.exit(1)
+    manager.switch(manager.sessions[0])
+    manager.run()
+
+if __name__ == "__main__":
+    main()
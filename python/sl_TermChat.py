@@ -1,27 +1,59 @@
 import os
 import json
 import sys
+import time
 from datetime import datetime
 import openai
 import streamlit as st
 from streamlit_chat import message
 from streamlit_shortcuts import add_keyboard_shortcuts
+import nettrace
+import cassette
+from metrics import METRICS, start_metrics_server
+from ledger import LEDGER
+from message_store import MessageStore
+from background_jobs import Job, new_pool
+from conversations import ConversationRegistry, valid_name
+from admission import ADMISSION
+from model_picker import MAX_RECENT
+from utils import percentile
+
+# Streamlit reruns this whole script on every interaction; we time each rerun
+# (see the sidebar) to make sure it stays fast as the conversation grows.
+rerun_started = time.perf_counter()
 
 # Sometimes we might want a UI.  Streamlit is pretty lightweight and easy to use
 # so we'll make one.
-# Run like this from the command line for 3 different conversations:
+# Run like this from the command line:
 # streamlit run --browser.gatherUsageStats false --server.port 8501 --theme.base dark python/sl_TermChat.py conversation1
-# streamlit run --browser.gatherUsageStats false --server.port 8502 --theme.base dark python/sl_TermChat.py conversation2
-# streamlit run --browser.gatherUsageStats false --server.port 8503 --theme.base dark python/sl_TermChat.py conversation3
-chat_title = "TermiChat"
-if len(sys.argv) > 1:
-    chat_title = sys.argv[1]
+# One server hosts any number of named conversations (pick or start one in the
+# sidebar); the argument is the one to show first.  The conversations are kept
+# on the server (see conversations.py) so a browser reload doesn't lose them and
+# the conversation's name is in the URL (?conversation=name) so a reload or a
+# bookmark opens the same one.
+default_conversation = "TermiChat"
+if len(sys.argv) > 1 and valid_name(sys.argv[1]):
+    default_conversation = sys.argv[1]
+if 'conversation' not in st.session_state:
+    requested = st.query_params.get("conversation", default_conversation)
+    st.session_state['conversation'] = requested if valid_name(requested) else default_conversation
+chat_title = st.session_state['conversation']
 
 # Setting page title and header and allow wide mode (so you can widen your browser
 # to see the chat history better).
 st.set_page_config(page_title=chat_title, layout="wide", page_icon=":robot_face:")
 st.header(f"Termi-chat 🔥: {chat_title}")
 
+# Set TERMI_CHAT_METRICS_PORT to expose per-model latency/throughput/cost at
+# http://127.0.0.1:<port>/metrics for Prometheus.  Streamlit reruns this script
+# on every interaction so we only start the server once per process.
+@st.cache_resource
+def metrics_server(port):
+    return start_metrics_server(METRICS, port)
+
+if os.environ.get("TERMI_CHAT_METRICS_PORT"):
+    metrics_server(int(os.environ["TERMI_CHAT_METRICS_PORT"]))
+
 # Get this from .streamlit/secrets.toml
 #   OPENAI_API_KEY = "..."
 openai.api_key = os.environ.get("OPENAI_API_KEY")
@@ -31,23 +63,25 @@ DEFAULT_SYSTEM_CONTEXT = "You are a helpful assistant."
 if 'output_mode' not in st.session_state:
     # Tracks the output mode (e.g., chat, code, etc.)
     st.session_state['output_mode'] = "old"
-if 'assistant' not in st.session_state:
-    # Tracks the bot responses
-    st.session_state['assistant'] = []
-if 'user' not in st.session_state:
-    # Tracks the user inputs
-    st.session_state['user'] = []
-if 'system_context' not in st.session_state:
-    # Tracks the system context
-    st.session_state['system_context'] = DEFAULT_SYSTEM_CONTEXT
-if 'messages' not in st.session_state:
-    # Tracks what we send to the model (including past messages and the current user input)
-    st.session_state['messages'] = [
-        {"role": "system", "content": st.session_state['system_context']}
-    ]
-if 'model_name' not in st.session_state:
-    # Keep model name equal to the actual model name for simplicity when adding a new one
-    st.session_state['model_name'] = []
+
+# Requests run on a worker pool shared by every session so a click while we wait
+# doesn't lose them; see background_jobs.py.
+@st.cache_resource
+def get_job_pool():
+    return new_pool()
+
+# Every conversation the server hosts, shared by all browser sessions.
+@st.cache_resource
+def get_conversations():
+    return ConversationRegistry(get_job_pool())
+
+conversations = get_conversations()
+conversation = conversations.get(chat_title, DEFAULT_SYSTEM_CONTEXT)
+
+# The conversation: every message (with its model, cost, etc.) and what we send
+# to the model (see message_store.py) and the queue for its requests.
+store = conversation.store
+jobs = conversation.jobs
 
 if 'uploaded_file' not in st.session_state:
     st.session_state['uploaded_file'] = None
@@ -60,16 +94,29 @@ if 'uploaded_file_key' not in st.session_state:
 if 'file_name' not in st.session_state:
     st.session_state['file_name'] = "termi-chat1.json"
 
-if 'timestmp' not in st.session_state:
-    st.session_state['timestamp'] = []
 
-# These 3 track cost for paid models to help the user now what they're spending
-if 'cost' not in st.session_state:
-    st.session_state['cost'] = []
-if 'total_tokens' not in st.session_state:
-    st.session_state['total_tokens'] = []
-if 'total_cost' not in st.session_state:
-    st.session_state['total_cost'] = 0.0
+# Only one page of the history is drawn so long conversations don't make every
+# click slow.  Page 0 is the newest turns.
+HISTORY_PAGE_SIZE = 20
+if 'history_page' not in st.session_state:
+    st.session_state['history_page'] = 0
+
+# Seconds taken by recent reruns (the most recent RERUN_SAMPLES).
+RERUN_SAMPLES = 50
+if 'rerun_seconds' not in st.session_state:
+    st.session_state['rerun_seconds'] = []
+
+# The last finished job this session has shown for each conversation (by name), so
+# every browser showing a conversation sees how its requests went.  A session
+# starts from whatever has already finished.
+if 'shown_jobs' not in st.session_state:
+    st.session_state['shown_jobs'] = {}
+if chat_title not in st.session_state['shown_jobs']:
+    st.session_state['shown_jobs'][chat_title] = max((job.id for job in jobs.finished_since(0)), default=0)
+
+# Models this session sent to, most recent first; they're at the top of the model list.
+if 'recent_models' not in st.session_state:
+    st.session_state['recent_models'] = []
 
 # Use a reasonable start value for max_tokens; the user can change it
 # using the slider.
@@ -87,29 +134,34 @@ max_tokens = 512
 # see https://openai.com/pricing#language-models
 # see https://openrouter.ai/models (cost is differet for each model)
 # for other models (like ollama based), we don't update cost.
-model_map = {
-    "llama3:8b": {"vendor": "ollama", "context_size": 4096, "input_token_cost": 0.1, "output_token_cost": 0.1},
-    "llama3.1:latest": {"vendor": "ollama", "context_size": 4096, "input_token_cost": 0.1, "output_token_cost": 0.1},
-    "mistral-small:22b-instruct-2409-q4_K_M": {"vendor": "ollama", "context_size": 4096, "input_token_cost": 0.1, "output_token_cost": 0.1},
-    "qwen2.5-coder:14b": {"vendor": "ollama", "context_size": 32768, "input_token_cost": 0.1, "output_token_cost": 0.1},
-    "qwen2.5-coder:32b": {"vendor": "ollama", "context_size": 4096, "input_token_cost": 0.1, "output_token_cost": 0.1},
-    "qwen2.5:32b": {"vendor": "ollama", "context_size": 128000, "input_token_cost": 0.1, "output_token_cost": 0.1},
-    "deepseek-coder:6.7b": {"vendor": "ollama", "context_size": 4096, "input_token_cost": 0, "output_token_cost": 0},
-    "llama2-uncensored:7b": {"vendor": "ollama", "context_size": 4096, "input_token_cost": 0, "output_token_cost": 0},
-    "wizard-vicuna-uncensored:13b": {"vendor": "ollama", "context_size": 4096, "input_token_cost": 0, "output_token_cost": 0},
-    "dolphin-mixtral:8x7b-v2.7-q4_K_M": {"vendor": "ollama", "context_size": 4096, "input_token_cost": 0, "output_token_cost": 0},
-    "codellama:13b-python-q4_K_M": {"vendor": "ollama", "context_size": 4096, "input_token_cost": 0, "output_token_cost": 0},
-    "llama3-gradient:8b": {"vendor": "ollama", "context_size": 4096, "input_token_cost": 0, "output_token_cost": 0},
-    "--- Below spends Money ---": "ollama",
-    "gpt-3.5-turbo-0125": {"vendor": "openai", "context_size": 16384, "input_token_cost": 0.50, "output_token_cost": 1.50},
-    "gpt-4o": {"vendor": "openai", "context_size": 128000, "input_token_cost": 5.00, "output_token_cost": 15.00},
-    "gpt-4-turbo-2024-04-09": {"vendor": "openai", "context_size": 128000, "input_token_cost": 10.00, "output_token_cost": 30.00},
-    "mistralai/mixtral-8x7b-instruct": {"vendor": "openrouter", "context_size": 32768, "input_token_cost": 0.24, "output_token_cost": 0.24},
-    "openai/gpt-3.5-turbo-0125": {"vendor": "openrouter", "context_size": 16384, "input_token_cost": 0.50, "output_token_cost": 1.50},
-    "anthropic/claude-3-haiku": {"vendor": "openrouter", "context_size": 200000, "input_token_cost": 0.25, "output_token_cost": 1.25},
-    "deepseek-chat": {"vendor": "deepseek", "context_size": 32768, "input_token_cost": 0.14, "output_token_cost": 0.28},
-    "deepseek-coder": {"vendor": "deepseek", "context_size": 16384, "input_token_cost": 0.14, "output_token_cost": 0.28},
-}
+# This is a cached resource so the reruns share one copy instead of building it every time.
+@st.cache_resource
+def get_model_map():
+    return {
+        "llama3:8b": {"vendor": "ollama", "context_size": 4096, "input_token_cost": 0.1, "output_token_cost": 0.1},
+        "llama3.1:latest": {"vendor": "ollama", "context_size": 4096, "input_token_cost": 0.1, "output_token_cost": 0.1},
+        "mistral-small:22b-instruct-2409-q4_K_M": {"vendor": "ollama", "context_size": 4096, "input_token_cost": 0.1, "output_token_cost": 0.1},
+        "qwen2.5-coder:14b": {"vendor": "ollama", "context_size": 32768, "input_token_cost": 0.1, "output_token_cost": 0.1},
+        "qwen2.5-coder:32b": {"vendor": "ollama", "context_size": 4096, "input_token_cost": 0.1, "output_token_cost": 0.1},
+        "qwen2.5:32b": {"vendor": "ollama", "context_size": 128000, "input_token_cost": 0.1, "output_token_cost": 0.1},
+        "deepseek-coder:6.7b": {"vendor": "ollama", "context_size": 4096, "input_token_cost": 0, "output_token_cost": 0},
+        "llama2-uncensored:7b": {"vendor": "ollama", "context_size": 4096, "input_token_cost": 0, "output_token_cost": 0},
+        "wizard-vicuna-uncensored:13b": {"vendor": "ollama", "context_size": 4096, "input_token_cost": 0, "output_token_cost": 0},
+        "dolphin-mixtral:8x7b-v2.7-q4_K_M": {"vendor": "ollama", "context_size": 4096, "input_token_cost": 0, "output_token_cost": 0},
+        "codellama:13b-python-q4_K_M": {"vendor": "ollama", "context_size": 4096, "input_token_cost": 0, "output_token_cost": 0},
+        "llama3-gradient:8b": {"vendor": "ollama", "context_size": 4096, "input_token_cost": 0, "output_token_cost": 0},
+        "--- Below spends Money ---": "ollama",
+        "gpt-3.5-turbo-0125": {"vendor": "openai", "context_size": 16384, "input_token_cost": 0.50, "output_token_cost": 1.50},
+        "gpt-4o": {"vendor": "openai", "context_size": 128000, "input_token_cost": 5.00, "output_token_cost": 15.00},
+        "gpt-4-turbo-2024-04-09": {"vendor": "openai", "context_size": 128000, "input_token_cost": 10.00, "output_token_cost": 30.00},
+        "mistralai/mixtral-8x7b-instruct": {"vendor": "openrouter", "context_size": 32768, "input_token_cost": 0.24, "output_token_cost": 0.24},
+        "openai/gpt-3.5-turbo-0125": {"vendor": "openrouter", "context_size": 16384, "input_token_cost": 0.50, "output_token_cost": 1.50},
+        "anthropic/claude-3-haiku": {"vendor": "openrouter", "context_size": 200000, "input_token_cost": 0.25, "output_token_cost": 1.25},
+        "deepseek-chat": {"vendor": "deepseek", "context_size": 32768, "input_token_cost": 0.14, "output_token_cost": 0.28},
+        "deepseek-coder": {"vendor": "deepseek", "context_size": 16384, "input_token_cost": 0.14, "output_token_cost": 0.28},
+    }
+
+model_map = get_model_map()
 
 def calculate_cost(prompt_tokens, completion_tokens, model_name):
     cost = 0.0
@@ -122,14 +174,49 @@ def calculate_cost(prompt_tokens, completion_tokens, model_name):
         return f"cost is invalid for this model: {model_name}"
     return cost
 
+def model_label(name):
+    info = model_map[name]
+    if info['input_token_cost'] == 0 and info['output_token_cost'] == 0:
+        price = "free"
+    else:
+        price = f"${info['input_token_cost']:.2f}/${info['output_token_cost']:.2f}"
+    return f"{name} ({info['vendor']}, {price}, {info['context_size'] // 1000}K)"
+
+def switch_conversation(name):
+    st.session_state['conversation'] = name
+    st.query_params["conversation"] = name
+    st.session_state['history_page'] = 0
+
+def choose_conversation():
+    switch_conversation(st.session_state['conversation_choice'])
+
+def start_conversation():
+    name = st.session_state['new_conversation'].strip()
+    st.session_state['new_conversation'] = ""
+    if not valid_name(name):
+        st.session_state['conversation_error'] = f"'{name}' can't be a conversation name; use letters, digits, space, '.', '_' and '-'."
+        return
+    switch_conversation(name)
+
 # Sidebar - used to show the conversation title and model selection
 with st.sidebar:
     st.title(chat_title)
-    st.form(key='conversation_form', )
-
-    # Create the model selector based on the keys of models_map.
-    model_menu_items = list(model_map.keys())
-    selected_model_name = st.radio("Choose a model:", model_menu_items)
+    conversation_names = conversations.names()
+    st.session_state['conversation_choice'] = chat_title
+    st.selectbox("Conversation:", conversation_names, key='conversation_choice', on_change=choose_conversation)
+    st.text_input("New conversation:", key='new_conversation', on_change=start_conversation,
+                  help="Type a name and press Enter to start a conversation")
+    if 'conversation_error' in st.session_state:
+        st.error(st.session_state.pop('conversation_error'))
+
+    # Create the model selector based on the keys of models_map; type in it to narrow the list.
+    # The models used recently in this session come first.
+    model_menu_items = st.session_state['recent_models'] + [model for model, info in model_map.items()
+                                                            if isinstance(info, dict) and model not in st.session_state['recent_models']]
+    # Setting the choice ourselves keeps it when the order (and so the widget) changes.
+    st.session_state['model_choice'] = st.session_state.get('model_choice', model_menu_items[0])
+    selected_model_name = st.selectbox("Choose a model:", model_menu_items, format_func=model_label, key='model_choice',
+                                       help="Type part of a model's name to find it")
     if model_map[selected_model_name]['input_token_cost'] > 0 or model_map[selected_model_name]['output_token_cost'] > 0:
         max_tokens = st.slider("Max tokens", min_value=20,
                                              max_value=model_map[selected_model_name]['context_size'],
@@ -138,12 +225,17 @@ with st.sidebar:
     counter_placeholder = st.empty()
     tmp_input_cost = model_map[selected_model_name].get("input_token_cost", 0)
     tmp_output_cost = model_map[selected_model_name].get("output_token_cost", 0)
-    counter_placeholder.write(f"Total cost (model: \${tmp_input_cost:.2f}, \${tmp_output_cost:.2f}): ${st.session_state['total_cost']:.2f}")
+    counter_placeholder.write(f"Total cost (model: \${tmp_input_cost:.2f}, \${tmp_output_cost:.2f}): ${store.total_cost:.2f}")
+
+    # The ledger keeps what we spent across Clear, restarts and other termi-chat instances.
+    spent_today, spent_month = LEDGER.spent_today_and_month()
+    st.write(f"Spent today: ${spent_today:.2f}; this month: ${spent_month:.2f}")
+    rerun_placeholder = st.empty()
     uploaded_file = st.file_uploader("Load Conversation", type="json", key=f"load{st.session_state['uploaded_file_key']}", help="Load a conversation from a JSON file")
 
-    file_name = st.text_input('File to export to:', 'termi-chat1.json')
+    file_name = st.text_input('File to export to:', f"{chat_title}.json")
     users_name= st.text_input('User name:', 'Dennis')
-    system_context = st.text_area('System context:', st.session_state['system_context'], height=100)
+    system_context = st.text_area('System context:', store.system_context, height=100)
 
     # Create columns for buttons; this gets then side by side
     col1, col2 = st.columns(2, gap='small')
@@ -153,14 +245,10 @@ with st.sidebar:
     refresh_button = col2.button("Update", key="refresh", help="Refresh the page")
     switch_mode = col2.button("Style", key="switch", help="Switch conversation output style")
 
-if system_context != st.session_state['system_context']:
+if system_context != store.system_context:
     # The system prompt has changed, so apply it to our saved messages.
-    st.session_state['system_context'] = system_context
-    new_messages = st.session_state['messages'][1:]
-    st.session_state['messages'] = []
-    st.session_state['messages'].append({"role": "system", "content": st.session_state['system_context']})
-    for msg in new_messages:
-        st.session_state['messages'].append(msg)
+    store.set_system_context(system_context)
+    conversation.save()
 
 if switch_mode:
     if st.session_state['output_mode'] == "old":
@@ -170,7 +258,7 @@ if switch_mode:
 
 if save_button:
     # Serialize and save the conversation to a JSON string
-    conversation_json = json.dumps(st.session_state['messages'], indent=4)
+    conversation_json = store.to_json()
 
     # Create a download button for the JSON string
     st.sidebar.download_button(label="Download Conversation",
@@ -181,41 +269,10 @@ if save_button:
 #print(f"\nUploaded file: {uploaded_file}")
 #print(f"\nSession file: {st.session_state['uploaded_file']}")
 if uploaded_file != None and uploaded_file != st.session_state['uploaded_file']:
-    string_data = uploaded_file.getvalue().decode("utf-8")
-    data = json.loads(string_data)
     # Update the session state with the loaded conversation
-    if len(data) > 0 and data[0]['role'] == "system":
-        system_context = data[0]['content']
-        new_messages = data[1:]
-    else:
-        system_context = DEFAULT_SYSTEM_CONTEXT
-        new_messages = data
-    st.session_state['system_context'] = system_context
-    st.session_state['messages'] = []
-    st.session_state['messages'].append({"role": "system", "content": system_context})
-    for msg in new_messages:
-        st.session_state['messages'].append(msg)
-        if msg['role'] == "assistant":
-            # Protect against missing fields in the JSON file
-            st.session_state['model_name'].append(msg.get('model', "None"))
-            st.session_state['total_tokens'].append(msg.get('total_tokens', 0.0))
-            st.session_state['cost'].append(msg.get('cost', 0.0))
-            st.session_state['timestamp'].append(msg.get('timestamp', "2024-09-09-09:09"))
-
-    st.session_state['system_context'] = system_context
+    conversation.replace(MessageStore.load(uploaded_file.getvalue().decode("utf-8"), DEFAULT_SYSTEM_CONTEXT))
+    store = conversation.store
     print(f"Loaded conversation: {uploaded_file}")
-
-    # Fill in the user and assistant lists
-    st.session_state['user'] = []
-    st.session_state['assistant'] = []
-    for msg in new_messages:
-        if msg['role'] == "user":
-            st.session_state['user'].append(msg['content'])
-        elif msg['role'] == "assistant":
-            st.session_state['assistant'].append(msg['content'])
-
-    if len(st.session_state['assistant']) != len(st.session_state['user']):
-        print("Error loading: assistant and user lists are not the same length")
     st.session_state['uploaded_file'] = uploaded_file
 
     # Increment the key and refresh so the file uploader will clear
@@ -226,98 +283,179 @@ if uploaded_file != None and uploaded_file != st.session_state['uploaded_file']:
 if refresh_button:
     print("")
 if dump_button:
-    json.dump(st.session_state['messages'], sys.stdout, indent=4)
+    json.dump(store.messages, sys.stdout, indent=4)
     print("")
     # flush the output buffer
     sys.stdout.flush()
 
 # Reset all variables including conversation history
 if clear_button:
-    st.session_state['assistant'] = []
-    st.session_state['user'] = []
-    st.session_state['messages'] = [
-        {"role": "system", "content": system_context}
-    ]
-    st.session_state['number_tokens'] = []
-    st.session_state['model_name'] = []
-    st.session_state['cost'] = []
-    st.session_state['total_cost'] = 0.0
-    st.session_state['total_tokens'] = []
-    #counter_placeholder.write(f"Total cost of this conversation: ${st.session_state['total_cost']:.5f}")
-
-# Take a list of messages and strip anything but role and content
-# because the api calls only want role and content.
-def extract_role_and_content(input_messages):
-    messages = []
-    for msg in input_messages:
-        messages.append({"role": msg["role"], "content": msg["content"]})
-    return messages
+    conversation.replace(MessageStore(system_context))
+    store = conversation.store
+    st.session_state['history_page'] = 0
 
 # Get responses from ollama models.  Cost = $0
 # Sadly, ollma api doesn't support max_tokens so we can't use it.
 # https://github.com/ollama/ollama/blob/4ec7445a6f678b6efc773bb9fa886d7c9b075577/docs/modelfile.md#valid-parameters-and-values
 # default temperature = 0.8
-def ollama_generate_response(model, max_tokens, messages, temperature):
-
+@st.cache_resource
+def get_ollama_client():
     from ollama import Client
-    client = Client(host='http://localhost:11434')
-
+    client_kwargs = {}
+    transport = cassette.provider_httpx_transport()
+    if transport is not None:
+        client_kwargs["transport"] = transport
+    return Client(host='http://localhost:11434', **client_kwargs)
+
+# ollama unloads a model OLLAMA_KEEP_ALIVE seconds after its last request and the
+# next request waits for it to load again, so we keep models loaded longer than
+# ollama's default (5 minutes) and load the selected model as soon as it's picked.
+# -1 keeps models loaded until ollama is restarted.
+OLLAMA_KEEP_ALIVE = int(os.environ.get("TERMI_CHAT_OLLAMA_KEEP_ALIVE", "1800"))
+
+# We ask for a context window (num_ctx) big enough for the prompt plus max_tokens,
+# rounded up to a power of two from OLLAMA_MIN_CONTEXT, and at most the model's
+# context_size.  ollama reloads the model when num_ctx changes so it only grows.
+OLLAMA_MIN_CONTEXT = 2048
+
+# num_ctx and when it was last used (by a request or a warm-up) for each ollama
+# model; shared by every session since they share the ollama server.
+@st.cache_resource
+def get_ollama_models():
+    return {}
+
+def ollama_model_state(model):
+    return get_ollama_models().setdefault(model, {"num_ctx": min(OLLAMA_MIN_CONTEXT, model_map[model]['context_size']),
+                                                  "last_used": 0.0})
+
+def ollama_num_ctx(model, messages, max_tokens):
+    state = ollama_model_state(model)
+
+    # We don't have a tokenizer here so estimate 4 characters per token.
+    needed = sum(len(msg['content']) for msg in messages) // 4 + max_tokens
+    num_ctx = state["num_ctx"]
+    while num_ctx < needed and num_ctx < model_map[model]['context_size']:
+        num_ctx *= 2
+    state["num_ctx"] = min(num_ctx, model_map[model]['context_size'])
+    return state["num_ctx"]
+
+def warm_up_ollama_model(model):
+    """Have ollama load model (in the background) unless it should still be loaded."""
+    state = ollama_model_state(model)
+    if state["last_used"] and (OLLAMA_KEEP_ALIVE < 0 or time.time() - state["last_used"] < OLLAMA_KEEP_ALIVE):
+        return
+
+    # Don't make ollama swap out the model someone else is using (see admission.py).
+    if not ADMISSION["ollama"].idle():
+        return
+    state["last_used"] = time.time()
+
+    def load():
+        try:
+            # An empty prompt just loads the model.
+            get_ollama_client().generate(model=model, prompt="", keep_alive=OLLAMA_KEEP_ALIVE,
+                                         options={"num_ctx": state["num_ctx"]})
+        except Exception as e:
+            state["last_used"] = 0.0
+            print(f"Unable to load {model} in ollama: {e}")
+    get_job_pool().submit(load)
+
+def ollama_generate_response(model, max_tokens, messages, temperature, on_wait=None):
+    """Returns the response, total, prompt and completion tokens like generate_response
+       plus the seconds ollama spent loading the model, reading the prompt and
+       generating the response, and the time.time() the request was let through (None if
+       it never was).  The request waits its turn with the other termi-chat processes
+       using ollama (see admission.py); on_wait(place) is called while it waits."""
+
+    client = get_ollama_client()
+    num_ctx = ollama_num_ctx(model, messages, max_tokens)
+
+    admitted_at = None
     try:
-        completion = client.chat(
-            model=model,
-            messages=messages,
-            options = {
-                "temperature": temperature
-            }
-        )
+        with ADMISSION["ollama"].slot(model, on_wait=on_wait), nettrace.trace_request(model):
+            admitted_at = time.time()
+            completion = client.chat(
+                model=model,
+                messages=messages,
+                options = {
+                    "temperature": temperature,
+                    "num_ctx": num_ctx
+                },
+                keep_alive=OLLAMA_KEEP_ALIVE
+            )
         response = completion['message']['content'].strip()
     except Exception as e:
         error_text = f"Error in ollama server: Error: {str(e)}"
         response = error_text
-        return response, 0, 0, 0
+        return response, 0, 0, 0, {}, admitted_at
+    ollama_model_state(model)["last_used"] = time.time()
 
-    prompt_tokens = completion['eval_count']
-    completion_tokens = completion['prompt_eval_count']
+    # prompt_eval_count is left out when ollama had the whole prompt cached.
+    prompt_tokens = completion.get('prompt_eval_count', 0)
+    completion_tokens = completion.get('eval_count', 0)
     total_tokens = prompt_tokens + completion_tokens
 
-    return response, total_tokens, prompt_tokens, completion_tokens
+    # The durations are in nanoseconds.
+    timings = {
+        "num_ctx": num_ctx,
+        "load_seconds": completion.get('load_duration', 0) / 1e9,
+        "prompt_eval_seconds": completion.get('prompt_eval_duration', 0) / 1e9,
+        "eval_seconds": completion.get('eval_duration', 0) / 1e9,
+    }
+    return response, total_tokens, prompt_tokens, completion_tokens, timings, admitted_at
+
+# The selected ollama model is loaded while the user types.
+if model_map[selected_model_name]['vendor'] == "ollama":
+    warm_up_ollama_model(selected_model_name)
 
 # Get responses from chatgpt; cost is based on tokens and model type
 # See ./.streamlist/secrets.toml for environment variants visible to
 # streamlit.
-def generate_response(model, max_tokens, messages, temperature):
+# One client (and connection pool) per vendor shared by every rerun and session.
+@st.cache_resource
+def get_openai_client(vendor):
 
     from openai import OpenAI
-    from os import getenv
 
-    if model_map[model]['vendor'] == "openrouter":
+    # With TERMI_CHAT_TRACE set, record where the time goes on the network and
+    # with TERMI_CHAT_CASSETTE set, record or replay the provider traffic.
+    client_kwargs = {}
+    http_client = cassette.provider_httpx_client()
+    if http_client is not None:
+        client_kwargs["http_client"] = http_client
+
+    if vendor == "openrouter":
 
         # Openrouter can use the OpenAI API but we need their base URL and API key
         base_url = "https://openrouter.ai/api/v1"
-        api_key=getenv("OPENROUTER_API_KEY")
-        client = OpenAI(base_url=base_url, api_key=api_key)
+        api_key=cassette.api_key("OPENROUTER_API_KEY")
+        return OpenAI(base_url=base_url, api_key=api_key, **client_kwargs)
 
-    elif model_map[model]['vendor'] == "deepseek":
+    elif vendor == "deepseek":
 
         # Deepseek models can use the OpenAI API but we need their base URL and API key
         base_url = "https://api.deepseek.com/"
-        api_key=getenv("DEEPSEEK_API_KEY")
-        client = OpenAI(base_url=base_url, api_key=api_key)
+        api_key=cassette.api_key("DEEPSEEK_API_KEY")
+        return OpenAI(base_url=base_url, api_key=api_key, **client_kwargs)
 
-    elif model_map[model]['vendor'] == "openai":
-        api_key = getenv("OPENAI_API_KEY")
-        client = OpenAI(api_key=api_key)
-    else:
+    api_key = cassette.api_key("OPENAI_API_KEY")
+    return OpenAI(api_key=api_key, **client_kwargs)
+
+def generate_response(model, max_tokens, messages, temperature):
+
+    if model_map[model]['vendor'] not in ("openai", "openrouter", "deepseek"):
         response = f"Error: model {model} not found in our model_map list"
         return response, 0, 0, 0
+    client = get_openai_client(model_map[model]['vendor'])
 
     try:
-        completion = client.chat.completions.create(
-            model=model,
-            messages=messages,
-            max_tokens=max_tokens,
-            temperature=temperature
-        )
+        with nettrace.trace_request(model):
+            completion = client.chat.completions.create(
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature
+            )
         response = completion.choices[0].message.content.strip('\n')
     except Exception as e:
         error_text = f"Error in {model_map[model]['vendor']} server: Error: {str(e)}"
@@ -330,6 +468,86 @@ def generate_response(model, max_tokens, messages, temperature):
     return response, total_tokens, prompt_tokens, completion_tokens
 
 
+# Return a function that sends a job's prompt to model and adds the user message and
+# response to the conversation (and saves it).  It runs on the job pool (no st.* calls
+# there); the settings are the ones in effect when the user clicked Send.
+def make_request(conversation, model, max_tokens, temperature, file_name):
+    def run(job):
+        # Whatever the conversation holds now (it may have been cleared or loaded
+        # since the job was sent).
+        store = conversation.store
+
+        # Check the daily/monthly budgets (see ledger.py) before spending anything; we
+        # don't have a tokenizer here so estimate 4 characters per token and a full
+        # max_tokens response.
+        reservation = over_budget = None
+        estimated_cost = calculate_cost((sum(len(msg['content']) for msg in store.api_messages) + len(job.prompt)) // 4,
+                                        max_tokens, model)
+        if isinstance(estimated_cost, float) and estimated_cost > 0.0:
+            reservation, over_budget = LEDGER.reserve(estimated_cost)
+        if over_budget is not None:
+            job.error = over_budget
+            return
+
+        # The store keeps a role-and-content copy of the messages for the API (api_messages)
+        # so we add the user message and send that as is.
+        store.append({"role": "user", "content": job.prompt})
+        start_time = time.time()
+        timings = {}
+        admitted_at = None
+        try:
+            if model_map[model]['vendor'] == "openai" or \
+                model_map[model]['vendor'] == "openrouter" or \
+                model_map[model]['vendor'] == "deepseek":
+                output, total_tokens, prompt_tokens, completion_tokens = generate_response(model, max_tokens, store.api_messages, temperature)
+            elif model_map[model]['vendor'] == "ollama":
+                output, total_tokens, prompt_tokens, completion_tokens, timings, admitted_at = ollama_generate_response(model, max_tokens, store.api_messages, temperature, on_wait=job.wait_in_line)
+            else:
+                output = f"Error: model {model} not found in our list"
+                total_tokens = prompt_tokens = completion_tokens = 0
+        except BaseException:
+            # Don't keep a user message with no answer.
+            store.pop()
+            LEDGER.release(reservation)
+            raise
+        # Time in line for the local server isn't the model's response time.
+        queue = admitted_at - start_time if admitted_at is not None else 0.0
+        response_time = time.time() - (admitted_at or start_time)
+
+        cost = calculate_cost(prompt_tokens, completion_tokens, model)
+        if output.startswith("Error"):
+            LEDGER.release(reservation)
+        else:
+            LEDGER.record(model, model_map[model]['vendor'], prompt_tokens, completion_tokens,
+                          cost if isinstance(cost, float) else 0.0, file_name, source="streamlit", reservation=reservation)
+        # ollama tells us how long generating took so we know when the first token came.
+        ttft = response_time - timings["eval_seconds"] if timings else None
+        METRICS.record(model, model_map[model]['vendor'], response_time, queue=queue, ttft=ttft,
+                       prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                       cost=cost if isinstance(cost, float) else 0.0, error=output.startswith("Error"))
+
+        store.append({"role": "assistant", "content": output,
+                      "timestamp": datetime.now().strftime("%Y-%m-%d-%H:%M"),
+                      "model": model,
+                      "total_tokens": total_tokens,
+                      "cost": cost,
+                      **timings })
+        conversation.save()
+
+    return run
+
+# While requests are waiting, show them and check every second; when one finishes
+# (here or in another browser showing this conversation), rerun the page so the new
+# turn is drawn.
+@st.experimental_fragment(run_every=1)
+def show_pending_jobs(drawn_turns):
+    if jobs.finished_since(st.session_state['shown_jobs'][chat_title]) or store.turn_count() != drawn_turns:
+        st.rerun()
+    for job in jobs.pending():
+        prompt = job.prompt if len(job.prompt) <= 60 else job.prompt[:57] + "..."
+        status = job.status if job.place is None else f"#{job.place} in line for the local server"
+        st.info(f"{job.model} ({status}, {job.elapsed():.0f}s): {prompt}")
+
 # container for chat history
 response_container = st.container()
 # container for text box
@@ -342,57 +560,64 @@ with prompt_container:
         add_keyboard_shortcuts({'Shift+Enter': submit_button})
 
     if submit_button and user_input:
+        st.session_state['recent_models'] = ([selected_model_name] + [model for model in st.session_state['recent_models']
+                                                                      if model != selected_model_name])[:MAX_RECENT]
+        jobs.submit(Job(user_input, selected_model_name),
+                    make_request(conversation, selected_model_name, max_tokens, temperature, file_name))
 
-        # Pass in a copy of the messages in case something goes wrong.  This protects
-        # against having a user message without a matching assistant message. We also
-        # need a version of the messages list with just role and content for the API.
-        tmp_messages = extract_role_and_content(st.session_state['messages'])
-        tmp_messages.append({"role": "user", "content": user_input})
-
-        # During inference, the user can click buttons which will abort the inference.
-        with st.spinner("Thinking..."):
-            if model_map[selected_model_name]['vendor'] == "openai" or \
-                model_map[selected_model_name]['vendor'] == "openrouter" or \
-                model_map[selected_model_name]['vendor'] == "deepseek":
-                output, total_tokens, prompt_tokens, completion_tokens = generate_response(selected_model_name, max_tokens, tmp_messages, temperature)
-            elif model_map[selected_model_name]['vendor'] == "ollama":
-                output, total_tokens, prompt_tokens, completion_tokens = ollama_generate_response(selected_model_name, max_tokens, tmp_messages, temperature)
-            else:
-                output = f"Error: model {selected_model_name} not found in our list"
-                total_tokens = prompt_tokens = completion_tokens = 0
-
-        st.session_state['user'].append(user_input)
-        st.session_state['assistant'].append(output)
-        st.session_state['model_name'].append(selected_model_name)
-        st.session_state['total_tokens'].append(total_tokens)
-
-        cost = calculate_cost(prompt_tokens, completion_tokens, selected_model_name)
-
-        # Only after we successfully get a response do we update the messages with
-        # both user and assistant messages.
-        st.session_state['messages'].append({"role": "user", "content": user_input})
-        st.session_state['messages'].append({"role": "assistant", "content": output,
-                                             "timestamp": datetime.now().strftime("%Y-%m-%d-%H:%M"),
-                                             "model": selected_model_name,
-                                             "cost": cost })
+# Requests that finished since this session last looked: go to the page with their turns.
+finished = jobs.finished_since(st.session_state['shown_jobs'][chat_title])
+if finished:
+    st.session_state['history_page'] = 0
+    st.session_state['shown_jobs'][chat_title] = finished[-1].id
 
-        st.session_state['cost'].append(cost)
-        st.session_state['total_cost'] += cost
+def change_history_page(step):
+    st.session_state['history_page'] = max(0, st.session_state['history_page'] + step)
 
-if st.session_state['assistant']:
+if store.turn_count() > 0:
     with response_container:
 
-        # Draw the interleaved conversation.
-        for i in range(len(st.session_state['assistant'])):
+        # Draw one page of the interleaved conversation (newest page by default).
+        turns = store.turn_count()
+        pages = (turns + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE
+        page = st.session_state['history_page'] = min(st.session_state['history_page'], pages - 1)
+        last = turns - page * HISTORY_PAGE_SIZE
+        first = max(0, last - HISTORY_PAGE_SIZE)
+        if pages > 1:
+            older_col, newer_col, page_col = st.columns([1, 1, 6])
+            older_col.button("Older", key="older", disabled=page == pages - 1, on_click=change_history_page, args=(1,))
+            newer_col.button("Newer", key="newer", disabled=page == 0, on_click=change_history_page, args=(-1,))
+            page_col.write(f"Turns {first + 1}-{last} of {turns}")
+
+        for i, (user_msg, assistant_msg) in enumerate(store.turns(first, last), first):
             #with st.chat_message('user', avatar='🧑‍💻'):
             # with st.chat_message('user'):
-            #     st.write(st.session_state['user'][i])
-            message(st.session_state['user'][i], is_user=True, key=str(i) + '_user')
+            #     st.write(user_msg['content'])
+            if user_msg is not None:
+                message(user_msg['content'], is_user=True, key=str(i) + '_user')
             if st.session_state['output_mode'] == "old":
-                message(st.session_state['assistant'][i].replace('\t', '    '), key=str(i), avatar_style='adventurer')
+                message(assistant_msg['content'].replace('\t', '    '), key=str(i), avatar_style='adventurer')
             else:
                 # 👱‍♀️ , 👱‍♀️, 🧑🏻‍🦰
                 with st.chat_message('assistant', avatar='https://raw.githubusercontent.com/dataprofessor/streamlit-chat-avatar/master/bot-icon.png'):
-                     st.write(st.session_state['assistant'][i].replace('\t', '    '))
-            st.write(f"Model: {st.session_state['model_name'][i]}; Tokens: {st.session_state['total_tokens'][i]}; Cost: ${st.session_state['cost'][i]:.5f}")
-            counter_placeholder.write(f"Total cost of conversation: ${st.session_state['total_cost']:.5f}")
+                     st.write(assistant_msg['content'].replace('\t', '    '))
+            # Protect against missing fields in loaded files.
+            cost = assistant_msg.get('cost', 0.0)
+            cost = f"${cost:.5f}" if isinstance(cost, (int, float)) else cost
+            st.write(f"Model: {assistant_msg.get('model', 'None')}; Tokens: {assistant_msg.get('total_tokens', 0)}; Cost: {cost}")
+            if 'load_seconds' in assistant_msg:
+                st.caption(f"Load: {assistant_msg['load_seconds']:.2f}s; prompt: {assistant_msg['prompt_eval_seconds']:.2f}s; "
+                           f"response: {assistant_msg['eval_seconds']:.2f}s; context: {assistant_msg['num_ctx']}")
+        counter_placeholder.write(f"Total cost of conversation: ${store.total_cost:.5f}")
+
+with response_container:
+    for job in finished:
+        if job.error:
+            st.error(f"{job.model}: {job.error}")
+    if jobs.pending():
+        show_pending_jobs(store.turn_count())
+
+rerun_seconds = time.perf_counter() - rerun_started
+st.session_state['rerun_seconds'] = (st.session_state['rerun_seconds'] + [rerun_seconds])[-RERUN_SAMPLES:]
+rerun_placeholder.caption(f"Page drawn in {rerun_seconds * 1000:.0f} ms "
+                          f"(p95 {percentile(st.session_state['rerun_seconds'], 95) * 1000:.0f} ms)")
@@ -4,40 +4,258 @@ spinner while waiting for the function to complete.  It doesn't spin, but,
 rather, it shows lines across the screen to denote seconds passed.  This
 allows the user to visually see how long something took relative to other
 things on the screen.
+
+The Spinner can also hedge: if the primary request hasn't answered after
+hedge_after seconds, a second (hedge) request is started and whichever answers
+first wins.  The other request is cancelled via the hooks it registered on its
+Attempt so its connection doesn't linger.
+
+Ctrl-C while waiting (or cancel() from another thread) cancels every attempt
+and returns right away; streamed text that already arrived is available from
+partial_text().
+
+start_all() runs several requests at once and waits for all of them instead
+(e.g., to get several candidate answers); their responses are in responses.
+
+A request waiting in line for a local model server (see admission.py) marks
+its attempt queued; the timeout and the hedge delay only count the time
+since it was sent.
+
+start() is launch() followed by wait(); calling them separately lets a
+request run in the background (e.g., while the user decides whether to send
+it) before we show its progress.
 """
 
 import sys
 import time
 import threading
 
+class Attempt:
+    """One in-flight request started by the Spinner.  Request functions register
+       cancel hooks (e.g., closing their HTTP client) so the Spinner can abort them."""
+    def __init__(self, label: str):
+        self.label = label
+        self.cancelled = threading.Event()
+        self.thread = None
+
+        # Text received so far for streamed requests.
+        self.partial = []
+
+        # True while waiting in line for a local model server; started_at is reset when
+        # the request is actually sent.
+        self.queued = False
+
+        # time.time() when the request started, when the first text arrived and when it finished.
+        self.started_at = None
+        self.first_token_at = None
+        self.finished_at = None
+        self._hooks = []
+        self._lock = threading.Lock()
+
+    def add_text(self, text: str) -> None:
+        """Add a piece of streamed text."""
+        if self.first_token_at is None:
+            self.first_token_at = time.time()
+        self.partial.append(text)
+
+    def on_cancel(self, hook) -> None:
+        """Register hook to be called if this attempt is cancelled.  If we're already
+           cancelled, call it right away."""
+        with self._lock:
+            if not self.cancelled.is_set():
+                self._hooks.append(hook)
+                return
+        self._call_hook(hook)
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self.cancelled.is_set():
+                return
+            self.cancelled.set()
+            hooks, self._hooks = self._hooks, []
+        for hook in hooks:
+            self._call_hook(hook)
+
+    def _call_hook(self, hook) -> None:
+        try:
+            hook()
+        except Exception:
+            # We're tearing the request down; errors here don't matter.
+            pass
+
 class Spinner:
-    def __init__(self, timeout=60):
+    def __init__(self, timeout=60, hedge_after=None):
         self.timeout = timeout
+        self.hedge_after = hedge_after
         self.spinner_thread = None
         self.response = None
 
-    def _spinning_cursor(self) -> str:
-        while self.spinner_thread.is_alive():
-            for i in range(9):
-                yield "≈"
-                time.sleep(0.1)
-            yield "•"
-
-    def start(self, target_function, *args, **kwargs):
-        self.spinner_thread = threading.Thread(target=target_function, args=args, kwargs=kwargs)
-        self.spinner_thread.start()
-        spinner = self._spinning_cursor()
+        # The label of the attempt that produced the response ("primary" or "hedge").
+        self.source = None
+        self.timed_out = False
+        self.cancelled = False
+        self.started_at = None
+        self.attempts = {}
+
+        # Responses by attempt label when waiting for every attempt (see start_all).
+        self.responses = {}
+        self._gather = False
+        self._unfinished = 0
+        self._hedge_function = None
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    def _run(self, attempt: Attempt, target_function, *args, **kwargs) -> None:
+        """Thread body: run target_function and report its response unless we were
+           cancelled in the meantime."""
+        attempt.started_at = time.time()
+        try:
+            response = target_function(attempt, *args, **kwargs)
+            if response is not None and not attempt.cancelled.is_set():
+                if self._gather:
+                    with self._lock:
+                        self.responses[attempt.label] = response
+                else:
+                    self.set_response(response, attempt.label)
+        except Exception as e:
+            if not attempt.cancelled.is_set():
+                print(f"Error: {e}")
+        finally:
+            attempt.finished_at = time.time()
+
+            # If every attempt has finished (without a response unless gathering), stop waiting.
+            with self._lock:
+                self._unfinished -= 1
+                if self._unfinished == 0:
+                    self._done.set()
+
+    def _launch(self, label: str, target_function, *args, **kwargs) -> Attempt:
+        attempt = Attempt(label)
+
+        # Daemon threads so a request we've given up on can't keep the program alive.
+        attempt.thread = threading.Thread(target=self._run, args=(attempt, target_function) + args,
+                                          kwargs=kwargs, daemon=True)
+        self.attempts[label] = attempt
+        with self._lock:
+            self._unfinished += 1
+        attempt.thread.start()
+        return attempt
+
+    def start(self, target_function, *args, hedge_function=None, **kwargs):
+        """Run target_function(attempt, *args, **kwargs) in a thread and wait for it to
+           return a response.  If hedge_function is given and hedge_after seconds pass
+           with no response, hedge_function(attempt) is started as well."""
+        self.launch(target_function, *args, hedge_function=hedge_function, **kwargs)
+        self.wait()
+
+    def launch(self, target_function, *args, hedge_function=None, **kwargs) -> None:
+        """Start target_function(attempt, *args, **kwargs) in a thread and return right away;
+           wait() waits for the response (and starts hedge_function if it's slow)."""
+        self.started_at = time.time()
+        self._hedge_function = hedge_function
+        primary = self._launch("primary", target_function, *args, **kwargs)
+        self.spinner_thread = primary.thread
+
+    def wait(self) -> None:
+        """Wait for the response of what launch() started.  The timeout counts from
+           when we start waiting."""
         sys.stdout.write("Waiting for response ")
+        self._wait(self._hedge_function, time.time())
+
+        # Cancel everything that didn't produce the response (on timeout, that's all of them).
+        for label, attempt in self.attempts.items():
+            if label != self.source:
+                attempt.cancel()
+
+    def done(self) -> bool:
+        """Return True if what launch() started has finished."""
+        return self._done.is_set()
+
+    def start_all(self, target_functions) -> None:
+        """Run each of target_functions (called with its attempt) in its own thread and
+           wait until all of them have finished.  The responses are in self.responses by
+           attempt label ("1", "2", ...).  On timeout, the unfinished ones are cancelled
+           and the responses we have are kept; Ctrl-C cancels them all."""
+        self.started_at = time.time()
+        self._gather = True
+
+        # Count ourselves as unfinished until they're all launched so an early finisher
+        # doesn't end the wait.
+        with self._lock:
+            self._unfinished += 1
+        for number, target_function in enumerate(target_functions, 1):
+            self._launch(str(number), target_function)
+        with self._lock:
+            self._unfinished -= 1
+            if self._unfinished == 0:
+                self._done.set()
+        sys.stdout.write(f"Waiting for {len(target_functions)} responses " if len(target_functions) > 1 else "Waiting for response ")
+        self._wait(None, self.started_at)
+        for label, attempt in self.attempts.items():
+            if label not in self.responses:
+                attempt.cancel()
+
+    def _running_for(self, attempt: Attempt, since: float) -> float:
+        """Return how long attempt has been sent (not just waiting in line), counting
+           from since at the earliest; 0 if it isn't running."""
+        if attempt.queued or attempt.started_at is None or attempt.finished_at is not None:
+            return 0.0
+        return time.time() - max(attempt.started_at, since)
+
+    def _wait(self, hedge_function, waiting_since: float) -> None:
+        """Show the progress until the attempts are done, the timeout passes for one of
+           them (counting from waiting_since at the earliest) or Ctrl-C."""
+        ticks = 0
+        try:
+            while not self._done.wait(0.1):
+                ticks += 1
+                sys.stdout.write("•" if ticks % 10 == 0 else "≈")
+                sys.stdout.flush()
+
+                # Hedge a slow start only; once the primary is answering we let it finish.
+                primary = self.attempts["primary"]
+                if hedge_function is not None and "hedge" not in self.attempts and self.hedge_after is not None and \
+                   primary.first_token_at is None and self._running_for(primary, self.started_at) >= self.hedge_after:
+                    sys.stdout.write("↯")
+                    self._launch("hedge", hedge_function)
+                if any(self._running_for(attempt, waiting_since) >= self.timeout for attempt in list(self.attempts.values())):
+                    self.timed_out = True
+                    break
+        except KeyboardInterrupt:
+            # Ctrl-C: give up on everything, including a response that raced in.
+            self.cancel()
+        if self.cancelled:
+            sys.stdout.write(" ^C")
+        sys.stdout.flush()
+
+    def cancel(self) -> None:
+        """Give up on the request (like Ctrl-C); this can be called from another thread."""
+        with self._lock:
+            self.cancelled = True
+            self.response = None
+            self.source = None
+            self.responses = {}
+        self._done.set()
+
+    def abort(self) -> None:
+        """Cancel a request nobody is waiting for (see launch) and close its connections."""
+        self.cancel()
+        for attempt in list(self.attempts.values()):
+            attempt.cancel()
 
-        for _ in range(self.timeout * 10):
-            try:
-                sys.stdout.write(next(spinner))
-            except StopIteration:
-                sys.stdout.write("!")
-            sys.stdout.flush()
+    def winner(self) -> Attempt:
+        """Return the attempt that produced the response (None if there's no response)."""
+        return self.attempts.get(self.source)
 
-            if self.response is not None:
-                break
+    def partial_text(self) -> str:
+        """Return the longest partial streamed text from any attempt."""
+        return max(("".join(attempt.partial) for attempt in self.attempts.values()), key=len, default="")
 
-    def set_response(self, response):
-        self.response = response
+    def set_response(self, response, source="primary"):
+        with self._lock:
+            # First one wins.
+            if self.response is not None or self.cancelled:
+                return
+            self.response = response
+            self.source = source
+        self._done.set()
@@ -0,0 +1,106 @@
+"""
+Helpers for reading streamed chat completions.  Streaming lets us stop a
+request part way through (e.g., on Ctrl-C) and keep whatever text already
+arrived.  We still show the answer only when it's complete.
+
+The readers add each piece of text to the attempt as it arrives and
+stop as soon as the attempt is cancelled.
+"""
+
+import json
+from typing import Optional
+
+def abort_on_cancel(session, attempt) -> None:
+    """Make cancelling attempt abort the requests made with session (a requests.Session
+       only this attempt uses) even while they wait for the server.  Closing the session
+       only drops idle connections, so we shut down the sockets it opens instead; the
+       blocked read then fails and the request's thread ends.  The adapters' own pool
+       classes (e.g., nettrace's traced ones) are subclassed, not replaced."""
+    import socket
+
+    def shut_down(sock) -> None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def pool_class(base):
+        class AbortableConnection(base.ConnectionCls):
+            def connect(self):
+                super().connect()
+                attempt.on_cancel(lambda sock=self.sock: shut_down(sock))
+
+        class AbortablePool(base):
+            ConnectionCls = AbortableConnection
+        return AbortablePool
+
+    attempt.on_cancel(session.close)
+    for adapter in session.adapters.values():
+        # A recording cassette wraps the real adapter; replaying has no connections to abort.
+        adapter = getattr(adapter, "_inner", adapter)
+        poolmanager = getattr(adapter, "poolmanager", None)
+        if poolmanager is not None:
+            poolmanager.pool_classes_by_scheme = {scheme: pool_class(base)
+                                                  for scheme, base in poolmanager.pool_classes_by_scheme.items()}
+
+class StreamedResponse:
+    """A completed streamed response reduced to what termi-chat uses."""
+    def __init__(self, text: str, model: str, prompt_tokens: Optional[int] = None,
+                 completion_tokens: Optional[int] = None):
+        self.text = text
+        self.model = model
+        # These are None when the server didn't report usage.
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+def read_openai_stream(stream, attempt, model: str) -> Optional[StreamedResponse]:
+    """Read an OpenAI SDK stream (client.chat.completions.create(..., stream=True)).
+       Returns None if the attempt was cancelled."""
+    attempt.on_cancel(stream.response.close)
+    prompt_tokens = completion_tokens = None
+    for chunk in stream:
+        if attempt.cancelled.is_set():
+            return None
+        if chunk.choices and chunk.choices[0].delta.content:
+            attempt.add_text(chunk.choices[0].delta.content)
+        usage = getattr(chunk, "usage", None)
+        if usage:
+            # Older SDKs don't know about usage on chunks and leave it as a dict.
+            if isinstance(usage, dict):
+                prompt_tokens = usage.get("prompt_tokens")
+                completion_tokens = usage.get("completion_tokens")
+            else:
+                prompt_tokens = usage.prompt_tokens
+                completion_tokens = usage.completion_tokens
+        if chunk.model:
+            model = chunk.model
+    if attempt.cancelled.is_set():
+        return None
+    return StreamedResponse("".join(attempt.partial), model, prompt_tokens, completion_tokens)
+
+def read_sse_stream(response, attempt, model: str) -> Optional[StreamedResponse]:
+    """Read an OpenAI compatible server-sent-events stream from a requests response
+       made with stream=True (e.g., text-generation-webui).  Returns None if the attempt
+       was cancelled; raises if the server returned an error."""
+    attempt.on_cancel(response.close)
+    response.raise_for_status()
+    prompt_tokens = completion_tokens = None
+    for line in response.iter_lines():
+        if attempt.cancelled.is_set():
+            return None
+        if not line or not line.startswith(b"data:"):
+            continue
+        payload = line[len(b"data:"):].strip()
+        if payload == b"[DONE]":
+            break
+        chunk = json.loads(payload)
+        choices = chunk.get("choices") or []
+        if choices and choices[0].get("delta", {}).get("content"):
+            attempt.add_text(choices[0]["delta"]["content"])
+        if chunk.get("usage"):
+            prompt_tokens = chunk["usage"].get("prompt_tokens")
+            completion_tokens = chunk["usage"].get("completion_tokens")
+        model = chunk.get("model", model)
+    if attempt.cancelled.is_set():
+        return None
+    return StreamedResponse("".join(attempt.partial), model, prompt_tokens, completion_tokens)
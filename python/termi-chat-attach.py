@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+"""
+Thin client for the termi-chat daemon (see chat_daemon.py).  It starts the
+daemon if it isn't running and attaches to a session; the conversation lives
+in the daemon so you can detach (quit) and re-attach later, from this or any
+other terminal, with --session.
+
+  ./termi-chat-attach.py --load conversation.json --model Assistant
+  ./termi-chat-attach.py --session conversation       # re-attach
+  ./termi-chat-attach.py --list
+  ./termi-chat-attach.py --shutdown
+
+This only imports what it needs to talk to the daemon so it starts fast.
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import socket
+import argparse
+import subprocess
+from simple_term_menu import TerminalMenu
+from utils import DAEMON_SOCKET, TERMI_CHAT_HOME, marker_message, warn_message, info_message, ANSI_BOLD, ANSI_GREEN, ANSI_YELLOW, ANSI_LIGHTBLUE, ANSI_RESET
+
+DAEMON_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chat_daemon.py")
+DAEMON_LOG = os.path.join(TERMI_CHAT_HOME, "daemon.log")
+
+# Seconds to wait for a daemon we started to come up (it loads the tokenizer etc.).
+DAEMON_START_TIMEOUT = 30
+
+class DaemonConnection:
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self.sock = socket.socket(socket.AF_UNIX)
+        self.sock.connect(socket_path)
+        self.file = self.sock.makefile("rwb")
+        self.session = None
+
+    def request(self, op: str, **fields) -> dict:
+        """Send op to the daemon, show what it prints, and return its final reply.
+           Ctrl-C while waiting asks the daemon to cancel the request."""
+        fields["op"] = op
+        if self.session is not None:
+            fields.setdefault("session", self.session)
+        self.file.write((json.dumps(fields) + "\n").encode("utf-8"))
+        self.file.flush()
+        while True:
+            try:
+                line = self.file.readline()
+            except KeyboardInterrupt:
+                self._cancel()
+                continue
+            if not line:
+                raise ConnectionError("The termi-chat daemon went away")
+            reply = json.loads(line)
+            if "out" in reply:
+                sys.stdout.write(reply["out"])
+                sys.stdout.flush()
+                continue
+            if reply.get("error"):
+                warn_message(reply["error"])
+            return reply
+
+    def close(self) -> None:
+        self.file.close()
+        self.sock.close()
+
+    def _cancel(self) -> None:
+        # The request connection is busy so use a new one.
+        try:
+            connection = DaemonConnection(self.socket_path)
+            try:
+                connection.request("cancel", session=self.session)
+            finally:
+                connection.close()
+        except OSError:
+            pass
+
+def connect(socket_path: str) -> DaemonConnection:
+    """Connect to the daemon, starting it in the background if it isn't running."""
+    try:
+        return DaemonConnection(socket_path)
+    except OSError:
+        pass
+    marker_message("Starting the termi-chat daemon ...")
+    os.makedirs(TERMI_CHAT_HOME, exist_ok=True)
+    with open(DAEMON_LOG, 'a') as log:
+        subprocess.Popen([sys.executable, DAEMON_SCRIPT, "--socket", socket_path], stdin=subprocess.DEVNULL,
+                         stdout=log, stderr=log, start_new_session=True)
+    deadline = time.time() + DAEMON_START_TIMEOUT
+    while time.time() < deadline:
+        time.sleep(0.1)
+        try:
+            return DaemonConnection(socket_path)
+        except OSError:
+            pass
+    warn_message(f"The termi-chat daemon didn't start; see {DAEMON_LOG}")
+    sys.exit(1)
+
+def choose_file(filename_or_dir: str) -> str:
+    """Like TermiChat.check_load_file: if given a directory, pick a json file from a menu."""
+    if not os.path.isdir(filename_or_dir):
+        return os.path.abspath(filename_or_dir)
+    files = sorted([os.path.basename(file) for file in glob.glob(os.path.join(filename_or_dir, "*.json"))], key=str.lower)
+    if len(files) == 0:
+        print(f"No JSON files found in {filename_or_dir}; use --load <aDir> or --load <aJsonFile> to specify a file or directory.")
+        sys.exit(1)
+    selected_option = TerminalMenu(files).show()
+    if selected_option is None:
+        print("No file selected. Exiting.")
+        sys.exit(0)
+    return os.path.abspath(os.path.join(filename_or_dir, files[selected_option]))
+
+def get_multiline_input(state: dict, prompt: str) -> str:
+    """Same input style as TermiChat: multiple lines, finish with Ctrl-D on a blank line."""
+    print(f"{ANSI_YELLOW}{prompt}{ANSI_RESET}")
+    print(f"{ANSI_BOLD}{ANSI_GREEN}{state['user_name']}->{state['model']}(ctx={state['max_context']},spent={ANSI_RESET}{state['spent']}{ANSI_BOLD}{ANSI_GREEN}){ANSI_RESET}, enter some (multi-line) text, finish with Ctrl-D on a blank line (Ctrl-D for menu)\n")
+    lines = []
+    while True:
+        try:
+            line = input()
+            if line == "\x04":
+                break
+            lines.append(line)
+        except EOFError:
+            break
+    marker_message("Processing ...")
+    return '\n'.join(lines)
+
+def confirm_send(daemon: DaemonConnection, state: dict, text: str) -> bool:
+    reply = daemon.request("estimate", text=text)
+    print(f"Estimated tokens to be sent: {reply.get('tokens')}")
+    options = [f"Send to '{state['model']}' assistant", "Cancel"]
+    selected_option = TerminalMenu(options).show()
+    if selected_option is None or options[selected_option] == "Cancel":
+        warn_message("Message canceled.")
+        return False
+    return True
+
+def run_conversation(daemon: DaemonConnection, state: dict, menus: dict) -> None:
+    menu_items = dict(menus["menu_items"])
+    menu_items["[z] close   - Close the session in the daemon"] = "close"
+    while True:
+        user_input = get_multiline_input(state, "\nEnter your command (type control-d for options), or your conversation text:")
+        command = user_input.lower()
+
+        if command in ('m', 'menu', ''):
+            options = list(menu_items.keys())
+            selected_option = TerminalMenu(options).show()
+            if selected_option is None:
+                continue
+            command = user_input = menu_items[options[selected_option]]
+
+        reply = None
+        if command == 'model':
+            options = list(menus["model_menu_items"].keys())
+            selected_option = TerminalMenu(options).show()
+            if selected_option is None:
+                print("Model not changed.")
+                continue
+            reply = daemon.request("model", model=options[selected_option])
+        elif command in ('info', 'view', 'stats', 'clear'):
+            reply = daemon.request(command)
+        elif command == 'names':
+            assistant_name = input(f"Enter the assistant name (blank = no change, current = {state['assistant_name']}): ")
+            user_name = input(f"Enter the user name (blank = no change, current = {state['user_name']}): ")
+            reply = daemon.request("names", assistant_name=assistant_name, user_name=user_name)
+        elif command == 'max':
+            value = input(f"Enter the max context to use (blank = no change, max = {state['messages'] - 1}): ")
+            reply = daemon.request("max", value=value)
+        elif command == 'draft':
+            reply = daemon.request("show_draft")
+            if reply.get("state", {}).get("has_draft"):
+                selected_option = TerminalMenu(menus["draft_choices"]).show()
+                if selected_option is not None:
+                    reply = daemon.request("draft", choice=menus["draft_choices"][selected_option])
+        elif command == 'save':
+            filename = input("Enter filename to save the context (enter means current one): ")
+            reply = daemon.request("save", filename=os.path.abspath(filename) if filename else "")
+        elif command == 'load':
+            if state["unsaved"]:
+                warn_message("You have unsaved changes; load anyway?")
+                options = ["Yes", "No"]
+                selected_option = TerminalMenu(options).show()
+                if selected_option is None or options[selected_option] == "No":
+                    continue
+            reply = daemon.request("load", filename=choose_file(os.path.dirname(state["filename"]) or "."))
+        elif command in ('quit', 'exit', 'detach'):
+            info_message(f"Detached from session {state['session']}; re-attach with --session {state['session']}.\n")
+            break
+        elif command == 'close':
+            options = ["Yes", "No"]
+            if state["unsaved"]:
+                warn_message("You have unsaved changes. Close the session anyway?")
+                selected_option = TerminalMenu(options).show()
+                if selected_option is None or options[selected_option] == "No":
+                    continue
+            reply = daemon.request("close", force=True)
+            if not reply.get("error"):
+                break
+        elif command == 'resend':
+            if state["messages"] < 2:
+                print("No conversation context to send to the assistant.")
+                continue
+            if confirm_send(daemon, state, ""):
+                print(f"Sending {ANSI_LIGHTBLUE}unchanged{ANSI_RESET} conversation context to {state['model']} assistant...")
+                reply = daemon.request("send", text="")
+        else:
+            if confirm_send(daemon, state, user_input):
+                print(f"Sending conversation context to {state['model']} assistant...")
+                reply = daemon.request("send", text=user_input)
+
+        if reply is not None and "state" in reply:
+            state = reply["state"]
+
+def main():
+    parser = argparse.ArgumentParser(description="Attach to a conversation in the termi-chat daemon")
+    parser.add_argument("--load", help="conversation file or directory (for a new session)")
+    parser.add_argument("--model", help="model short name (for a new session)")
+    parser.add_argument("--names", help="assistant and user names as name1,name2")
+    parser.add_argument("--max", type=int, default=100, help="max previous messages to use for context")
+    parser.add_argument("--hedge", help="fallback model for slow requests")
+    parser.add_argument("--no-stream", action="store_true")
+    parser.add_argument("--session", help="session name (default: the conversation file name)")
+    parser.add_argument("--list", action="store_true", help="list the daemon's sessions")
+    parser.add_argument("--shutdown", action="store_true", help="stop the daemon")
+    parser.add_argument("--socket", default=DAEMON_SOCKET)
+    args = parser.parse_args()
+
+    daemon = connect(args.socket)
+    if args.shutdown:
+        daemon.request("shutdown")
+        return
+    if args.list:
+        sessions = daemon.request("list")["sessions"]
+        if not sessions:
+            print("No sessions.")
+        for session in sessions:
+            unsaved = " (unsaved)" if session["unsaved"] else ""
+            print(f"{session['session']:24} {session['model']:30} {session['messages']:5} messages  {session['filename']}{unsaved}")
+        return
+
+    sessions = {session["session"]: session for session in daemon.request("list")["sessions"]}
+    if args.session in sessions:
+        reply = daemon.request("open", session=args.session)
+    else:
+        if args.load is None:
+            parser.error("give --load to start a session (or --session to attach to one; see --list)")
+        filename = choose_file(args.load)
+        name = args.session or os.path.splitext(os.path.basename(filename))[0]
+        if name in sessions:
+            warn_message(f"Session {name} is already open; attaching to it.")
+        assistant_name, _, user_name = (args.names or "Assistant,User").partition(",")
+        fields = {"filename": filename, "max_context": args.max, "hedge_model": args.hedge,
+                  "stream": not args.no_stream, "assistant_name": assistant_name, "user_name": user_name or "User"}
+        if args.model:
+            fields["model"] = args.model
+        else:
+            fields["model"] = list(daemon.request("menus")["model_menu_items"].keys())[0]
+        reply = daemon.request("open", session=name, **fields)
+    if "state" not in reply:
+        sys.exit(1)
+    daemon.session = reply["state"]["session"]
+    run_conversation(daemon, reply["state"], daemon.request("menus"))
+
+if __name__ == "__main__":
+    main()
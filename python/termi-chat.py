@@ -2,7 +2,7 @@
 
 import os
 import sys
-from TermiChat import TermiChat, get_file_or_dir_from_cli, get_model_from_cli, get_names_from_cli, get_max_context_from_cli, help_message
+from TermiChat import TermiChat, get_file_or_dir_from_cli, get_model_from_cli, get_names_from_cli, get_max_context_from_cli, get_hedge_model_from_cli, get_stream_from_cli, get_speculate_from_cli, get_profile_from_cli, help_message
 
 # If user did --load filename, we'll load the file. Otherwise, we'll ask them to choose a system prompt.
 file_or_dir_from_cli = get_file_or_dir_from_cli()
@@ -16,9 +16,25 @@ assistant_name, user_name = get_names_from_cli(model)
 # if user did --max, we'll use that max context. Otherwise, we'll use the default max context.
 max_context = get_max_context_from_cli()
 
+# if user did --hedge modelname, slow requests are also sent to that model.
+hedge_model = get_hedge_model_from_cli()
+
+# if user did --no-stream, we wait for whole responses.
+stream = get_stream_from_cli()
+
+# if user did --speculate (or --speculate-paid), requests start while the send menu is showing.
+speculate, speculate_paid = get_speculate_from_cli()
+
 if "--help" in sys.argv or "-h" in sys.argv:
     help_message()
     exit(0)
 
-instance = TermiChat("Conversation1", model, max_context, assistant_name, user_name, file_or_dir_from_cli)
+# if user did --profile, we profile the session and write a report when we exit.
+if get_profile_from_cli():
+    import TermiChat as termi_chat_module
+    from profiling import enable_profiling
+    enable_profiling(TermiChat, termi_chat_module)
+
+instance = TermiChat("Conversation1", model, max_context, assistant_name, user_name, file_or_dir_from_cli, hedge_model, stream,
+                     speculate, speculate_paid)
 instance.run_conversation()
\ No newline at end of file
@@ -1,3 +1,5 @@
+import os
+import math
 import textwrap
 
 # Constants for ANSI color codes
@@ -8,6 +10,13 @@ ANSI_YELLOW = "\033[93m"
 ANSI_BOLD = "\033[1m"
 ANSI_RESET = "\033[0m"
 
+# Where termi-chat keeps its own state (latency history, etc.); this is separate
+# from the conversation files which the user manages.
+TERMI_CHAT_HOME = os.environ.get("TERMI_CHAT_HOME", os.path.join(os.path.expanduser("~"), ".termi-chat"))
+
+# The Unix socket the termi-chat daemon listens on (see chat_daemon.py).
+DAEMON_SOCKET = os.environ.get("TERMI_CHAT_SOCKET", os.path.join(TERMI_CHAT_HOME, "termi-chat.sock"))
+
 _cached_model_info = None
 
 def warn_message(message_str: str) -> None:
@@ -40,6 +49,19 @@ def wrap_text(text: str, width: int = 80) -> str:
             wrapped_text += textwrap.fill(line, width=width) + '\n'
     return wrapped_text
 
+def percentile(values: list, pct: float) -> float:
+    """Return the pct (0-100) percentile of values using linear interpolation
+       between the closest ranks.  Returns 0.0 for an empty list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    lower = math.floor(rank)
+    upper = math.ceil(rank)
+    if lower == upper:
+        return ordered[int(rank)]
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
 def get_model_info(model_api_name: str) -> str:
     """ Call openrouter.ai to get model information as a json and then return it for this model_api_name.
         Cache the result since it's not super quick"""
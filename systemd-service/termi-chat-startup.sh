@@ -1,5 +1,7 @@
 #!/bin/bash
 source /home/some-user/anaconda3/etc/profile.d/conda.sh
 conda activate llama3-fine-tune
+# Optional: expose Prometheus metrics at http://127.0.0.1:9501/metrics
+export TERMI_CHAT_METRICS_PORT=9501
 streamlit run --browser.gatherUsageStats false --server.port 8501 --theme.base dark /some-path/termi-chat/python/sl_TermChat.py conversation1
 
@@ -0,0 +1,78 @@
+"""
+Tests for streaming.abort_on_cancel against the mock server (benchmarks/mock_server.py).
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, "python"))
+sys.path.insert(0, os.path.join(REPO_DIR, "benchmarks"))
+
+import pytest
+import nettrace
+from spinner import Attempt
+from streaming import abort_on_cancel
+from mock_server import MockConfig, start_mock_server
+
+@pytest.fixture
+def trace_file(tmp_path, monkeypatch):
+    filename = str(tmp_path / "trace.jsonl")
+    monkeypatch.setattr(nettrace, "TRACE_FILE", filename)
+    return filename
+
+def _url(server) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}/v1/chat/completions"
+
+def _body() -> dict:
+    return {"messages": [{"role": "user", "content": "hello"}], "mode": "chat", "character": "Assistant"}
+
+def test_traced_request_keeps_its_phases(trace_file):
+    server = start_mock_server(MockConfig(latency=0.05))
+    try:
+        session = nettrace.traced_session()
+        abort_on_cancel(session, Attempt("primary"))
+        with nettrace.trace_request("Assistant"):
+            response = session.post(_url(server), json=_body())
+        assert response.status_code == 200
+    finally:
+        server.shutdown()
+
+    with open(trace_file) as file:
+        record = json.loads(file.readline())
+    host, port = server.server_address[:2]
+    assert record["endpoint"] == f"{host}:{port}"
+    assert record["reused"] is False
+    assert record["wait"] >= 0.04
+    assert record["send"] > 0.0
+
+def test_cancel_aborts_a_waiting_traced_request(trace_file):
+    server = start_mock_server(MockConfig(latency=5.0))
+    attempt = Attempt("primary")
+    errors = []
+
+    def post():
+        session = nettrace.traced_session()
+        abort_on_cancel(session, attempt)
+        try:
+            with nettrace.trace_request("Assistant"):
+                session.post(_url(server), json=_body())
+        except Exception as e:
+            errors.append(e)
+
+    try:
+        thread = threading.Thread(target=post, daemon=True)
+        started = time.time()
+        thread.start()
+        time.sleep(0.3)
+        attempt.cancel()
+        thread.join(2.0)
+        assert not thread.is_alive()
+        assert time.time() - started < 2.0
+        assert errors
+    finally:
+        server.shutdown()
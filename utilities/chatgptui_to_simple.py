@@ -1,53 +1,227 @@
 #!/usr/bin/env python3
-import json
+import os
+import re
 import sys
+import json
+import argparse
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
 
-# This converts from chatgpt webui conversation to a simple json format
+# This converts from chatgpt webui conversations to a simple json format
 # suitable for ingestion by termi-chat.
+#
+# The input is either one conversation (from chatgpt-exporter) or a full
+# ChatGPT export's conversations.json (an array of every conversation, which
+# can be hundreds of MB).  The array is parsed one conversation at a time so
+# we never hold the whole export in memory, and the conversations are
+# converted and written by a pool of processes.
+#
+# A ChatGPT conversation is a tree (each edit or regenerate starts a new
+# branch) so we follow the branch that was showing in the UI: from the
+# current_node up through the parents to the root.
+#
+# Converting is incremental: the output directory has a manifest
+# (.chatgpt_imported.json) of the conversations already written, by id, and
+# a conversation is only converted again if it was updated since.  Use
+# --force to convert everything again.
+
+MANIFEST_FILE = ".chatgpt_imported.json"
 
-if len(sys.argv) != 2:
-    print("Usage: python chatgptui_to_simple.py <chatgptui_output_file>")
-    sys.exit(1)
+# Read the export this much at a time.
+CHUNK_SIZE = 1024 * 1024
 
-input_file = sys.argv[1]
+# Conversations handed to the pool at once (per worker) so memory stays bounded.
+BATCH_PER_WORKER = 8
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
 
 def format_timestamp(timestamp):
-    if timestamp != "Time_not_available":
+    if timestamp:
         return datetime.utcfromtimestamp(timestamp).strftime('%Y-%m-%d-%H:%M')
     return "Time_not_available"
 
-try:
-    with open(input_file, 'r', encoding='utf-8') as file:
-        data = json.load(file)
-
-        output_data = []
-        for entry_id, entry in data['mapping'].items():
-            message = entry.get('message')
-            if message:
-                role = message['author']['role'] if message.get('author') else "unknown"
-                content_parts = message['content']['parts'] if message.get('content') and 'parts' in message['content'] else []
-
-                # Ensure content_parts are strings
-                content_parts = [str(part) for part in content_parts]
-
-                content = ' '.join(content_parts)
-                timestamp = format_timestamp(message['create_time']) if message.get('create_time') else "Time_not_available"
-                output_data.append({
-                    'role': role,
-                    'content': content,
-                    'timestamp': timestamp
-                })
-
-        output_filename = data['title'].replace(" ", "_").replace(":", "_") + ".json"
-        with open(output_filename, 'w', encoding='utf-8') as output_file:
-            json.dump(output_data, output_file, ensure_ascii=False, indent=2)
-
-        print(f"Conversion complete. Output saved to {output_filename}")
-
-except FileNotFoundError:
-    print(f"File not found: {input_file}")
-    sys.exit(1)
-except json.JSONDecodeError:
-    print(f"Invalid JSON format in file: {input_file}")
-    sys.exit(1)
\ No newline at end of file
+def iter_conversations(file):
+    """Yield the conversations in file (a json array, or one conversation) one at a time."""
+    buffer = file.read(CHUNK_SIZE)
+    index = len(buffer) - len(buffer.lstrip(_WHITESPACE))
+    if buffer[index:index + 1] == "{":
+        # A single conversation (chatgpt-exporter); it's small.
+        yield json.loads(buffer + file.read())
+        return
+    if buffer[index:index + 1] != "[":
+        raise ValueError("Expected a conversation or an array of conversations")
+    index += 1
+    eof = False
+    while True:
+        while index < len(buffer) and buffer[index] in _WHITESPACE + ",":
+            index += 1
+        if index < len(buffer) and buffer[index] == "]":
+            return
+        try:
+            if index >= len(buffer):
+                raise json.JSONDecodeError("Need more data", buffer, index)
+            conversation, index = _DECODER.raw_decode(buffer, index)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+
+            # The conversation continues past what we've read: drop what we've used and
+            # read at least as much again (so a huge conversation isn't decoded over and over).
+            buffer = buffer[index:]
+            index = 0
+            more = file.read(max(CHUNK_SIZE, len(buffer)))
+            eof = not more
+            buffer += more
+            continue
+        yield conversation
+
+def message_text(message):
+    content = message.get('content') or {}
+    if 'parts' in content:
+        # Parts are strings except for attachments (images, etc.) which we skip.
+        parts = [part if isinstance(part, str) else part.get('text', '') for part in content['parts']
+                 if isinstance(part, str) or isinstance(part, dict)]
+        return ' '.join(part for part in parts if part)
+    return content.get('text') or ''
+
+def active_branch(conversation):
+    """Return the messages on the branch that was showing in the UI, oldest first."""
+    mapping = conversation.get('mapping') or {}
+    node_id = conversation.get('current_node')
+    if node_id not in mapping:
+        # No current_node (older exports): start at the root and take the latest reply each time.
+        roots = [node for node in mapping.values() if not node.get('parent')]
+        if not roots:
+            return []
+        node = roots[0]
+        while node.get('children'):
+            node = mapping[node['children'][-1]]
+        node_id = node['id']
+    branch = []
+    seen = set()
+    while node_id in mapping and node_id not in seen:
+        seen.add(node_id)
+        node = mapping[node_id]
+        if node.get('message'):
+            branch.append(node['message'])
+        node_id = node.get('parent')
+    branch.reverse()
+    return branch
+
+def convert(conversation):
+    """Return the conversation in termi-chat's format."""
+    output_data = []
+    for message in active_branch(conversation):
+        role = message['author']['role'] if message.get('author') else "unknown"
+
+        # Tool output (browsing, code) isn't something termi-chat can send back to a model.
+        if role not in ('system', 'user', 'assistant'):
+            continue
+        if (message.get('metadata') or {}).get('is_visually_hidden_from_conversation'):
+            continue
+        content = message_text(message)
+        if not content:
+            continue
+        output_data.append({
+            'role': role,
+            'content': content,
+            'timestamp': format_timestamp(message.get('create_time'))
+        })
+    return output_data
+
+def convert_and_write(conversation, output_filename):
+    """Pool worker: convert one conversation and write it; returns the number of messages."""
+    output_data = convert(conversation)
+    tmp_filename = f"{output_filename}.{os.getpid()}.tmp"
+    with open(tmp_filename, 'w', encoding='utf-8') as output_file:
+        json.dump(output_data, output_file, ensure_ascii=False, indent=2)
+    os.replace(tmp_filename, output_filename)
+    return len(output_data)
+
+def conversation_id(conversation):
+    return conversation.get('conversation_id') or conversation.get('id') or conversation.get('title') or ""
+
+def base_filename(conversation):
+    title = conversation.get('title') or "untitled"
+    return re.sub(r'[ :/\\]', '_', title) + ".json"
+
+def load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILE), 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(output_dir, manifest):
+    filename = os.path.join(output_dir, MANIFEST_FILE)
+    with open(filename + ".tmp", 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=1)
+    os.replace(filename + ".tmp", filename)
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert ChatGPT UI conversations to termi-chat json files")
+    parser.add_argument("input_file", help="a chatgpt-exporter json file or a ChatGPT export's conversations.json")
+    parser.add_argument("--output-dir", default=".", help="where to write the conversations (default: here)")
+    parser.add_argument("--workers", type=int, help="processes for converting (default: one per CPU)")
+    parser.add_argument("--force", action="store_true", help="convert conversations already imported too")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    manifest = {} if args.force else load_manifest(args.output_dir)
+    used_filenames = {entry['file'] for entry in manifest.values()}
+    pending = []
+    converted = skipped = 0
+
+    def finish_oldest():
+        nonlocal converted
+        future, conversation_key, entry = pending.pop(0)
+        messages = future.result()
+        manifest[conversation_key] = entry
+        converted += 1
+        print(f"{entry['file']}: {messages} messages")
+        if converted % 1000 == 0:
+            save_manifest(args.output_dir, manifest)
+
+    try:
+        with open(args.input_file, 'r', encoding='utf-8') as file, \
+             ProcessPoolExecutor(max_workers=args.workers) as pool:
+            batch_size = (args.workers or os.cpu_count() or 1) * BATCH_PER_WORKER
+            for conversation in iter_conversations(file):
+                conversation_key = conversation_id(conversation)
+                update_time = conversation.get('update_time')
+                entry = manifest.get(conversation_key)
+                if entry is not None and entry.get('update_time') == update_time:
+                    skipped += 1
+                    continue
+
+                # Keep the file name it had; otherwise use the title and add the id if
+                # another conversation has the same title.
+                if entry is not None:
+                    output_filename = entry['file']
+                else:
+                    output_filename = base_filename(conversation)
+                    if output_filename in used_filenames:
+                        output_filename = output_filename[:-len(".json")] + f"_{conversation_key[:8]}.json"
+                    used_filenames.add(output_filename)
+                entry = {'file': output_filename, 'update_time': update_time}
+                future = pool.submit(convert_and_write, conversation, os.path.join(args.output_dir, output_filename))
+                pending.append((future, conversation_key, entry))
+                if len(pending) >= batch_size:
+                    finish_oldest()
+            while pending:
+                finish_oldest()
+    except FileNotFoundError:
+        print(f"File not found: {args.input_file}")
+        sys.exit(1)
+    except (json.JSONDecodeError, ValueError) as e:
+        print(f"Invalid JSON format in file: {args.input_file}: {e}")
+        sys.exit(1)
+    finally:
+        # Remember what was written even if we stopped part way through.
+        save_manifest(args.output_dir, manifest)
+
+    print(f"Conversion complete: {converted} converted, {skipped} already imported; output in {args.output_dir}")
+
+if __name__ == "__main__":
+    main()